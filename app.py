@@ -1,30 +1,314 @@
-import copy
+import json
 import logging
+import math
 import os
-import random
+import threading
+import time
 import uuid
 
-from flask import Flask, jsonify, request, session
-
-from src.env import TemporalGame, load_documents
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    session,
+    stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider
+
+from src.agreement import agreement
+from src.base import ID2RELATIONS, N_RELATIONS
+from src.constants import (
+    BOARD_WINDOW_DISTANCE,
+    BOARD_WINDOW_SENTENCES,
+    SPARSE_BOARD_MIN_ENTITIES,
+    SUGGESTION_BATCH_SIZE,
+    SUGGESTION_WINDOW,
+    TRACE_FILE,
+)
+from src.encoding import BOARD_ENCODING, encode_board
+from src.env import TemporalGame
 from src.event_tagger import EventTagger
+from src.export import gzip_lines, iter_records, record_to_timeml
+from src.game_pool import GamePool
+from src.logs import setup_logging
+from src.metrics import metrics
+from src.relation_classifier import RelationClassifier
+from src.sessions import SessionStore
 from src.timex_tagger import TimexTagger
+from src.traces import NEW_STREAM_ENDPOINTS, SANITIZERS, TraceRecorder
+from src.utils import tlinks_to_relations
 
 # Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(), logging.FileHandler("temporal_game.log")],
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records the time spent serializing the responses."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with metrics.stage("serialize"):
+            return super().dumps(obj, **kwargs)
+
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.secret_key = os.environ.get("SECRET_KEY", "temporal_game_secret")
 
-# Dictionary to store game instances
-games = {}
-# Dictionary to store annotation sessions
-annotation_sessions = {}
+# Store of the game instances
+games = SessionStore()
+# Store of the annotation sessions
+annotation_sessions = SessionStore()
+# Annotation sessions remembered in the cookie of each client, which may read them
+MAX_OWNED_SESSIONS = 32
+
+# Games built ahead of the requests, filled by the server entry points once they start,
+# so importing the app does not load the datasets
+game_pool = GamePool()
+
+# Opt-in trace of the game and annotation requests, replayed by `scripts.replay`
+trace_recorder = TraceRecorder(TRACE_FILE) if TRACE_FILE else None
+
+
+# The taggers are loaded once and shared by the requests
+TAGGERS = {
+    "event": EventTagger,
+    "timex": TimexTagger,
+    "relation": RelationClassifier,
+}
+_taggers = {}
+_taggers_lock = threading.Lock()
+
+
+def get_tagger(name: str):
+    with _taggers_lock:
+        if name not in _taggers:
+            _taggers[name] = TAGGERS[name]()
+        return _taggers[name]
+
+
+def close_taggers():
+    """Stop the worker processes of the loaded taggers."""
+    with _taggers_lock:
+        for tagger in _taggers.values():
+            close = getattr(tagger, "close", None)
+            if close is not None:
+                close()
+
+
+def tag_events(text: str, cancelled: threading.Event | None = None) -> list[dict]:
+    with metrics.stage("event_tagger"):
+        return get_tagger("event")(text, cancelled)
+
+
+def tag_timexs(text: str) -> list[dict]:
+    with metrics.stage("timex_tagger"):
+        return get_tagger("timex")(text)
+
+
+def score_relations(text: str, pairs: list[tuple[dict, dict]]) -> list[float]:
+    with metrics.stage("relation_classifier"):
+        return get_tagger("relation").score(text, pairs)
+
+
+def format_entities(entities: list[dict]) -> list[dict]:
+    return [
+        {
+            "start": entity["offsets"][0],
+            "end": entity["offsets"][1],
+            "text": entity["text"],
+            "type": "interval",  # Events and timexs are intervals by default
+        }
+        for entity in entities
+    ]
+
+
+def merge_entities(events: list[dict], timexs: list[dict]) -> dict:
+    """The response of the entity annotation, with the entities sorted by offsets."""
+    entities = format_entities(events + timexs)
+    entities.sort(key=lambda x: x["start"])
+
+    logger.info(
+        "Found %s events and %s timexs, total %s entities",
+        len(events),
+        len(timexs),
+        len(entities),
+    )
+    return {
+        "entities": entities,
+        "events_count": len(events),
+        "timexs_count": len(timexs),
+        "total_count": len(entities),
+    }
+
+
+def response_board(game: TemporalGame, board, encoding: str | None = None):
+    """The board sent to the client, as lists or in the compact `encoding`.
+
+    Sparse boards are not sent, the client fetches them by windows.
+    """
+    if game.sparse:
+        return None
+    if encoding == BOARD_ENCODING:
+        return encode_board(game.board_array(board))
+    return board.tolist()
+
+
+def game_store(data: dict) -> tuple[SessionStore, str]:
+    """The store and id of the annotation session or game of a request."""
+    if "session_id" in data:
+        return annotation_sessions, data["session_id"]
+    return games, data.get("game_id", session.get("game_id"))
+
+
+def elapsed_ms(start: float) -> float:
+    return round(1000 * (time.perf_counter() - start), 3)
+
+
+def relation_batches(entities: list[dict]) -> list[list[tuple[dict, dict]]]:
+    """Batches of the entity pairs to suggest relations for.
+
+    Only the pairs of entities that are at most `SUGGESTION_WINDOW` entities apart are
+    scored, so the work grows linearly with the number of entities.
+    """
+    entities = sorted(entities, key=lambda x: (x["start"], x["end"]))
+    pairs = [
+        (source, target)
+        for idx, source in enumerate(entities)
+        for target in entities[idx + 1 : idx + 1 + SUGGESTION_WINDOW]
+    ]
+    return [
+        pairs[start : start + SUGGESTION_BATCH_SIZE]
+        for start in range(0, len(pairs), SUGGESTION_BATCH_SIZE)
+    ]
+
+
+def make_suggestions(pairs: list[tuple[dict, dict]], scores: list[float]) -> list[dict]:
+    return [
+        {
+            "source": [source["start"], source["end"]],
+            "target": [target["start"], target["end"]],
+            "score": score,
+        }
+        for (source, target), score in zip(pairs, scores)
+    ]
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def annotation_events(text: str, suggest_relations: bool):
+    """Server-sent events with the entities of each tagger and the relation suggestions.
+
+    When the client disconnects the generator is closed, so the remaining taggers and
+    relation batches are not run.
+    """
+    entities = []
+    counts = {}
+    for source, tag in [("event", tag_events), ("timex", tag_timexs)]:
+        try:
+            found = format_entities(tag(text))
+        except Exception as e:
+            logger.error("Error during %s tagging: %s", source, e, exc_info=True)
+            yield sse_event("error", {"source": source, "error": str(e)})
+            continue
+        entities += found
+        counts[f"{source}s_count"] = len(found)
+        yield sse_event("entities", {"source": source, "entities": found})
+
+    if suggest_relations:
+        for pairs in relation_batches(entities):
+            try:
+                scores = score_relations(text, pairs)
+            except Exception as e:
+                logger.error("Error during relation scoring: %s", e, exc_info=True)
+                yield sse_event("error", {"source": "relation", "error": str(e)})
+                break
+            suggestions = make_suggestions(pairs, scores)
+            yield sse_event("relations", {"suggestions": suggestions})
+
+    yield sse_event("done", {**counts, "total_count": len(entities)})
+
+
+@app.before_request
+def start_timer():
+    if metrics.sampled():
+        g.request_start = time.perf_counter()
+    if trace_recorder is not None and request.endpoint in SANITIZERS:
+        g.trace_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    if "request_start" in g:
+        metrics.observe(
+            "temporal_game_request_seconds",
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or "unknown",
+            status=response.status_code,
+        )
+    return response
+
+
+@app.after_request
+def record_trace(response):
+    if "trace_start" in g:
+        seconds = time.perf_counter() - g.trace_start
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        endpoint = request.endpoint
+        if endpoint in NEW_STREAM_ENDPOINTS:
+            body = response.get_json(silent=True) or {}
+            key = body.get(NEW_STREAM_ENDPOINTS[endpoint])
+        elif endpoint.startswith("annotation_"):
+            key = data.get("session_id", session.get("annotation_session_id"))
+        else:
+            key = data.get("game_id", session.get("game_id"))
+        trace_recorder.record(
+            endpoint, key, data, response.status_code, g.trace_start, seconds
+        )
+    return response
+
+
+def is_local_request() -> bool:
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+
+def readable_session_ids(data: dict) -> list[str] | None:
+    """The annotation sessions a request may read, `None` for all of them.
+
+    Local requests read the `session_ids` they give, or every session. The other
+    clients only read the sessions they created, all of them by default.
+
+    Raises:
+        PermissionError: If a remote client asks for a session it did not create.
+    """
+    session_ids = data.get("session_ids")
+    if is_local_request():
+        return session_ids
+    owned = session.get("annotation_session_ids", [])
+    if session_ids is None:
+        return owned
+    if not set(session_ids) <= set(owned):
+        raise PermissionError("Only the sessions created by this client can be read")
+    return session_ids
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Latency histograms and cache counters in the Prometheus text format, only
+    served locally."""
+    if not is_local_request():
+        return jsonify({"error": "Metrics are only available locally"}), 403
+    text = metrics.to_prometheus()
+    with _taggers_lock:
+        classifier = _taggers.get("relation")
+    if classifier is not None:
+        text += classifier.cache.to_prometheus()
+    return text, 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 
 @app.route("/api/new_game", methods=["POST"])
@@ -37,16 +321,30 @@ def new_game():
 
     # Validate level
     if not isinstance(level, int) or level < 2 or level > 5:
-        logger.error(f"Invalid level: {level}")
+        logger.error("Invalid level: %s", level)
         return jsonify({"error": "Level must be an integer between 2 and 6"}), 400
 
-    logger.info(f"Creating game with level: {level}")
+    # Optional band of difficulty, as the low and high quantiles of the level
+    difficulty = data.get("difficulty")
+    if difficulty is not None and not (
+        isinstance(difficulty, list)
+        and len(difficulty) == 2
+        and all(isinstance(bound, (int, float)) for bound in difficulty)
+        and 0 <= difficulty[0] < difficulty[1] <= 1
+    ):
+        logger.error("Invalid difficulty: %s", difficulty)
+        return jsonify({"error": "Difficulty must be [low, high] in [0, 1]"}), 400
+
+    logger.info("Creating game with level: %s", level)
 
+    start = time.perf_counter()
     game_id = str(uuid.uuid4())
-    docs = load_documents(level)
-    doc_id = random.randint(0, len(docs) - 1)
-    doc = copy.deepcopy(docs[doc_id])
-    game = TemporalGame(doc)
+    # The pooled games are drawn from the whole level
+    game = game_pool.get(level) if difficulty is None else None
+    if game is None:
+        logger.info("No pooled game for level %s, building one", level)
+        with metrics.stage("make_game"):
+            game = game_pool.make_game(level, difficulty)
     obs, info = game.reset()
 
     games[game_id] = {"game": game, "obs": obs, "info": info, "reward": 0}
@@ -54,13 +352,23 @@ def new_game():
     # Store the game_id in the session
     session["game_id"] = game_id
 
-    logger.info(f"New game created with ID: {game_id}, level: {level}")
+    logger.info(
+        "New game created with ID: %s, level: %s",
+        game_id,
+        level,
+        extra={
+            "game_id": game_id,
+            "game_level": level,
+            "duration_ms": elapsed_ms(start),
+        },
+    )
 
     return jsonify(
         {
             "game_id": game_id,
             "text": obs["context"],
-            "board": obs["board"],
+            "entity_spans": obs["entity_spans"],
+            "board": response_board(game, obs["board"], data.get("board_encoding")),
             "endpoints": obs["endpoints"],
             "entities": obs["entities"],
             "reward": 0,
@@ -77,42 +385,136 @@ def step():
     game_id = data.get("game_id", session.get("game_id"))
 
     if not game_id or game_id not in games:
-        logger.error(f"Invalid game ID: {game_id}")
+        logger.error("Invalid game ID: %s", game_id)
         return jsonify({"error": "Invalid game ID"}), 400
 
-    game_data = games[game_id]
-    game = game_data["game"]
-
-    action = data["action"]
-    try:
-        obs, reward, terminated, info = game.step(action)
+    with games.lock(game_id):
+        game_data = games[game_id]
+        game = game_data["game"]
+
+        action = data["action"]
+        encoding = data.get("board_encoding")
+        try:
+            start = time.perf_counter()
+            obs, reward, terminated, info = game.step(action)
+
+            # Update game data
+            game_data["obs"] = obs
+            game_data["info"] = info
+            game_data["reward"] += reward
+
+            logger.info(
+                "Game %s: Step completed with reward=%s, total reward=%s",
+                game_id,
+                reward,
+                game_data["reward"],
+                extra={
+                    "game_id": game_id,
+                    "step_id": game.tracker.step_id,
+                    "reward": reward,
+                    "duration_ms": elapsed_ms(start),
+                },
+            )
+
+            data = {
+                "text": obs["context"],
+                "board": response_board(game, obs["board"], encoding),
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "reward": game_data["reward"],
+                "terminated": terminated,
+                "is_success": info["is_success"],
+            }
 
-        # Update game data
-        game_data["obs"] = obs
-        game_data["info"] = info
-        game_data["reward"] += reward
+            if terminated:
+                data["true_board"] = response_board(
+                    game, info["true_board"], encoding
+                )
+            return jsonify(data)
+
+        except Exception as e:
+            logger.error(
+                "Game %s: Error during step: %s",
+                game_id,
+                e,
+                exc_info=True,
+                extra={"game_id": game_id},
+            )
+            return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/step_many", methods=["POST"])
+def step_many():
+    """Apply several actions as a single, undoable step."""
+    data = request.json
+    game_id = data.get("game_id", session.get("game_id"))
 
-        logger.info(
-            f"Game {game_id}: Step completed with reward={reward}, total reward={game_data['reward']}"
-        )
+    if not game_id or game_id not in games:
+        logger.error("Invalid game ID: %s", game_id)
+        return jsonify({"error": "Invalid game ID"}), 400
 
-        data = {
-            "text": obs["context"],
-            "board": obs["board"],
-            "endpoints": obs["endpoints"],
-            "entities": obs["entities"],
-            "reward": game_data["reward"],
-            "terminated": terminated,
-            "is_success": info["is_success"],
-        }
+    with games.lock(game_id):
+        game_data = games[game_id]
+        game = game_data["game"]
+
+        actions = data.get("actions")
+        encoding = data.get("board_encoding")
+        if not actions:
+            logger.error("Game %s: No actions to apply", game_id)
+            return jsonify({"error": "At least one action is required"}), 400
+
+        try:
+            start = time.perf_counter()
+            obs, reward, terminated, info = game.step_many(actions)
+
+            # Update game data
+            game_data["obs"] = obs
+            game_data["info"] = info
+            game_data["reward"] += reward
+
+            logger.info(
+                "Game %s: Step with %s actions completed with reward=%s, "
+                "total reward=%s",
+                game_id,
+                len(actions),
+                reward,
+                game_data["reward"],
+                extra={
+                    "game_id": game_id,
+                    "step_id": game.tracker.step_id,
+                    "n_actions": len(actions),
+                    "reward": reward,
+                    "duration_ms": elapsed_ms(start),
+                },
+            )
+
+            data = {
+                "text": obs["context"],
+                "board": response_board(game, obs["board"], encoding),
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "reward": game_data["reward"],
+                "action_rewards": info["action_rewards"],
+                "first_invalid_action": info["first_invalid_action"],
+                "terminated": terminated,
+                "is_success": info["is_success"],
+            }
 
-        if terminated:
-            data["true_board"] = info["true_board"]
-        return jsonify(data)
+            if terminated:
+                data["true_board"] = response_board(
+                    game, info["true_board"], encoding
+                )
+            return jsonify(data)
 
-    except Exception as e:
-        logger.error(f"Game {game_id}: Error during step: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.error(
+                "Game %s: Error during step: %s",
+                game_id,
+                e,
+                exc_info=True,
+                extra={"game_id": game_id},
+            )
+            return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/undo", methods=["POST"])
@@ -121,42 +523,55 @@ def undo():
     game_id = data.get("game_id", session.get("game_id"))
 
     if not game_id or game_id not in games:
-        logger.error(f"Invalid game ID: {game_id}")
+        logger.error("Invalid game ID: %s", game_id)
         return jsonify({"error": "Invalid game ID"}), 400
 
-    game_data = games[game_id]
-    game_env = game_data["game"]
-
-    try:
-        obs, info, success = game_env.undo()
-
-        if not success:
-            logger.warning(f"Game {game_id}: No actions to undo")
-            return jsonify({"error": "No actions to undo"}), 400
-
-        # Update game data
-        game_data["obs"] = obs
-        game_data["info"] = info
-        # Note: We don't update reward on undo as the user might want to see cumulative score
-
-        logger.info(f"Game {game_id}: Undo successful")
-
-        response_data = {
-            "text": obs["context"],
-            "board": obs["board"],
-            "endpoints": obs["endpoints"],
-            "entities": obs["entities"],
-            "reward": game_data["reward"],  # Keep current total reward
-            "terminated": info["terminal_observation"],
-            "is_success": info["is_success"],
-            "undo_success": True,
-        }
+    with games.lock(game_id):
+        game_data = games[game_id]
+        game_env = game_data["game"]
+
+        try:
+            obs, info, success = game_env.undo()
+
+            if not success:
+                logger.warning("Game %s: No actions to undo", game_id)
+                return jsonify({"error": "No actions to undo"}), 400
+
+            # Update game data
+            game_data["obs"] = obs
+            game_data["info"] = info
+            # Note: We don't update reward on undo as the user might want to see cumulative score
+
+            logger.info(
+                "Game %s: Undo successful",
+                game_id,
+                extra={"game_id": game_id, "step_id": game_env.tracker.step_id},
+            )
+
+            response_data = {
+                "text": obs["context"],
+                "board": response_board(
+                    game_env, obs["board"], data.get("board_encoding")
+                ),
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "reward": game_data["reward"],  # Keep current total reward
+                "terminated": info["terminal_observation"],
+                "is_success": info["is_success"],
+                "undo_success": True,
+            }
 
-        return jsonify(response_data)
+            return jsonify(response_data)
 
-    except Exception as e:
-        logger.error(f"Game {game_id}: Error during undo: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.error(
+                "Game %s: Error during undo: %s",
+                game_id,
+                e,
+                exc_info=True,
+                extra={"game_id": game_id},
+            )
+            return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/new_annotation_session", methods=["POST"])
@@ -164,9 +579,32 @@ def new_annotation_session():
     logger.info("Creating new annotation session")
 
     data = request.get_json() or {}
-    text = data.get("text")
-    entities = data.get("entities", [])
-    dct = data.get("dct")
+    document = data.get("document")
+    if document is not None:
+        # A tieval-style document with entity offsets and interval tlinks
+        text = document.get("text")
+        entities = [
+            {
+                "id": entity["id"],
+                "start": entity["offsets"][0],
+                "end": entity["offsets"][1],
+                "text": entity["text"],
+                "type": entity.get("type", "interval"),
+            }
+            for entity in document.get("entities", [])
+        ]
+        dct = document.get("dct")
+        instants = {ent["id"] for ent in entities if ent["type"] == "instant"}
+        try:
+            relations = tlinks_to_relations(document.get("tlinks", []), instants)
+        except (KeyError, ValueError) as e:
+            logger.error("Invalid tlinks for annotation session: %s", e)
+            return jsonify({"error": f"Invalid tlink: {e}"}), 400
+    else:
+        text = data.get("text")
+        entities = data.get("entities", [])
+        dct = data.get("dct")
+        relations = data.get("relations", [])
 
     if not text:
         logger.error("Missing text for annotation session")
@@ -176,7 +614,7 @@ def new_annotation_session():
         logger.error("Need at least 2 entities for annotation")
         return jsonify({"error": "At least 2 entities required for annotation"}), 400
 
-    logger.info(f"Creating annotation session with {len(entities)} entities")
+    logger.info("Creating annotation session with %s entities", len(entities))
 
     session_id = str(uuid.uuid4())
 
@@ -197,9 +635,40 @@ def new_annotation_session():
         }
 
         # Create TemporalGame instance directly with our custom document
-        game = TemporalGame(mock_doc)
+        sparse = data.get(
+            "sparse",
+            SPARSE_BOARD_MIN_ENTITIES is not None
+            and len(entities) >= SPARSE_BOARD_MIN_ENTITIES,
+        )
+        game = TemporalGame(mock_doc, sparse=bool(sparse))
         obs, info = game.reset()
 
+        # Load the existing annotations, whose endpoints may use the client entity ids
+        if relations:
+            id_map = {
+                str(entity["id"]): f"e{i}"
+                for i, entity in enumerate(entities)
+                if "id" in entity
+            }
+            for rel in relations:
+                for key in ["source", "target"]:
+                    if key in rel:
+                        endpoint_type, _, entity_id = rel[key].partition(" ")
+                        entity_id = id_map.get(entity_id, entity_id)
+                        rel[key] = f"{endpoint_type} {entity_id}"
+            try:
+                obs = game.load_relations(relations)
+            except ValueError as e:
+                logger.error("Invalid relations for annotation session: %s", e)
+                return jsonify({"error": str(e)}), 400
+            info = game.get_info(terminated=False, is_success=False)
+            logger.info(
+                "Loaded %s relations into annotation session %s",
+                len(relations),
+                session_id,
+                extra={"session_id": session_id},
+            )
+
         annotation_sessions[session_id] = {
             "game": game,
             "obs": obs,
@@ -208,28 +677,40 @@ def new_annotation_session():
             "entities": entities,
             "dct": dct,
             "relations": [],  # Track annotated relations
+            "step_sizes": [],  # Number of relations annotated in each step
+            "imported_relations": relations,
         }
 
         # Store the session_id in the session
         session["annotation_session_id"] = session_id
+        owned = session.get("annotation_session_ids", []) + [session_id]
+        session["annotation_session_ids"] = owned[-MAX_OWNED_SESSIONS:]
 
-        logger.info(f"New annotation session created with ID: {session_id}")
+        logger.info(
+            "New annotation session created with ID: %s",
+            session_id,
+            extra={"session_id": session_id},
+        )
 
         return jsonify(
             {
                 "session_id": session_id,
                 "text": text,
-                "board": obs["board"],
+                "context": obs["context"],
+                "entity_spans": obs["entity_spans"],
+                "board": response_board(game, obs["board"], data.get("board_encoding")),
+                "sparse": game.sparse,
                 "endpoints": obs["endpoints"],
                 "entities": obs["entities"],
-                "has_incoherence": False,
-                "n_annotated": 0,
+                "has_incoherence": not game.tracker.is_valid,
+                "n_annotated": info["n_annotated"],
+                "n_imported": len(relations),
                 "n_relations": game.n_relations,
             }
         )
 
     except Exception as e:
-        logger.error(f"Error creating annotation session: {str(e)}", exc_info=True)
+        logger.error("Error creating annotation session: %s", e, exc_info=True)
         return jsonify({"error": f"Failed to create annotation session: {str(e)}"}), 500
 
 
@@ -239,54 +720,142 @@ def annotation_step():
     session_id = data.get("session_id", session.get("annotation_session_id"))
 
     if not session_id or session_id not in annotation_sessions:
-        logger.error(f"Invalid annotation session ID: {session_id}")
+        logger.error("Invalid annotation session ID: %s", session_id)
         return jsonify({"error": "Invalid annotation session ID"}), 400
 
-    session_data = annotation_sessions[session_id]
-    game = session_data["game"]
+    with annotation_sessions.lock(session_id):
+        session_data = annotation_sessions[session_id]
+        game = session_data["game"]
 
-    action = data["action"]
-    try:
-        # For annotation mode, we don't care about termination on errors
-        obs, _, _, info = game.step(action)
+        action = data["action"]
+        try:
+            start = time.perf_counter()
+            # For annotation mode, we don't care about termination on errors
+            obs, _, _, info = game.step(action)
 
-        # Update session data
-        session_data["obs"] = obs
-        session_data["info"] = info
+            # Update session data
+            session_data["obs"] = obs
+            session_data["info"] = info
 
-        # Track the relation
-        position, relation = action
-        session_data["relations"].append(
-            {
-                "position": position,
-                "relation": relation,
-                "timestamp": len(session_data["relations"]),
+            # Track the relation
+            position, relation = action
+            session_data["relations"].append(
+                {
+                    "position": position,
+                    "relation": relation,
+                    "timestamp": len(session_data["relations"]),
+                }
+            )
+            session_data["step_sizes"].append(1)
+
+            logger.info(
+                "Annotation session %s: Step completed",
+                session_id,
+                extra={
+                    "session_id": session_id,
+                    "step_id": game.tracker.step_id,
+                    "duration_ms": elapsed_ms(start),
+                },
+            )
+
+
+            response_data = {
+                "board": response_board(game, obs["board"], data.get("board_encoding")),
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "has_incoherence": not game.tracker.is_valid,
+                "relations_count": len(session_data["relations"]),
+                "n_annotated": info["n_annotated"],
+                "n_relations": game.n_relations,
             }
-        )
 
-        logger.info(f"Annotation session {session_id}: Step completed")
+            return jsonify(response_data)
 
-        # Check for temporal incoherence (but don't terminate)
-        has_incoherence = not game.pred_timeline.is_valid
+        except Exception as e:
+            logger.error(
+                "Annotation session %s: Error during step: %s",
+                session_id,
+                e,
+                exc_info=True,
+                extra={"session_id": session_id},
+            )
+            return jsonify({"error": str(e)}), 400
 
-        response_data = {
-            "board": obs["board"],
-            "endpoints": obs["endpoints"],
-            "entities": obs["entities"],
-            "has_incoherence": has_incoherence,
-            "relations_count": len(session_data["relations"]),
-            "n_annotated": info["n_annotated"],
-            "n_relations": game.n_relations,
-        }
 
-        return jsonify(response_data)
+@app.route("/api/annotation_step_many", methods=["POST"])
+def annotation_step_many():
+    """Annotate several relations as a single, undoable step."""
+    data = request.json
+    session_id = data.get("session_id", session.get("annotation_session_id"))
 
-    except Exception as e:
-        logger.error(
-            f"Annotation session {session_id}: Error during step: {str(e)}",
-            exc_info=True,
-        )
-        return jsonify({"error": str(e)}), 400
+    if not session_id or session_id not in annotation_sessions:
+        logger.error("Invalid annotation session ID: %s", session_id)
+        return jsonify({"error": "Invalid annotation session ID"}), 400
+
+    with annotation_sessions.lock(session_id):
+        session_data = annotation_sessions[session_id]
+        game = session_data["game"]
+
+        actions = data.get("actions")
+        if not actions:
+            logger.error("Annotation session %s: No actions to apply", session_id)
+            return jsonify({"error": "At least one action is required"}), 400
+
+        try:
+            start = time.perf_counter()
+            # For annotation mode, we don't care about termination on errors
+            obs, _, _, info = game.step_many(actions)
+
+            # Update session data
+            session_data["obs"] = obs
+            session_data["info"] = info
+
+            # Track the relations
+            for position, relation in actions:
+                session_data["relations"].append(
+                    {
+                        "position": position,
+                        "relation": relation,
+                        "timestamp": len(session_data["relations"]),
+                    }
+                )
+            session_data["step_sizes"].append(len(actions))
+
+            logger.info(
+                "Annotation session %s: Step with %s actions completed",
+                session_id,
+                len(actions),
+                extra={
+                    "session_id": session_id,
+                    "step_id": game.tracker.step_id,
+                    "n_actions": len(actions),
+                    "duration_ms": elapsed_ms(start),
+                },
+            )
+
+            response_data = {
+                "board": response_board(game, obs["board"], data.get("board_encoding")),
+                "sparse": game.sparse,
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "has_incoherence": not game.tracker.is_valid,
+                "first_invalid_action": info["first_invalid_action"],
+                "relations_count": len(session_data["relations"]),
+                "n_annotated": info["n_annotated"],
+                "n_relations": game.n_relations,
+            }
+
+            return jsonify(response_data)
+
+        except Exception as e:
+            logger.error(
+                "Annotation session %s: Error during step: %s",
+                session_id,
+                e,
+                exc_info=True,
+                extra={"session_id": session_id},
+            )
+            return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/annotation_undo", methods=["POST"])
@@ -295,49 +864,141 @@ def annotation_undo():
     session_id = data.get("session_id", session.get("annotation_session_id"))
 
     if not session_id or session_id not in annotation_sessions:
-        logger.error(f"Invalid annotation session ID: {session_id}")
+        logger.error("Invalid annotation session ID: %s", session_id)
         return jsonify({"error": "Invalid annotation session ID"}), 400
 
-    session_data = annotation_sessions[session_id]
-    game = session_data["game"]
+    with annotation_sessions.lock(session_id):
+        session_data = annotation_sessions[session_id]
+        game = session_data["game"]
 
-    try:
-        obs, info, success = game.undo()
+        try:
+            obs, info, success = game.undo()
 
-        if not success:
-            logger.warning(f"Annotation session {session_id}: No actions to undo")
-            return jsonify({"error": "No actions to undo"}), 400
+            if not success:
+                logger.warning("Annotation session %s: No actions to undo", session_id)
+                return jsonify({"error": "No actions to undo"}), 400
 
-        # Update session data
-        session_data["obs"] = obs
-        session_data["info"] = info
+            # Update session data
+            session_data["obs"] = obs
+            session_data["info"] = info
 
-        # Remove the last relation
-        if session_data["relations"]:
-            session_data["relations"].pop()
+            # Remove the relations of the last step
+            step_sizes = session_data["step_sizes"]
+            step_size = step_sizes.pop() if step_sizes else 1
+            del session_data["relations"][-step_size:]
 
-        logger.info(f"Annotation session {session_id}: Undo successful")
+            logger.info(
+                "Annotation session %s: Undo successful",
+                session_id,
+                extra={"session_id": session_id, "step_id": game.tracker.step_id},
+            )
 
-        has_incoherence = not game.pred_timeline.is_valid
 
-        response_data = {
-            "board": obs["board"],
-            "endpoints": obs["endpoints"],
-            "entities": obs["entities"],
-            "has_incoherence": has_incoherence,
-            "relations_count": len(session_data["relations"]),
-            "n_annotated": info["n_annotated"],
-            "undo_success": True,
+            response_data = {
+                "board": response_board(game, obs["board"], data.get("board_encoding")),
+                "endpoints": obs["endpoints"],
+                "entities": obs["entities"],
+                "has_incoherence": not game.tracker.is_valid,
+                "relations_count": len(session_data["relations"]),
+                "n_annotated": info["n_annotated"],
+                "undo_success": True,
+            }
+
+            return jsonify(response_data)
+
+        except Exception as e:
+            logger.error(
+                "Annotation session %s: Error during undo: %s",
+                session_id,
+                e,
+                exc_info=True,
+                extra={"session_id": session_id},
+            )
+            return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/legal_actions", methods=["POST"])
+def legal_actions():
+    """Mask of the relations that can be annotated in each cell without contradiction.
+
+    The mask covers the whole board, or the window of `rows` and `cols` as in
+    `/api/board_window`. It needs the dense board, so the sparse sessions are refused.
+    """
+    data = request.get_json() or {}
+    store, key = game_store(data)
+    if not key or key not in store:
+        logger.error("Invalid game or annotation session ID: %s", key)
+        return jsonify({"error": "Invalid game or annotation session ID"}), 400
+
+    with store.lock(key):
+        game = store[key]["game"]
+        if game.sparse:
+            logger.error("Legal actions requested for sparse session %s", key)
+            return jsonify({"error": "Legal actions need a dense board"}), 400
+        rows = data.get("rows")
+        cols = data.get("cols", rows)
+        try:
+            mask = game.legal_actions(data.get("undecided_only", True), rows, cols)
+        except (IndexError, TypeError, ValueError) as e:
+            logger.error("Invalid legal actions window: %s", e)
+            return jsonify({"error": f"Invalid board window: {e}"}), 400
+
+    window = {} if rows is None else {"rows": rows, "cols": cols}
+    return jsonify(
+        {
+            "legal_actions": mask.tolist(),
+            "relations": [ID2RELATIONS[idx] for idx in range(N_RELATIONS)],
+            "n_legal_cells": int(mask.any(axis=-1).sum()),
+            **window,
         }
+    )
 
-        return jsonify(response_data)
 
-    except Exception as e:
-        logger.error(
-            f"Annotation session {session_id}: Error during undo: {str(e)}",
-            exc_info=True,
-        )
-        return jsonify({"error": str(e)}), 400
+@app.route("/api/board_window", methods=["POST"])
+def board_window():
+    """A window of the board of a game or annotation session.
+
+    The window is given by its `rows` and `cols`, or by a `page` of `page_size`
+    sentences, whose endpoints are related to those up to `distance` sentences after.
+    """
+    data = request.get_json() or {}
+    store, key = game_store(data)
+    if not key or key not in store:
+        logger.error("Invalid game or annotation session ID: %s", key)
+        return jsonify({"error": "Invalid game or annotation session ID"}), 400
+
+    with store.lock(key):
+        game = store[key]["game"]
+        try:
+            if "rows" in data:
+                rows, cols = data["rows"], data.get("cols", data["rows"])
+                page_data = {}
+            else:
+                page = int(data.get("page", 0))
+                page_size = int(data.get("page_size", BOARD_WINDOW_SENTENCES))
+                distance = int(data.get("distance", BOARD_WINDOW_DISTANCE))
+                if page < 0 or page_size < 1 or distance < 0:
+                    raise ValueError("page, page_size and distance must be positive")
+                n_sentences = len(game.sentence_offsets)
+                rows, cols = game.sentence_window(page * page_size, page_size, distance)
+                page_data = {
+                    "page": page,
+                    "n_pages": math.ceil(n_sentences / page_size),
+                    "n_sentences": n_sentences,
+                }
+            window = game.board_window(rows, cols)
+        except (IndexError, TypeError, ValueError) as e:
+            logger.error("Invalid board window: %s", e)
+            return jsonify({"error": f"Invalid board window: {e}"}), 400
+
+    return jsonify(
+        {
+            "rows": [int(row) for row in rows],
+            "cols": [int(col) for col in cols],
+            "board": window,
+            **page_data,
+        }
+    )
 
 
 @app.route("/api/get_annotation_results", methods=["POST"])
@@ -346,24 +1007,92 @@ def get_annotation_results():
     session_id = data.get("session_id", session.get("annotation_session_id"))
 
     if not session_id or session_id not in annotation_sessions:
-        logger.error(f"Invalid annotation session ID: {session_id}")
+        logger.error("Invalid annotation session ID: %s", session_id)
         return jsonify({"error": "Invalid annotation session ID"}), 400
 
-    session_data = annotation_sessions[session_id]
+    with annotation_sessions.lock(session_id):
+        session_data = annotation_sessions[session_id]
 
-    return jsonify(
-        {
-            "text": session_data["text"],
-            "entities": session_data["entities"],
-            "dct": session_data["dct"],
-            "relations": session_data["relations"],
-            "board": session_data["obs"]["board"],
-            "endpoints": session_data["obs"]["endpoints"],
-            "total_relations": len(session_data["relations"]),
-        }
+        return jsonify(
+            {
+                "text": session_data["text"],
+                "entities": session_data["entities"],
+                "dct": session_data["dct"],
+                "relations": session_data["relations"],
+                "imported_relations": session_data["imported_relations"],
+                "board": response_board(
+                    session_data["game"],
+                    session_data["obs"]["board"],
+                    data.get("board_encoding"),
+                ),
+                "endpoints": session_data["obs"]["endpoints"],
+                "total_relations": len(session_data["relations"]),
+            }
+        )
+
+
+@app.route("/api/export_annotation_sessions", methods=["POST"])
+def export_annotation_sessions():
+    """Stream the annotation sessions as gzipped JSON lines.
+
+    Each line is a document in the `data/hf` format or, with `"format": "timeml"`, the
+    id of a session and its TimeML. The sessions are those of `readable_session_ids`,
+    every session for local requests and the client's own sessions otherwise.
+    """
+    data = request.get_json(silent=True) or {}
+    export_format = data.get("format", "jsonl")
+    if export_format not in ["jsonl", "timeml"]:
+        logger.error("Invalid export format: %s", export_format)
+        return jsonify({"error": "The export format must be jsonl or timeml"}), 400
+    try:
+        session_ids = readable_session_ids(data)
+    except PermissionError as e:
+        logger.warning("Refused the export of annotation sessions: %s", e)
+        return jsonify({"error": str(e)}), 403
+
+    records = iter_records(annotation_sessions, session_ids)
+    if export_format == "timeml":
+        records = (
+            {"doc": record["doc"], "timeml": record_to_timeml(record)}
+            for record in records
+        )
+    logger.info("Exporting annotation sessions as %s", export_format)
+    return Response(
+        stream_with_context(gzip_lines(records)),
+        mimetype="application/gzip",
+        headers={
+            "Content-Disposition": "attachment; filename=annotation_sessions.jsonl.gz"
+        },
     )
 
 
+@app.route("/api/annotation_agreement", methods=["POST"])
+def annotation_agreement():
+    """Agreement between the annotation sessions of each document.
+
+    The sessions of `readable_session_ids` are grouped by their text and entities, and
+    named by `session_label` rather than their ids. With `"cells": true` the agreement
+    on each cell is sent as a board.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        session_ids = readable_session_ids(data)
+    except PermissionError as e:
+        logger.warning("Refused the agreement of annotation sessions: %s", e)
+        return jsonify({"error": str(e)}), 403
+
+    start = time.perf_counter()
+    records = list(iter_records(annotation_sessions, session_ids))
+    documents = agreement(records, cells=bool(data.get("cells", False)))
+    logger.info(
+        "Computed the agreement of %s sessions on %s documents",
+        len(records),
+        len(documents),
+        extra={"duration_ms": elapsed_ms(start)},
+    )
+    return jsonify({"documents": documents})
+
+
 @app.route("/api/annotate_entities", methods=["POST"])
 def annotate_entities():
     """Automatically detect entities in text using EventTagger and TimexTagger"""
@@ -376,55 +1105,35 @@ def annotate_entities():
         logger.error("Missing text for entity annotation")
         return jsonify({"error": "Text is required for entity annotation"}), 400
     
-    logger.info(f"Annotating entities for text of length {len(text)}")
+    logger.info("Annotating entities for text of length %s", len(text))
     
     try:
-        # Initialize taggers
-        event_tagger = EventTagger()
-        timex_tagger = TimexTagger()
-        
-        # Get events and timexs
-        events = event_tagger(text)
-        timexs = timex_tagger(text)
-        
-        # Convert to standard format
-        entities = []
-        
-        # Add events
-        for event in events:
-            entities.append({
-                "start": event["offsets"][0],
-                "end": event["offsets"][1], 
-                "text": event["text"],
-                "type": "interval"  # Events are intervals by default
-            })
-            
-        # Add timexs
-        for timex in timexs:
-            entities.append({
-                "start": timex["offsets"][0],
-                "end": timex["offsets"][1],
-                "text": timex["text"], 
-                "type": "interval"  # Timexs are intervals by default
-            })
-        
-        # Sort entities by start position
-        entities.sort(key=lambda x: x["start"])
-        
-        logger.info(f"Found {len(events)} events and {len(timexs)} timexs, total {len(entities)} entities")
-        
-        return jsonify({
-            "entities": entities,
-            "events_count": len(events),
-            "timexs_count": len(timexs),
-            "total_count": len(entities)
-        })
-        
+        return jsonify(merge_entities(tag_events(text), tag_timexs(text)))
     except Exception as e:
-        logger.error(f"Error during automatic entity annotation: {str(e)}", exc_info=True)
+        logger.error("Error during automatic entity annotation: %s", e, exc_info=True)
         return jsonify({"error": f"Failed to annotate entities: {str(e)}"}), 500
 
 
+@app.route("/api/annotate_entities/stream", methods=["POST"])
+def stream_annotate_entities():
+    """Stream the detected entities and relation suggestions as they are produced"""
+    data = request.get_json() or {}
+    text = data.get("text")
+
+    if not text:
+        logger.error("Missing text for entity annotation")
+        return jsonify({"error": "Text is required for entity annotation"}), 400
+
+    logger.info("Streaming entity annotation for text of length %s", len(text))
+    events = annotation_events(text, bool(data.get("suggest_relations")))
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     logger.info("Starting Temporal Game server")
+    game_pool.start()
     app.run(debug=True)
@@ -0,0 +1,340 @@
+"""ASGI entry point of the backend.
+
+The game and annotation routes of the Flask app are served on a pool of worker threads,
+while the entity annotation routes run on the event loop and hand the taggers to bounded
+executors. A slow tagging request then only holds a tagger thread, and the other
+annotators keep being served while it is in flight. The streaming variant stops its
+pending work as soon as the client disconnects.
+
+The sessions are kept in memory, so the server must run as a single process.
+
+Usage:
+    python -m asgi
+    HOST=0.0.0.0 PORT=5000 REQUEST_WORKERS=64 python -m asgi
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app,
+    close_taggers,
+    format_entities,
+    game_pool,
+    make_suggestions,
+    merge_entities,
+    relation_batches,
+    score_relations,
+    sse_event,
+    tag_events,
+    tag_timexs,
+)
+from src.constants import (
+    EVENT_TAGGER_WORKERS,
+    HOST,
+    MAX_PENDING_TAGGING,
+    MODEL_WORKERS,
+    PORT,
+    REQUEST_WORKERS,
+    TIMEX_TAGGER_WORKERS,
+)
+from src.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+event_tagger_executor = ThreadPoolExecutor(
+    EVENT_TAGGER_WORKERS, thread_name_prefix="event_tagger"
+)
+timex_tagger_executor = ThreadPoolExecutor(
+    TIMEX_TAGGER_WORKERS, thread_name_prefix="timex_tagger"
+)
+model_executor = ThreadPoolExecutor(MODEL_WORKERS, thread_name_prefix="model")
+EXECUTORS = [
+    event_tagger_executor,
+    timex_tagger_executor,
+    model_executor,
+]
+
+tagging_slots = asyncio.Semaphore(MAX_PENDING_TAGGING)
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """Serve a WSGI app with up to `max_workers` requests running concurrently.
+
+    `WsgiToAsgi` runs every request on the same thread, one at a time. Each request is
+    run in its own `ThreadSensitiveContext`, which gives it a thread of its own, so
+    only the public interface of asgiref is used.
+    """
+
+    def __init__(self, wsgi_application, max_workers: int):
+        super().__init__(wsgi_application)
+        self.slots = asyncio.Semaphore(max_workers)
+
+    async def __call__(self, scope, receive, send):
+        async with self.slots, ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+flask_app = ThreadedWsgiToAsgi(app, REQUEST_WORKERS)
+
+
+async def read_json(receive) -> dict:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def send_json(send, data: dict, status: int = 200) -> int:
+    body = json.dumps(data).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+async def run_in_executor(executor: ThreadPoolExecutor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def annotate_entities(receive, send) -> int:
+    """Run both taggers concurrently on their executors."""
+    data = await read_json(receive)
+    text = data.get("text")
+    if not text:
+        logger.error("Missing text for entity annotation")
+        return await send_json(
+            send, {"error": "Text is required for entity annotation"}, 400
+        )
+
+    if tagging_slots.locked():
+        logger.warning("Too many pending entity annotation requests")
+        return await send_json(
+            send, {"error": "The taggers are busy, try again later"}, 503
+        )
+
+    logger.info("Annotating entities for text of length %s", len(text))
+    async with tagging_slots:
+        try:
+            events, timexs = await asyncio.gather(
+                run_in_executor(event_tagger_executor, tag_events, text),
+                run_in_executor(timex_tagger_executor, tag_timexs, text),
+            )
+        except Exception as e:
+            logger.error(
+                "Error during automatic entity annotation: %s", e, exc_info=True
+            )
+            return await send_json(
+                send, {"error": f"Failed to annotate entities: {str(e)}"}, 500
+            )
+    return await send_json(send, merge_entities(events, timexs))
+
+
+async def send_event(send, event: str, data: dict):
+    body = sse_event(event, data).encode()
+    await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream_annotation_events(send, text: str, suggest_relations: bool):
+    """Send the entities of each tagger as soon as it finishes, then the suggestions.
+
+    When the stream is cancelled, the taggers that did not start are dropped and the
+    event tagger stops after the chunk it is tagging. A request to the timex tagger
+    service that was already sent runs until it returns or times out.
+    """
+    cancelled = threading.Event()
+    pending = {
+        asyncio.ensure_future(
+            run_in_executor(event_tagger_executor, tag_events, text, cancelled)
+        ): "event",
+        asyncio.ensure_future(
+            run_in_executor(timex_tagger_executor, tag_timexs, text)
+        ): "timex",
+    }
+    entities = []
+    counts = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    found = format_entities(future.result())
+                except Exception as e:
+                    logger.error(
+                        "Error during %s tagging: %s", source, e, exc_info=True
+                    )
+                    error = {"source": source, "error": str(e)}
+                    await send_event(send, "error", error)
+                    continue
+                entities += found
+                counts[f"{source}s_count"] = len(found)
+                data = {"source": source, "entities": found}
+                await send_event(send, "entities", data)
+    finally:
+        # Drop the taggers that did not start and stop the running event tagger when
+        # the stream is cancelled
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+
+    if suggest_relations:
+        # The pairs are scored in batches, so a cancelled stream stops between batches
+        for pairs in relation_batches(entities):
+            try:
+                scores = await run_in_executor(
+                    model_executor, score_relations, text, pairs
+                )
+            except Exception as e:
+                logger.error("Error during relation scoring: %s", e, exc_info=True)
+                await send_event(send, "error", {"source": "relation", "error": str(e)})
+                break
+            suggestions = make_suggestions(pairs, scores)
+            await send_event(send, "relations", {"suggestions": suggestions})
+
+    await send_event(send, "done", {**counts, "total_count": len(entities)})
+
+
+async def stream_annotate_entities(receive, send) -> int:
+    """Stream the entities and relation suggestions as server-sent events."""
+    data = await read_json(receive)
+    text = data.get("text")
+    if not text:
+        logger.error("Missing text for entity annotation")
+        return await send_json(
+            send, {"error": "Text is required for entity annotation"}, 400
+        )
+
+    if tagging_slots.locked():
+        logger.warning("Too many pending entity annotation requests")
+        return await send_json(
+            send, {"error": "The taggers are busy, try again later"}, 503
+        )
+
+    logger.info("Streaming entity annotation for text of length %s", len(text))
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    async with tagging_slots:
+        stream = asyncio.ensure_future(
+            stream_annotation_events(send, text, bool(data.get("suggest_relations")))
+        )
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        await asyncio.wait([stream, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        if not stream.done():
+            logger.info("Client disconnected, cancelling the entity annotation")
+            stream.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await stream
+            return 499
+        disconnect.cancel()
+        try:
+            stream.result()
+        except OSError:
+            # The client went away while an event was being sent
+            return 499
+    await send({"type": "http.response.body", "body": b""})
+    return 200
+
+
+ROUTES = {
+    ("POST", "/api/annotate_entities"): annotate_entities,
+    ("POST", "/api/annotate_entities/stream"): stream_annotate_entities,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            game_pool.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for executor in EXECUTORS:
+                executor.shutdown(wait=False, cancel_futures=True)
+            close_taggers()
+            game_pool.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    handler = ROUTES.get((scope.get("method"), scope["path"]))
+    if handler is None:
+        await flask_app(scope, receive, send)
+        return
+
+    start = time.perf_counter() if metrics.sampled() else None
+    status = await handler(receive, send)
+    if start is not None:
+        metrics.observe(
+            "temporal_game_request_seconds",
+            time.perf_counter() - start,
+            endpoint=handler.__name__,
+            status=status,
+        )
+
+
+def main():
+    import uvicorn
+
+    logger.info("Starting Temporal Game server")
+    uvicorn.run(
+        "asgi:application",
+        host=HOST,
+        port=PORT,
+        # The sessions live in the memory of the process
+        workers=1,
+        lifespan="on",
+        proxy_headers=True,
+        forwarded_allow_ips="127.0.0.1",
+        timeout_keep_alive=30,
+        timeout_graceful_shutdown=30,
+        backlog=2048,
+        log_level="info",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -317,7 +317,34 @@ export default function Annotate() {
     setRelationsCount(count)
   }, [])
 
-  // Automatic entity annotation function
+  // Merge the detected entities that do not overlap the ones of the current file
+  const mergeDetectedEntities = (fileName, detectedEntities) => {
+    setFileEntities(prev => {
+      const currentEntities = prev[fileName] || []
+
+      // No need to adjust offsets since we're sending the processed text directly
+      const adjustedDetectedEntities = detectedEntities.map((entity, idx) => ({
+        ...entity,
+        id: Date.now() + currentEntities.length + idx,
+        type: entity.type || 'interval' // Default to interval if not specified
+      }))
+
+      // Filter out overlapping entities to avoid conflicts
+      const nonOverlappingEntities = adjustedDetectedEntities.filter(newEntity => {
+        return !currentEntities.some(existingEntity =>
+          (newEntity.start < existingEntity.end && newEntity.end > existingEntity.start)
+        )
+      })
+
+      return {
+        ...prev,
+        [fileName]: [...currentEntities, ...nonOverlappingEntities]
+      }
+    })
+  }
+
+  // Automatic entity annotation function, the entities of each tagger are shown as
+  // soon as they are streamed by the backend
   const annotateEntitiesAutomatically = async () => {
     if (!currentFile) return
 
@@ -326,7 +353,7 @@ export default function Annotate() {
       // Send the full processed text including DCT prefix for annotation
       const textToAnnotate = currentFile.data.processedText || currentFile.data.text
 
-      const response = await fetch('/api/annotate_entities', {
+      const response = await fetch('/api/annotate_entities/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json'
@@ -341,34 +368,31 @@ export default function Annotate() {
         throw new Error(errorData.error || 'Failed to annotate entities')
       }
 
-      const data = await response.json()
-
-      // Process the detected entities and merge with existing ones
-      const detectedEntities = data.entities || []
-      const currentEntities = getCurrentEntities()
-
-      // No need to adjust offsets since we're sending the processed text directly
-      const adjustedDetectedEntities = detectedEntities.map((entity, idx) => ({
-        ...entity,
-        id: Date.now() + idx,
-        type: entity.type || 'interval' // Default to interval if not specified
-      }))
-
-      // Filter out overlapping entities to avoid conflicts
-      const nonOverlappingEntities = adjustedDetectedEntities.filter(newEntity => {
-        return !currentEntities.some(existingEntity =>
-          (newEntity.start < existingEntity.end && newEntity.end > existingEntity.start)
-        )
-      })
-
-      // Merge with existing entities
-      const mergedEntities = [...currentEntities, ...nonOverlappingEntities]
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+      const errors = []
+      let buffer = ''
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+
+        // Server-sent events are separated by a blank line
+        buffer += value
+        const messages = buffer.split('\n\n')
+        buffer = messages.pop()
+        for (const message of messages) {
+          const event = message.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || '{}')
+          if (event === 'entities') {
+            mergeDetectedEntities(currentFile.name, data.entities || [])
+          } else if (event === 'error') {
+            errors.push(data.error)
+          }
+        }
+      }
 
-      // Update the entities for the current file
-      setFileEntities(prev => ({
-        ...prev,
-        [currentFile.name]: mergedEntities
-      }))
+      if (errors.length > 0) {
+        throw new Error(errors.join('; '))
+      }
 
     } catch (error) {
       console.error('Error annotating entities:', error)
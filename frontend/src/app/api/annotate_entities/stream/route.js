@@ -0,0 +1,35 @@
+export async function POST(request) {
+  try {
+    const body = await request.json()
+
+    // Aborting the upstream request when the client goes away lets the backend
+    // cancel the pending tagging work
+    const response = await fetch('http://localhost:5000/api/annotate_entities/stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify(body),
+      signal: request.signal,
+    })
+
+    if (!response.ok) {
+      const data = await response.json()
+      return Response.json(data, { status: response.status })
+    }
+
+    return new Response(response.body, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+      },
+    })
+  } catch (error) {
+    console.error('Error proxying to Flask backend:', error)
+    return Response.json(
+      { error: 'Internal server error' },
+      { status: 500 }
+    )
+  }
+}
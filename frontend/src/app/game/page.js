@@ -6,6 +6,7 @@ import TextDisplay from '../../components/TextDisplay'
 import GameOver from '../../components/GameOver'
 import Footer from '../../components/Footer'
 import Link from 'next/link'
+import { BOARD_ENCODING, decodeGameData } from '../../utils/board'
 
 export default function Game() {
   const [gameData, setGameData] = useState(null)
@@ -38,7 +39,8 @@ export default function Game() {
           'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-          level: levelToUse
+          level: levelToUse,
+          board_encoding: BOARD_ENCODING
         })
       })
 
@@ -46,7 +48,7 @@ export default function Game() {
         throw new Error('Failed to start a new game')
       }
 
-      const data = await response.json()
+      const data = decodeGameData(await response.json())
       setGameData(data)
       setGameId(data.game_id)
       setGameOver(false)
@@ -70,7 +72,8 @@ export default function Game() {
         },
         body: JSON.stringify({
           game_id: gameId,
-          action: [position, relation]
+          action: [position, relation],
+          board_encoding: BOARD_ENCODING
         })
       })
 
@@ -79,7 +82,7 @@ export default function Game() {
         throw new Error(errorData.error || 'Failed to make a move')
       }
 
-      const data = await response.json()
+      const data = decodeGameData(await response.json())
       setGameData(data)
 
       if (data.terminated) {
@@ -104,7 +107,8 @@ export default function Game() {
           'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-          game_id: gameId
+          game_id: gameId,
+          board_encoding: BOARD_ENCODING
         })
       })
 
@@ -113,7 +117,7 @@ export default function Game() {
         throw new Error(errorData.error || 'No actions to undo')
       }
 
-      const data = await response.json()
+      const data = decodeGameData(await response.json())
       setGameData(data)
 
       // If game was over but we undid, reset game over state
@@ -236,6 +240,8 @@ export default function Game() {
               userBoard={gameData?.board}
               trueBoard={gameData?.true_board}
               endpoints={gameData?.endpoints}
+              visibleRows={gameData?.visibleRows}
+              visibleColumns={gameData?.visibleColumns}
             />
           )}
 
@@ -252,6 +258,8 @@ export default function Game() {
               onUndo={handleUndo}
               disabled={loading}
               hasTemporalIncoherence={gameData?.terminated && !gameData?.is_success}
+              visibleRows={gameData?.visibleRows}
+              visibleColumns={gameData?.visibleColumns}
             />
           </div>
         </div>
@@ -14,7 +14,7 @@ const RELATION_SYMBOLS = {
 const UNCLASSIFIED_POSITION = -1
 const MASKED_POSITION = -2
 
-export default function ComparisonBoard({ userBoard, trueBoard, endpoints }) {
+export default function ComparisonBoard({ userBoard, trueBoard, endpoints, visibleRows = null, visibleColumns = null }) {
   // Create entity to color mapping
   const entityColorMap = useMemo(() => {
     const colors = [
@@ -50,28 +50,33 @@ export default function ComparisonBoard({ userBoard, trueBoard, endpoints }) {
       return { visibleRows: [], visibleColumns: [], visibleEndpoints: [] }
     }
 
-    // Find which rows and columns should be visible (not all MASKED)
-    const visibleRowIndices = []
-    const visibleColumnIndices = []
+    // Find which rows and columns should be visible (not all MASKED), unless the
+    // server already sent them with an encoded board
+    const visibleRowIndices = visibleRows ? [...visibleRows] : []
+    const visibleColumnIndices = visibleColumns ? [...visibleColumns] : []
 
     // Check rows - a row is visible if it has at least one non-MASKED cell
-    for (let rowIdx = 0; rowIdx < userBoard.length; rowIdx++) {
-      const hasVisibleCell = userBoard[rowIdx].some(cellValue => cellValue !== MASKED_POSITION)
-      if (hasVisibleCell) {
-        visibleRowIndices.push(rowIdx)
+    if (!visibleRows) {
+      for (let rowIdx = 0; rowIdx < userBoard.length; rowIdx++) {
+        const hasVisibleCell = userBoard[rowIdx].some(cellValue => cellValue !== MASKED_POSITION)
+        if (hasVisibleCell) {
+          visibleRowIndices.push(rowIdx)
+        }
       }
     }
 
     // Check columns - a column is visible if it has at least one non-MASKED cell
-    for (let colIdx = 0; colIdx < (userBoard[0]?.length || 0); colIdx++) {
-      const hasVisibleCell = userBoard.some(row => row[colIdx] !== MASKED_POSITION)
-      if (hasVisibleCell) {
-        visibleColumnIndices.push(colIdx)
+    if (!visibleColumns) {
+      for (let colIdx = 0; colIdx < (userBoard[0]?.length || 0); colIdx++) {
+        const hasVisibleCell = userBoard.some(row => row[colIdx] !== MASKED_POSITION)
+        if (hasVisibleCell) {
+          visibleColumnIndices.push(colIdx)
+        }
       }
     }
 
     // Create filtered data structure - maintain grid positions
-    const visibleRows = visibleRowIndices.map(rowIdx => ({
+    const rows = visibleRowIndices.map(rowIdx => ({
       originalRowIdx: rowIdx,
       endpoint: endpoints[rowIdx],
       cells: visibleColumnIndices.map(colIdx => ({
@@ -84,8 +89,8 @@ export default function ComparisonBoard({ userBoard, trueBoard, endpoints }) {
 
     const visibleEndpoints = visibleColumnIndices.map(colIdx => endpoints[colIdx])
 
-    return { visibleRows, visibleColumnIndices, visibleEndpoints }
-  }, [userBoard, trueBoard, endpoints])
+    return { visibleRows: rows, visibleColumnIndices, visibleEndpoints }
+  }, [userBoard, trueBoard, endpoints, visibleRows, visibleColumns])
 
   // Format endpoint display text
   const formatEndpointDisplay = (endpoint) => {
@@ -22,7 +22,7 @@ const RELATION_NAMES = {
 const UNCLASSIFIED_POSITION = -1
 const MASKED_POSITION = -2
 
-export default function GameBoard({ board, endpoints, onMakeMove, onUndo, disabled = false, hasTemporalIncoherence = false }) {
+export default function GameBoard({ board, endpoints, onMakeMove, onUndo, disabled = false, hasTemporalIncoherence = false, visibleRows = null, visibleColumns = null }) {
   const [selectedCell, setSelectedCell] = useState(null)
   const [popupPosition, setPopupPosition] = useState({ top: 0, left: 0 })
 
@@ -61,28 +61,33 @@ export default function GameBoard({ board, endpoints, onMakeMove, onUndo, disabl
       return { visibleRows: [], visibleColumns: [], visibleEndpoints: [] }
     }
 
-    // Find which rows and columns should be visible (not all MASKED)
-    const visibleRowIndices = []
-    const visibleColumnIndices = []
+    // Find which rows and columns should be visible (not all MASKED), unless the
+    // server already sent them with an encoded board
+    const visibleRowIndices = visibleRows ? [...visibleRows] : []
+    const visibleColumnIndices = visibleColumns ? [...visibleColumns] : []
 
     // Check rows - a row is visible if it has at least one non-MASKED cell
-    for (let rowIdx = 0; rowIdx < board.length; rowIdx++) {
-      const hasVisibleCell = board[rowIdx].some(cellValue => cellValue !== MASKED_POSITION)
-      if (hasVisibleCell) {
-        visibleRowIndices.push(rowIdx)
+    if (!visibleRows) {
+      for (let rowIdx = 0; rowIdx < board.length; rowIdx++) {
+        const hasVisibleCell = board[rowIdx].some(cellValue => cellValue !== MASKED_POSITION)
+        if (hasVisibleCell) {
+          visibleRowIndices.push(rowIdx)
+        }
       }
     }
 
     // Check columns - a column is visible if it has at least one non-MASKED cell
-    for (let colIdx = 0; colIdx < (board[0]?.length || 0); colIdx++) {
-      const hasVisibleCell = board.some(row => row[colIdx] !== MASKED_POSITION)
-      if (hasVisibleCell) {
-        visibleColumnIndices.push(colIdx)
+    if (!visibleColumns) {
+      for (let colIdx = 0; colIdx < (board[0]?.length || 0); colIdx++) {
+        const hasVisibleCell = board.some(row => row[colIdx] !== MASKED_POSITION)
+        if (hasVisibleCell) {
+          visibleColumnIndices.push(colIdx)
+        }
       }
     }
 
     // Create filtered data structure - maintain grid positions
-    const visibleRows = visibleRowIndices.map(rowIdx => ({
+    const rows = visibleRowIndices.map(rowIdx => ({
       originalRowIdx: rowIdx,
       endpoint: endpoints[rowIdx],
       cells: visibleColumnIndices.map(colIdx => ({
@@ -94,8 +99,8 @@ export default function GameBoard({ board, endpoints, onMakeMove, onUndo, disabl
 
     const visibleEndpoints = visibleColumnIndices.map(colIdx => endpoints[colIdx])
 
-    return { visibleRows, visibleColumnIndices, visibleEndpoints }
-  }, [board, endpoints])
+    return { visibleRows: rows, visibleColumnIndices, visibleEndpoints }
+  }, [board, endpoints, visibleRows, visibleColumns])
 
   // Add temporal incoherence styling
   const getContainerClasses = () => {
@@ -364,4 +369,6 @@ GameBoard.propTypes = {
   onUndo: PropTypes.func.isRequired,
   disabled: PropTypes.bool,
   hasTemporalIncoherence: PropTypes.bool,
+  visibleRows: PropTypes.arrayOf(PropTypes.number),
+  visibleColumns: PropTypes.arrayOf(PropTypes.number),
 }
\ No newline at end of file
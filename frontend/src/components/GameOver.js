@@ -3,7 +3,7 @@
 import styles from './GameOver.module.css'
 import ComparisonBoard from './ComparisonBoard'
 
-export default function GameOver({ score, onRestart, userBoard, trueBoard, endpoints }) {
+export default function GameOver({ score, onRestart, userBoard, trueBoard, endpoints, visibleRows, visibleColumns }) {
   return (
     <div className={styles.overlay}>
       <div className={styles.container}>
@@ -32,6 +32,8 @@ export default function GameOver({ score, onRestart, userBoard, trueBoard, endpo
                 userBoard={userBoard}
                 trueBoard={trueBoard}
                 endpoints={endpoints}
+                visibleRows={visibleRows}
+                visibleColumns={visibleColumns}
               />
             </div>
           </div>
@@ -0,0 +1,38 @@
+// Compact board encoding of the backend, see src/encoding.py
+export const BOARD_ENCODING = 'tril_int8'
+
+const MASKED_POSITION = -2
+
+// Decode a board sent as `tril_int8` into rows of cell values, along with the rows and
+// columns that are not fully masked. Boards sent as lists are returned as they are.
+export function decodeBoard(board) {
+  if (!board || board.encoding !== BOARD_ENCODING) {
+    return { board, visibleRows: null, visibleColumns: null }
+  }
+
+  const { size } = board
+  const bytes = Uint8Array.from(atob(board.cells), char => char.charCodeAt(0))
+  const cells = new Int8Array(bytes.buffer)
+  const rows = Array.from({ length: size }, () => new Array(size).fill(MASKED_POSITION))
+  // The cells above the diagonal, column by column
+  let cellIdx = 0
+  for (let colIdx = 1; colIdx < size; colIdx++) {
+    for (let rowIdx = 0; rowIdx < colIdx; rowIdx++) {
+      rows[rowIdx][colIdx] = cells[cellIdx++]
+    }
+  }
+
+  return { board: rows, visibleRows: board.visible_rows, visibleColumns: board.visible_cols }
+}
+
+// Decode the boards of a game response, keeping the visible rows and columns of its board
+export function decodeGameData(data) {
+  const { board, visibleRows, visibleColumns } = decodeBoard(data.board)
+  return {
+    ...data,
+    board,
+    true_board: decodeBoard(data.true_board).board,
+    visibleRows,
+    visibleColumns,
+  }
+}
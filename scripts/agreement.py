@@ -0,0 +1,67 @@
+"""Report the agreement between annotation sessions of the same documents.
+
+The sessions are read from a file written by `scripts.export_sessions` or downloaded
+from a running server, and grouped by their text and entities.
+
+Usage:
+    python -m scripts.agreement --input data/exports/sessions.arrow
+    python -m scripts.agreement --url http://localhost:5000 --output agreement.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from scripts.export_sessions import download_records
+from src.agreement import agreement
+from src.export import load_records
+
+
+def format_value(value: float | None) -> str:
+    return "   n/a" if value is None else f"{value:>6.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", type=Path, help="Sessions exported to a file.")
+    source.add_argument("--url", help="Server to download the sessions from.")
+    parser.add_argument("--session-ids", nargs="+", default=None)
+    parser.add_argument(
+        "--cells", action="store_true", help="Report the agreement on each cell."
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    if args.input is not None:
+        records = load_records(args.input).to_list()
+        if args.session_ids is not None:
+            session_ids = set(args.session_ids)
+            records = [record for record in records if record["doc"] in session_ids]
+    else:
+        records = list(download_records(args.url, args.session_ids))
+
+    start = time.perf_counter()
+    documents = agreement(records, cells=args.cells)
+    seconds = time.perf_counter() - start
+    print(f"{len(records)} sessions of {len(documents)} documents in {seconds:.3f}s")
+    for document in documents:
+        print(
+            f"  {len(document['sessions']):>4} sessions"
+            f"  {document['n_cells']:>6} cells"
+            f"  coverage {format_value(document['coverage'])}"
+            f"  agreement {format_value(document['observed_agreement'])}"
+            f"  fleiss {format_value(document['fleiss_kappa'])}"
+            f"  cohen {format_value(document['cohen_kappa'])}"
+            f"  awareness {format_value(document['temporal_awareness'])}"
+        )
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(documents, indent=4))
+        print(f"Agreement written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
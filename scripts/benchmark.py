@@ -0,0 +1,368 @@
+"""Benchmark the TemporalGame hot paths on synthetic documents.
+
+Every benchmark is run on documents with an increasing number of entities and the
+timings are compared against a baseline file, so regressions show up as numbers. The
+benchmarks missing from the baseline are reported as such and never flagged, and
+`--save-baseline` updates the baseline with the benchmarks that were run.
+
+Usage:
+    python -m scripts.benchmark
+    python -m scripts.benchmark --sizes 2 10 50 --only game_step game_undo
+    python -m scripts.benchmark --save-baseline
+"""
+
+import argparse
+import copy
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from src.base import ENDPOINTS, PointRelation, Timeline
+from src.constants import ASSETS_DIR
+from src.encoding import encode_board
+from src.env import TemporalGame
+
+BASELINE_PATH = ASSETS_DIR / "benchmark_baseline.json"
+SIZES = [2, 5, 10, 20, 50, 100, 200]
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, sized: bool = True):
+    """Register a benchmark.
+
+    The decorated function receives a document and returns a `setup` function, whose
+    output is not timed, and a `run` function that is called with the output of `setup`.
+    Benchmarks that are not `sized` are only run once, independently of the sizes.
+    """
+
+    def decorator(fn):
+        BENCHMARKS[name] = (fn, sized)
+        return fn
+
+    return decorator
+
+
+def make_synthetic_doc(n_entities: int, density: float = 0.3, seed: int = 0) -> dict:
+    """Make a document with `n_entities` entities and consistent relations.
+
+    Each entity gets a random interval in a hidden timeline and the four endpoint
+    relations of a random `density` fraction of the entity pairs are annotated.
+    """
+    rng = random.Random(seed)
+
+    words, entities, intervals = [], [], []
+    offset = 0
+    for eid in range(n_entities):
+        filler = " ".join(rng.choice(["the", "a", "then", "it"]) for _ in range(3))
+        word = f"event{eid}"
+        start = offset + len(filler) + 1
+        entities.append(
+            {"id": f"ei{eid}", "text": word, "offsets": [start, start + len(word)]}
+        )
+        words += [filler, word]
+        offset = start + len(word) + 1
+
+        interval_start = rng.randint(0, 2 * n_entities)
+        intervals.append((interval_start, interval_start + rng.randint(1, 5)))
+
+    relations = []
+    for src_idx in range(n_entities):
+        for tgt_idx in range(src_idx + 1, n_entities):
+            if n_entities > 2 and rng.random() > density:
+                continue
+            for src_edp, src_point in zip(ENDPOINTS, intervals[src_idx]):
+                for tgt_edp, tgt_point in zip(ENDPOINTS, intervals[tgt_idx]):
+                    if src_point < tgt_point:
+                        relation = "<"
+                    elif src_point > tgt_point:
+                        relation = ">"
+                    else:
+                        relation = "="
+                    relations.append(
+                        {
+                            "source": f"{src_edp} ei{src_idx}",
+                            "target": f"{tgt_edp} ei{tgt_idx}",
+                            "relation": relation,
+                        }
+                    )
+
+    return {
+        "doc": f"synthetic_{n_entities}",
+        "text": " ".join(words) + ".",
+        "entities": entities,
+        "relations": relations,
+    }
+
+
+def first_action(game: TemporalGame) -> tuple[tuple[int, int], str]:
+    """The action that annotates the first relation of the true timeline."""
+    relation = game.true_doc["relations"][0]
+    position = game.pairs.position(relation["source"], relation["target"])
+    return position, relation["relation"]
+
+
+@benchmark("timeline_add")
+def bench_timeline_add(doc):
+    relations = [PointRelation(**rel) for rel in doc["relations"]]
+
+    def setup():
+        return Timeline(relations[:-1])
+
+    return setup, lambda timeline: timeline.add(relations[-1])
+
+
+@benchmark("timeline_closure")
+def bench_timeline_closure(doc):
+    timeline = Timeline([PointRelation(**rel) for rel in doc["relations"]])
+    return lambda: timeline, lambda timeline: timeline.closure
+
+
+@benchmark("timeline_is_valid")
+def bench_timeline_is_valid(doc):
+    timeline = Timeline([PointRelation(**rel) for rel in doc["relations"]])
+    return lambda: timeline, lambda timeline: timeline.is_valid
+
+
+@benchmark("game_init")
+def bench_game_init(doc):
+    return lambda: copy.deepcopy(doc), TemporalGame
+
+
+@benchmark("game_step")
+def bench_game_step(doc):
+    def setup():
+        game = TemporalGame(copy.deepcopy(doc))
+        return game, first_action(game)
+
+    return setup, lambda game, action: game.step(action)
+
+
+@benchmark("game_undo")
+def bench_game_undo(doc):
+    def setup():
+        game = TemporalGame(copy.deepcopy(doc))
+        game.step(first_action(game))
+        return game
+
+    return setup, lambda game: game.undo()
+
+
+@benchmark("game_make_board")
+def bench_game_make_board(doc):
+    game = TemporalGame(copy.deepcopy(doc))
+    return lambda: game, lambda game: game.make_board(game.true_doc["relations"])
+
+
+@benchmark("game_legal_actions")
+def bench_game_legal_actions(doc):
+    game = TemporalGame(copy.deepcopy(doc))
+    game.step(first_action(game))
+    return lambda: game, lambda game: game.legal_actions()
+
+
+@benchmark("board_json")
+def bench_board_json(doc):
+    game = TemporalGame(copy.deepcopy(doc))
+    return lambda: game, lambda game: json.dumps(game.state["board"].tolist())
+
+
+@benchmark("board_encoded")
+def bench_board_encoded(doc):
+    game = TemporalGame(copy.deepcopy(doc))
+    return lambda: game, lambda game: json.dumps(encode_board(game.board_array()))
+
+
+def annotation_session_payload(doc: dict) -> dict:
+    return {
+        "text": doc["text"],
+        "entities": [
+            {"start": ent["offsets"][0], "end": ent["offsets"][1], "text": ent["text"]}
+            for ent in doc["entities"]
+        ],
+    }
+
+
+def new_annotation_session(client, doc: dict) -> str:
+    response = client.post(
+        "/api/new_annotation_session", json=annotation_session_payload(doc)
+    )
+    return response.get_json()["session_id"]
+
+
+def new_game(client) -> tuple[str, list]:
+    """Start a game of level 3 and return its id and the action of a true relation."""
+    from app import games
+
+    game_id = client.post("/api/new_game", json={"level": 3}).get_json()["game_id"]
+    position, relation = first_action(games[game_id]["game"])
+    return game_id, [list(position), relation]
+
+
+@benchmark("api_new_game", sized=False)
+def bench_api_new_game(doc):
+    client = app_client()
+    return lambda: client, lambda client: client.post(
+        "/api/new_game", json={"level": 3}
+    )
+
+
+@benchmark("api_step", sized=False)
+def bench_api_step(doc):
+    client = app_client()
+
+    def setup():
+        game_id, action = new_game(client)
+        return client, {"game_id": game_id, "action": action}
+
+    return setup, lambda client, payload: client.post("/api/step", json=payload)
+
+
+@benchmark("api_undo", sized=False)
+def bench_api_undo(doc):
+    client = app_client()
+
+    def setup():
+        game_id, action = new_game(client)
+        client.post("/api/step", json={"game_id": game_id, "action": action})
+        return client, {"game_id": game_id}
+
+    return setup, lambda client, payload: client.post("/api/undo", json=payload)
+
+
+@benchmark("api_new_annotation_session")
+def bench_api_new_annotation_session(doc):
+    client = app_client()
+    payload = annotation_session_payload(doc)
+    return lambda: client, lambda client: client.post(
+        "/api/new_annotation_session", json=payload
+    )
+
+
+@benchmark("api_annotation_step")
+def bench_api_annotation_step(doc):
+    client = app_client()
+
+    def setup():
+        session_id = new_annotation_session(client, doc)
+        return client, {"session_id": session_id, "action": [[0, 2], "<"]}
+
+    return setup, lambda client, payload: client.post(
+        "/api/annotation_step", json=payload
+    )
+
+
+@benchmark("api_annotation_undo")
+def bench_api_annotation_undo(doc):
+    client = app_client()
+
+    def setup():
+        session_id = new_annotation_session(client, doc)
+        client.post(
+            "/api/annotation_step",
+            json={"session_id": session_id, "action": [[0, 2], "<"]},
+        )
+        return client, {"session_id": session_id}
+
+    return setup, lambda client, payload: client.post(
+        "/api/annotation_undo", json=payload
+    )
+
+
+def app_client():
+    # Importing the app pulls in the taggers, so only do it for the API benchmarks
+    import logging
+
+    from app import app
+
+    logging.disable(logging.INFO)
+    return app.test_client()
+
+
+def measure(setup, run, min_rounds: int, min_time: float, max_rounds: int) -> dict:
+    timings = []
+    while len(timings) < max_rounds and (
+        len(timings) < min_rounds or sum(timings) < min_time
+    ):
+        args = setup()
+        if not isinstance(args, tuple):
+            args = (args,)
+        start = time.perf_counter()
+        run(*args)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "rounds": len(timings),
+        "min_ms": 1000 * timings[0],
+        "median_ms": 1000 * statistics.median(timings),
+        "mean_ms": 1000 * statistics.mean(timings),
+        "p95_ms": 1000 * timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--min-rounds", type=int, default=3)
+    parser.add_argument("--max-rounds", type=int, default=100)
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Flag benchmarks whose median is this many times the baseline median.",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+
+    results = {}
+    regressions = []
+    missing = []
+    for name in args.only or BENCHMARKS:
+        fn, sized = BENCHMARKS[name]
+        for size in args.sizes if sized else args.sizes[:1]:
+            bench_id = f"{name}[{size}]" if sized else name
+            doc = make_synthetic_doc(size, density=args.density)
+            setup, run = fn(doc)
+            result = measure(
+                setup, run, args.min_rounds, args.min_time, args.max_rounds
+            )
+            results[bench_id] = result
+
+            line = f"{bench_id:<40} {result['median_ms']:>12.3f} ms"
+            if bench_id not in baseline:
+                missing.append(bench_id)
+                line += "  no baseline"
+            elif not args.save_baseline:
+                ratio = result["median_ms"] / baseline[bench_id]["median_ms"]
+                line += f" {ratio:>8.2f}x"
+                if ratio > args.threshold:
+                    regressions.append(bench_id)
+                    line += "  REGRESSION"
+            print(line, flush=True)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=4))
+        print(f"Baseline written to {args.baseline}")
+    elif missing:
+        print(f"{len(missing)} benchmarks without a baseline, see --save-baseline")
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=4))
+    if regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,150 @@
-import datasets
+"""Compute statistics of the level datasets.
 
+The splits are streamed as Arrow batches, so a corpus never has to fit in memory, and
+every statistic is computed with Arrow/NumPy column operations in a single pass.
+
+Usage:
+    python -m scripts.data_stats --output results/data_stats.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts.preprocess import SPLITS, load_split
+from src.base import RELATIONS
 from src.constants import HF_DIR
-from src.env import DATASETS
-
-for level, dataset in enumerate(DATASETS):
-    print(f"Level {level + 2}")
-    dataset = datasets.load_from_disk(HF_DIR / dataset)
-    dataset = datasets.concatenate_datasets(
-        [
-            dataset["train"],
-            dataset["valid"],
-            dataset["test"],
-        ]
-    )
-    print(f"Number of games: {len(dataset)}")
-    n_relations = [len(game["relations"]) for game in dataset]
-    n_before = [
-        len([rel for rel in game["relations"] if rel["relation"] == "<"])
-        for game in dataset
-    ]
-    n_after = [
-        len([rel for rel in game["relations"] if rel["relation"] == ">"])
-        for game in dataset
-    ]
-    n_equal = [
-        len([rel for rel in game["relations"] if rel["relation"] == "="])
-        for game in dataset
-    ]
-    print(f"Number of relations: {sum(n_relations)}")
-    print(f"Number of before relations: {sum(n_before)}")
-    print(f"Number of after relations: {sum(n_after)}")
-    print(f"Number of equal relations: {sum(n_equal)}")
-    
-    dataset = dataset.map(lambda x: {"n_tkns": len(x["text"].split())})
-    print(f"Number of tokens: {sum(dataset['n_tkns'])}")
-    print()
+
+
+def batch_stats(batch: pa.Table) -> dict:
+    """Statistics of a batch of games as sums that can be added across batches."""
+    n_entities = pc.list_value_length(batch["entities"]).to_numpy()
+    entities = pc.list_flatten(batch["entities"])
+    if "type" in entities.type.names:
+        is_instant = pc.equal(pc.struct_field(entities, "type"), "instant")
+        is_instant = pc.fill_null(is_instant, False).to_numpy(zero_copy_only=False)
+        parents = pc.list_parent_indices(batch["entities"]).to_numpy()
+        n_instants = np.bincount(
+            parents, weights=is_instant, minlength=len(batch)
+        ).astype(int)
+    else:
+        n_instants = np.zeros(len(batch), dtype=int)
+    n_endpoints = 2 * n_entities - n_instants
+    # Lower triangle of the board without the pairs of endpoints of the same entity
+    n_board_cells = n_endpoints * (n_endpoints - 1) // 2 - (n_entities - n_instants)
+
+    n_relations = pc.list_value_length(batch["relations"]).to_numpy()
+    relation_types = pc.struct_field(pc.list_flatten(batch["relations"]), "relation")
+    relation_counts = pc.value_counts(relation_types).to_pylist()
+
+    n_tokens = pc.list_value_length(pc.utf8_split_whitespace(batch["text"])).to_numpy()
+
+    return {
+        "n_games": len(batch),
+        "n_tokens": int(n_tokens.sum()),
+        "n_entities": int(n_entities.sum()),
+        "n_endpoints": int(n_endpoints.sum()),
+        "n_board_cells": int(n_board_cells.sum()),
+        "n_relations": int(n_relations.sum()),
+        "relations": {count["values"]: count["counts"] for count in relation_counts},
+        "endpoints_histogram": np.bincount(n_endpoints),
+    }
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    for key, value in stats.items():
+        if key == "relations":
+            for relation, count in value.items():
+                total[key][relation] = total[key].get(relation, 0) + count
+        elif key == "endpoints_histogram":
+            size = max(len(total[key]), len(value))
+            total[key] = np.pad(total[key], (0, size - len(total[key])))
+            total[key][: len(value)] += value
+        else:
+            total[key] += value
+    return total
+
+
+def dataset_stats(name: str, batch_size: int) -> dict | None:
+    total = {
+        "n_games": 0,
+        "n_tokens": 0,
+        "n_entities": 0,
+        "n_endpoints": 0,
+        "n_board_cells": 0,
+        "n_relations": 0,
+        "relations": {relation: 0 for relation in RELATIONS},
+        "endpoints_histogram": np.zeros(0, dtype=int),
+    }
+    found = False
+    for split in SPLITS:
+        dataset = load_split(HF_DIR / name / split)
+        if dataset is None:
+            continue
+        found = True
+        for batch in dataset.with_format("arrow").iter(batch_size=batch_size):
+            merge_stats(total, batch_stats(batch))
+    if not found:
+        return None
+
+    histogram = total.pop("endpoints_histogram")
+    total["endpoints"] = {
+        int(n): int(count) for n, count in enumerate(histogram) if count > 0
+    }
+    total["board_density"] = total["n_relations"] / max(total["n_board_cells"], 1)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = {}
+    # The level datasets do not hold the same games, so the closure expansion is
+    # measured on the documents they are built from.
+    base = {
+        data_split: dataset_stats(f"small_temporal_games_{data_split}", args.batch_size)
+        for data_split in ["default", "closure"]
+    }
+    if base["default"] is not None and base["closure"] is not None:
+        results["closure_expansion_ratio"] = (
+            base["closure"]["n_relations"] / base["default"]["n_relations"]
+        )
+
+    for level in args.levels:
+        print(f"Level {level}")
+        level_stats = {}
+        for data_split in ["default", "closure"]:
+            name = f"small_temporal_games_{data_split}_{level}"
+            stats = dataset_stats(name, args.batch_size)
+            if stats is not None:
+                level_stats[data_split] = stats
+        results[level] = level_stats
+
+        stats = level_stats.get("closure", level_stats.get("default"))
+        if stats is None:
+            print("No data\n")
+            continue
+        print(f"Number of games: {stats['n_games']}")
+        print(f"Number of relations: {stats['n_relations']}")
+        print(f"Number of before relations: {stats['relations']['<']}")
+        print(f"Number of after relations: {stats['relations']['>']}")
+        print(f"Number of equal relations: {stats['relations']['=']}")
+        print(f"Number of tokens: {stats['n_tokens']}")
+        print()
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=4))
+        print(f"Statistics written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
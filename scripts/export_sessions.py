@@ -0,0 +1,57 @@
+"""Download the annotation sessions of a running server as a dataset.
+
+The sessions are streamed from `/api/export_annotation_sessions` and written to
+`--output`, as Arrow if it ends with `.arrow` and as gzipped JSON lines otherwise. With
+`--save-to-disk` they are also saved in `data/hf`, next to the game datasets.
+
+Usage:
+    python -m scripts.export_sessions --output data/exports/sessions.jsonl.gz
+    python -m scripts.export_sessions --output sessions.arrow --save-to-disk annotations
+"""
+
+import argparse
+import gzip
+import json
+from pathlib import Path
+
+import requests
+
+from src.constants import HF_DIR
+from src.export import load_records, write_records
+
+
+def download_records(url: str, session_ids: list[str] | None = None):
+    """Records of the sessions of the server at `url`, one at a time."""
+    with requests.post(
+        f"{url}/api/export_annotation_sessions",
+        json={"session_ids": session_ids},
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        with gzip.open(response.raw, "rt") as lines:
+            for line in lines:
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--session-ids", nargs="+", default=None)
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument(
+        "--save-to-disk", default=None, help="Name of the dataset in data/hf."
+    )
+    parser.add_argument("--split", default="test")
+    args = parser.parse_args()
+
+    n_records = write_records(download_records(args.url, args.session_ids), args.output)
+    print(f"{n_records} sessions written to {args.output}")
+
+    if args.save_to_disk is not None:
+        path = HF_DIR / args.save_to_disk / args.split
+        load_records(args.output).save_to_disk(str(path))
+        print(f"Dataset saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Report the import time of the backend modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so the
+numbers are those of a cold start. The game core must not load the ML stack, and the
+report fails when it does or when a module takes longer than `--max-seconds`.
+
+Usage:
+    python -m scripts.import_time
+    python -m scripts.import_time --modules src.env app --top 20 --max-seconds 1.5
+"""
+
+import argparse
+import subprocess
+import sys
+
+from src.constants import ROOT_DIR
+
+MODULES = ["src.base", "src.env", "src.game_pool", "app", "asgi"]
+# Modules of the game core, usable without the ML stack
+CORE_MODULES = ["src.base", "src.env", "src.game_pool"]
+HEAVY_MODULES = ["datasets", "transformers", "torch", "spacy", "tieval.models"]
+
+
+def import_times(module: str) -> dict[str, tuple[float, float]]:
+    """Self and cumulative import time in seconds of every module loaded by `module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT_DIR,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not import {module}:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return times
+
+
+def heavy_imports(times: dict[str, tuple[float, float]]) -> list[str]:
+    return [module for module in HEAVY_MODULES if module in times]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        times = import_times(module)
+        total = times[module][1]
+        heavy = heavy_imports(times)
+        print(f"{module}: {total:.3f}s, {len(times)} modules")
+        if heavy:
+            print(f"  heavy modules: {', '.join(heavy)}")
+
+        slowest = sorted(
+            (item for item in times.items() if item[0] != module),
+            key=lambda item: item[1][1],
+            reverse=True,
+        )
+        for name, (_, cumulative) in slowest[: args.top]:
+            print(f"  {name:<50} {cumulative:>8.3f}s")
+        print()
+
+        if module in CORE_MODULES and heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if args.max_seconds is not None and total > args.max_seconds:
+            failures.append(f"{module} takes {total:.3f}s to import")
+
+    if failures:
+        print("\n".join(failures))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Rebuild the `small_temporal_games_{closure,default}_*` level datasets.
+
+Each level dataset holds every combination of `level` entities of a document in
+`small_temporal_games_{closure,default}` that has at least one relation. With
+`--compute-closure` the closure of the source documents is computed first and the
+levels are written as closure datasets.
+
+Usage:
+    python -m scripts.preprocess --levels 2 3 4 5 --num-proc 8
+"""
+
+import argparse
+import functools
+import json
+import time
+from pathlib import Path
+
+import datasets
+
+from src.constants import HF_DIR
+from src.utils import batched, make_closure_example, make_level_games
+
+SPLITS = ["train", "valid", "test"]
+
+
+def load_split(path: Path) -> datasets.Dataset | None:
+    try:
+        return datasets.load_from_disk(str(path))
+    except FileNotFoundError:
+        return None
+
+
+def count_relations(dataset: datasets.Dataset) -> int:
+    relations = dataset.data.column("relations")
+    return sum(len(chunk.flatten()) for chunk in relations.chunks)
+
+
+def timed_map(dataset: datasets.Dataset, fn, num_proc: int, **kwargs):
+    start = time.perf_counter()
+    dataset = dataset.map(
+        fn,
+        batched=True,
+        num_proc=min(num_proc, len(dataset)) if num_proc > 1 else None,
+        **kwargs,
+    )
+    return dataset, round(time.perf_counter() - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--data-split", choices=["closure", "default"], default="closure")
+    parser.add_argument("--levels", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument("--input-dir", type=Path, default=HF_DIR)
+    parser.add_argument("--output-dir", type=Path, default=HF_DIR)
+    parser.add_argument("--num-proc", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--compute-closure",
+        action="store_true",
+        help="Compute the closure of the source documents before building the levels.",
+    )
+    args = parser.parse_args()
+
+    src_name = f"small_temporal_games_{args.data_split}"
+    tgt_name = "small_temporal_games_closure" if args.compute_closure else src_name
+    manifest = {
+        "source": src_name,
+        "target": tgt_name,
+        "num_proc": args.num_proc,
+        "batch_size": args.batch_size,
+        "compute_closure": args.compute_closure,
+        "splits": {},
+        "levels": {},
+    }
+
+    start = time.perf_counter()
+    levels = {level: {} for level in args.levels}
+    for split in SPLITS:
+        docs = load_split(args.input_dir / src_name / split)
+        if docs is None:
+            print(f"No {split} split in {src_name}, skipping")
+            continue
+
+        split_manifest = {"n_docs": len(docs), "n_relations": count_relations(docs)}
+        if args.compute_closure:
+            docs, split_manifest["closure_seconds"] = timed_map(
+                docs,
+                batched(make_closure_example),
+                args.num_proc,
+                batch_size=args.batch_size,
+                desc=f"Closure {split}",
+            )
+            split_manifest["n_closure_relations"] = count_relations(docs)
+        manifest["splits"][split] = split_manifest
+
+        for level in args.levels:
+            games, seconds = timed_map(
+                docs,
+                functools.partial(make_level_games, level=level),
+                args.num_proc,
+                batch_size=args.batch_size,
+                desc=f"Level {level} {split}",
+            )
+            levels[level][split] = games
+            manifest["levels"].setdefault(level, {})[split] = {
+                "n_games": len(games),
+                "n_relations": count_relations(games),
+                "seconds": seconds,
+            }
+            print(f"Level {level} {split}: {len(games)} games in {seconds:.2f}s")
+
+    for level, splits in levels.items():
+        level_dir = args.output_dir / f"{tgt_name}_{level}"
+        datasets.DatasetDict(splits).save_to_disk(str(level_dir))
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+
+    manifest_path = args.output_dir / f"{tgt_name}_manifest.json"
+    manifest_path.write_text(json.dumps(manifest, indent=4))
+    print(f"Manifest written to {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
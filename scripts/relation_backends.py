@@ -0,0 +1,142 @@
+"""Compare the accuracy and the latency of the relation classifier backends on CPU.
+
+Every backend scores the same entity pairs of the test documents of a level with the
+model saved at `--model-path`, which is loaded without network access. The fp32 backend
+is the reference: the accuracy of a backend is the fraction of the pairs that get the
+label the fp32 backend gives them at the same thread count, along with the mean absolute
+difference of their scores. The throughput is reported per core, since that is what
+bounds the suggestions a server can make.
+
+To save the model for offline use:
+    huggingface-cli download hugosousa/smol-135-ac-a4eaad65 \
+        --local-dir models/smol-135-ac-a4eaad65
+
+Usage:
+    python -m scripts.relation_backends
+    python -m scripts.relation_backends --threads 1 4 --n-pairs 1024
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.constants import MODELS_DIR
+from src.env import load_documents
+from src.relation_classifier import RelationClassifier, load_pipeline
+
+BACKENDS = {"fp32": False, "int8": True}
+
+
+def make_texts(level: int, n_pairs: int) -> list[str]:
+    """Tagged texts of the first `n_pairs` entity pairs of the test documents."""
+    texts = []
+    for doc in load_documents(level, mode="test"):
+        entities = sorted(
+            (
+                {
+                    "start": entity["offsets"][0],
+                    "end": entity["offsets"][1],
+                    "text": entity["text"],
+                }
+                for entity in doc["entities"]
+            ),
+            key=lambda entity: entity["start"],
+        )
+        pairs = list(itertools.combinations(entities, 2))
+        texts += RelationClassifier.add_tags(doc["text"], pairs)
+        if len(texts) >= n_pairs:
+            return texts[:n_pairs]
+    return texts
+
+
+def run_backend(pipeline, texts: list[str], batch_size: int) -> dict:
+    """Score the texts by batches, after a warm-up batch that is not timed."""
+    pipeline(texts[:batch_size], batch_size=batch_size)
+
+    predictions, latencies = [], []
+    start = time.perf_counter()
+    for idx in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        predictions += pipeline(texts[idx : idx + batch_size], batch_size=batch_size)
+        latencies.append(time.perf_counter() - batch_start)
+    seconds = time.perf_counter() - start
+    return {
+        "labels": [prediction["label"] for prediction in predictions],
+        "scores": np.array([prediction["score"] for prediction in predictions]),
+        "seconds": seconds,
+        "latencies_ms": 1000 * np.array(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--model-path", type=Path, default=MODELS_DIR / "smol-135-ac-a4eaad65"
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--n-pairs", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    texts = make_texts(args.level, args.n_pairs)
+    print(f"{len(texts)} pairs of level {args.level}, batches of {args.batch_size}")
+
+    results = {}
+    for n_threads in args.threads:
+        print(f"{n_threads} threads")
+        reference = None
+        for backend in args.backends:
+            start = time.perf_counter()
+            pipeline = load_pipeline(
+                str(args.model_path),
+                quantize=BACKENDS[backend],
+                n_threads=n_threads,
+                local_files_only=True,
+            )
+            load_seconds = time.perf_counter() - start
+            run = run_backend(pipeline, texts, args.batch_size)
+            if backend == "fp32":
+                reference = run
+
+            stats = {
+                "load_seconds": load_seconds,
+                "pairs_per_second": len(texts) / run["seconds"],
+                "pairs_per_second_per_thread": len(texts) / run["seconds"] / n_threads,
+                "p50_batch_ms": float(np.percentile(run["latencies_ms"], 50)),
+                "p95_batch_ms": float(np.percentile(run["latencies_ms"], 95)),
+            }
+            if reference is not None:
+                labels = np.array(run["labels"]) == np.array(reference["labels"])
+                stats["label_agreement"] = float(labels.mean())
+                stats["score_mae"] = float(
+                    np.abs(run["scores"] - reference["scores"]).mean()
+                )
+            results.setdefault(n_threads, {})[backend] = stats
+
+            agreement = stats.get("label_agreement")
+            print(
+                f"  {backend:<5} {stats['pairs_per_second']:>8.1f} pairs/s"
+                f"  {stats['pairs_per_second_per_thread']:>7.1f} per thread"
+                f"  p50 {stats['p50_batch_ms']:>7.1f}ms"
+                f"  p95 {stats['p95_batch_ms']:>7.1f}ms"
+                + ("" if agreement is None else f"  agreement {agreement:>6.1%}")
+            )
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=4))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
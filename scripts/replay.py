@@ -0,0 +1,244 @@
+"""Replay a trace of the API recorded with `TRACE_FILE` and report its latencies.
+
+Every stream of the trace, the requests of one game or annotation session, is replayed
+in order by one of `--concurrency` workers, through the Flask test client or against
+the server at `--url`. The annotation sessions are opened on synthetic documents with
+as many entities as the recorded ones, so their actions address the same boards. The
+games are dealt by the server, so their actions are replayed on whichever documents it
+picks and their statuses can differ from the recorded ones.
+
+With `--speed`, the requests are sent at their recorded times divided by the speed.
+By default they are sent as fast as the workers go.
+
+Usage:
+    TRACE_FILE=data/traces/api.jsonl.gz python -m asgi
+    python -m scripts.replay --trace data/traces/api.jsonl.gz --concurrency 16
+    python -m scripts.replay --trace api.jsonl.gz --url http://localhost:5000 --speed 1
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from scripts.benchmark import annotation_session_payload, make_synthetic_doc
+from src.traces import NEW_STREAM_ENDPOINTS, load_trace
+
+PERCENTILES = [50, 95, 99]
+
+
+def group_streams(records: list[dict]) -> list[list[dict]]:
+    """The requests of each stream in order, for the streams recorded from their start.
+
+    The streams are sorted by the time of their first request.
+    """
+    streams = defaultdict(list)
+    for record in records:
+        if record["stream"] is not None:
+            streams[record["stream"]].append(record)
+    streams = [
+        sorted(stream, key=lambda record: record["time"])
+        for stream in streams.values()
+    ]
+    streams = [
+        stream for stream in streams if stream[0]["endpoint"] in NEW_STREAM_ENDPOINTS
+    ]
+    return sorted(streams, key=lambda stream: stream[0]["time"])
+
+
+def build_request(
+    record: dict, stream_id: str | None, seed: int = 0
+) -> tuple[str, dict]:
+    """The path and JSON body that replay a record of the trace.
+
+    Args:
+        record: A record of the trace.
+        stream_id: The id the server gave to the game or session of the stream.
+        seed: Seed of the synthetic document of a new annotation session.
+    """
+    endpoint = record["endpoint"]
+    data = dict(record["data"])
+    if endpoint == "new_annotation_session":
+        doc = make_synthetic_doc(data["n_entities"], seed=seed)
+        options = {
+            key: data[key] for key in ("sparse", "board_encoding") if key in data
+        }
+        data = {**annotation_session_payload(doc), **options}
+    elif endpoint.startswith("annotation_"):
+        data["session_id"] = stream_id
+    elif endpoint != "new_game":
+        data["game_id"] = stream_id
+    return f"/api/{endpoint}", data
+
+
+def flask_poster():
+    """A function that posts to the app through a new Flask test client."""
+    from scripts.benchmark import app_client
+
+    client = app_client()
+
+    def post(path: str, payload: dict) -> tuple[int, dict | None]:
+        response = client.post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    return post
+
+
+def http_poster(url: str):
+    """A function that posts to the server at `url` in a new HTTP session."""
+    import requests
+
+    http = requests.Session()
+
+    def post(path: str, payload: dict) -> tuple[int, dict | None]:
+        response = http.post(f"{url}{path}", json=payload)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    return post
+
+
+def replay_stream(post, stream: list[dict], start: float, speed: float) -> list[dict]:
+    """Send the requests of a stream one after the other and time them.
+
+    Args:
+        post: Function that sends a path and a JSON body and returns the status and
+            the JSON of the response.
+        stream: The records of the stream.
+        start: The `time.perf_counter` at which the replay started.
+        speed: Factor of the recorded times at which the requests are sent, 0 sends
+            them without waiting.
+    """
+    stream_id = None
+    results = []
+    for record in stream:
+        if speed > 0:
+            time.sleep(max(start + record["time"] / speed - time.perf_counter(), 0))
+        path, payload = build_request(record, stream_id, seed=record["stream"])
+
+        request_start = time.perf_counter()
+        status, body = post(path, payload)
+        seconds = time.perf_counter() - request_start
+
+        if record["endpoint"] in NEW_STREAM_ENDPOINTS:
+            stream_id = (body or {}).get(NEW_STREAM_ENDPOINTS[record["endpoint"]])
+        results.append(
+            {
+                "endpoint": record["endpoint"],
+                "status": status,
+                "recorded_status": record["status"],
+                "ms": 1000 * seconds,
+                "recorded_ms": record["ms"],
+            }
+        )
+    return results
+
+
+def replay(streams: list[list[dict]], make_post, concurrency: int, speed: float = 0):
+    """Replay the streams with `concurrency` workers.
+
+    Returns:
+        The results of the requests and the seconds the replay took.
+    """
+    start = time.perf_counter()
+
+    def run(stream: list[dict]) -> list[dict]:
+        return replay_stream(make_post(), stream, start, speed)
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(itertools.chain.from_iterable(executor.map(run, streams)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results: list[dict], seconds: float) -> dict:
+    """Throughput of the replay and latency percentiles of each endpoint."""
+    endpoints = defaultdict(list)
+    for result in results:
+        endpoints[result["endpoint"]].append(result)
+
+    summary = {
+        "n_requests": len(results),
+        "seconds": seconds,
+        "requests_per_second": len(results) / seconds if seconds else None,
+        "endpoints": {},
+    }
+    for endpoint, endpoint_results in sorted(endpoints.items()):
+        latencies = np.array([result["ms"] for result in endpoint_results])
+        recorded = np.array([result["recorded_ms"] for result in endpoint_results])
+        stats = {
+            "n_requests": len(endpoint_results),
+            "n_errors": sum(result["status"] >= 400 for result in endpoint_results),
+            "n_status_changes": sum(
+                result["status"] != result["recorded_status"]
+                for result in endpoint_results
+            ),
+            "max_ms": float(latencies.max()),
+        }
+        for percentile in PERCENTILES:
+            stats[f"p{percentile}_ms"] = float(np.percentile(latencies, percentile))
+            stats[f"recorded_p{percentile}_ms"] = float(
+                np.percentile(recorded, percentile)
+            )
+        summary["endpoints"][endpoint] = stats
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--trace", type=Path, required=True)
+    parser.add_argument(
+        "--url", default=None, help="Server to replay against, by default the app."
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--speed", type=float, default=0, help="0 sends the requests without waiting."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Times each stream is replayed."
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    streams = group_streams(load_trace(args.trace)) * args.repeat
+    if args.url is None:
+        make_post = flask_poster
+    else:
+        make_post = functools.partial(http_poster, args.url)
+    print(
+        f"{len(streams)} streams of {sum(map(len, streams))} requests, "
+        f"{args.concurrency} workers"
+    )
+
+    results, seconds = replay(streams, make_post, args.concurrency, args.speed)
+    summary = summarize(results, seconds)
+    print(
+        f"{summary['n_requests']} requests in {seconds:.2f}s, "
+        f"{summary['requests_per_second']:.1f} requests/s"
+    )
+    for endpoint, stats in summary["endpoints"].items():
+        print(
+            f"  {endpoint:<24} {stats['n_requests']:>6}"
+            f"  errors {stats['n_errors']:>5}"
+            + "".join(
+                f"  p{percentile} {stats[f'p{percentile}_ms']:>8.2f}ms"
+                for percentile in PERCENTILES
+            )
+            + f"  recorded p50 {stats['recorded_p50_ms']:>8.2f}ms"
+        )
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(summary, indent=4))
+        print(f"Summary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Play the test games of each level with the oracle solver and report the effort.
+
+For every level and policy it reports the mean reward, the steps needed to complete a
+game, the fraction of the board that had to be annotated and the wall time, with the
+games played in parallel across processes.
+
+Usage:
+    python -m scripts.solve
+    python -m scripts.solve --levels 2 3 --policies random max_inference --num-proc 8
+    python -m scripts.solve --levels 5 --difficulty 0.9 1.0
+"""
+
+import argparse
+import functools
+import json
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from src.difficulty import DifficultySampler, load_index
+from src.env import load_documents
+from src.solver import POLICIES, play_game
+
+
+def solve_level(
+    level: int,
+    policy_name: str,
+    num_proc: int,
+    limit: int | None,
+    seed: int,
+    difficulty: tuple[float, float] | None = None,
+) -> dict:
+    docs = load_documents(level, mode="test")
+    if difficulty is not None:
+        band = DifficultySampler(load_index(docs)).band(*difficulty)
+        docs = docs.select(np.sort(band))
+    if limit is not None:
+        docs = docs.select(range(min(limit, len(docs))))
+
+    play = functools.partial(play_game, policy_name=policy_name, seed=seed)
+    start = time.perf_counter()
+    if num_proc > 1:
+        with ProcessPoolExecutor(num_proc) as executor:
+            results = list(executor.map(play, docs, chunksize=64))
+    else:
+        results = [play(doc) for doc in docs]
+    seconds = time.perf_counter() - start
+
+    steps = [result["steps"] for result in results]
+    return {
+        "n_games": len(results),
+        "mean_reward": statistics.mean(result["reward"] for result in results),
+        "mean_steps": statistics.mean(steps),
+        "max_steps": max(steps),
+        "annotated_fraction": sum(steps) / sum(r["n_cells"] for r in results),
+        "success_rate": statistics.mean(r["is_success"] for r in results),
+        "mean_game_ms": 1000 * statistics.mean(r["seconds"] for r in results),
+        "wall_seconds": seconds,
+        "games_per_second": len(results) / seconds,
+        "steps_per_second": sum(steps) / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument(
+        "--policies", nargs="+", choices=list(POLICIES), default=list(POLICIES)
+    )
+    parser.add_argument("--num-proc", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None, help="Games per level.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--difficulty",
+        type=float,
+        nargs=2,
+        default=None,
+        metavar=("LOW", "HIGH"),
+        help="Only play the games between these quantiles of difficulty.",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = {}
+    for level in args.levels:
+        print(f"Level {level}")
+        for policy_name in args.policies:
+            stats = solve_level(
+                level,
+                policy_name,
+                args.num_proc,
+                args.limit,
+                args.seed,
+                args.difficulty,
+            )
+            results.setdefault(level, {})[policy_name] = stats
+            print(
+                f"  {policy_name:<17} reward {stats['mean_reward']:>6.2f}"
+                f"  steps {stats['mean_steps']:>6.2f}"
+                f"  annotated {stats['annotated_fraction']:>6.1%}"
+                f"  {stats['wall_seconds']:>7.2f}s"
+                f"  {stats['games_per_second']:>8.1f} games/s"
+            )
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=4))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Agreement between the annotation sessions of a document.
+
+The sessions are compared through their records (see `src.export`), whose relations
+are the closure of what was annotated. The boards of the sessions of a document are
+stacked into an array with a row per session and a column per cell, with the endpoints
+matched by their offsets so the entity ids of the sessions do not have to match. Every
+measure is then computed for all the cells, or all the pairs of sessions, at once.
+
+Because the boards are closures, annotators that reach the same timeline through
+different annotations agree on every cell. The temporal awareness goes further and
+compares the relations an annotator had to annotate with the closure of the other,
+as in UzZaman and Allen (2011).
+"""
+
+import hashlib
+import json
+from collections import defaultdict
+from typing import Iterable
+
+import numpy as np
+
+from src.base import N_RELATIONS, RELATIONS2ID
+from src.difficulty import implied_relations
+from src.env import UNCLASSIFIED_POSITION
+
+ENDPOINT_ORDER = {"start": 0, "instant": 1, "end": 2}
+# Relation ids after swapping the source and the target
+INVERTED_RELATION_IDS = np.array([RELATIONS2ID[r] for r in ["<", ">", "=", "-"]])
+
+
+def entity_spans(record: dict) -> list[tuple[int, int, str]]:
+    return sorted(
+        (*entity["offsets"], entity.get("type") or "interval")
+        for entity in record["entities"]
+    )
+
+
+def document_key(record: dict) -> str:
+    """Key shared by the records of the same text with the same entities."""
+    content = json.dumps([record["text"], entity_spans(record)])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def session_label(session_id: str) -> str:
+    """Label of a session in the reports, which does not give away its id."""
+    return hashlib.sha256(session_id.encode()).hexdigest()[:12]
+
+
+def group_records(records: Iterable[dict]) -> dict[str, list[dict]]:
+    """Records grouped by document, in the order they come."""
+    groups = defaultdict(list)
+    for record in records:
+        groups[document_key(record)].append(record)
+    return dict(groups)
+
+
+def endpoint_keys(record: dict) -> dict[str, tuple[int, int, int]]:
+    """Key of each endpoint of the record, from the offsets of its entity."""
+    keys = {}
+    for entity in record["entities"]:
+        start, end = entity["offsets"]
+        if (entity.get("type") or "interval") == "instant":
+            keys[f"instant {entity['id']}"] = (start, end, ENDPOINT_ORDER["instant"])
+        else:
+            keys[f"start {entity['id']}"] = (start, end, ENDPOINT_ORDER["start"])
+            keys[f"end {entity['id']}"] = (start, end, ENDPOINT_ORDER["end"])
+    return keys
+
+
+def board_endpoints(record: dict) -> tuple[list[tuple], np.ndarray, np.ndarray]:
+    """Endpoint keys of a document in board order, and the pairs of endpoints above the
+    diagonal, as rows and columns, split by whether they are of different entities."""
+    endpoints = sorted(endpoint_keys(record).values())
+    spans = np.array([endpoint[:2] for endpoint in endpoints]).reshape(-1, 2)
+    rows, cols = np.triu_indices(len(endpoints), 1)
+    is_cell = (spans[rows] != spans[cols]).any(axis=1)
+    return endpoints, (rows[is_cell], cols[is_cell]), (rows[~is_cell], cols[~is_cell])
+
+
+def stack_boards(records: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """Boards of the records of a document stacked as a row per record.
+
+    Returns:
+        The relation id of each cell, or `UNCLASSIFIED_POSITION` where the record has
+        none, and the mask of the cells that hold a relation the record had to
+        annotate, because no two relations of the record through a third endpoint
+        imply it. The `-` relations imply nothing, so they always have to be annotated.
+    """
+    endpoints, (rows, cols), intervals = board_endpoints(records[0])
+    position = {endpoint: idx for idx, endpoint in enumerate(endpoints)}
+    n_endpoints = len(endpoints)
+    cell_index = np.full((n_endpoints, n_endpoints), -1)
+    cell_index[rows, cols] = np.arange(len(rows))
+
+    labels = np.full((len(records), len(rows)), UNCLASSIFIED_POSITION, dtype=np.int8)
+    for record_idx, record in enumerate(records):
+        endpoint_idx = {
+            name: position[key] for name, key in endpoint_keys(record).items()
+        }
+        sources, targets, relation_ids = [], [], []
+        for relation in record["relations"]:
+            sources.append(endpoint_idx[relation["source"]])
+            targets.append(endpoint_idx[relation["target"]])
+            relation_ids.append(RELATIONS2ID[relation["relation"]])
+        sources, targets = np.array(sources, dtype=int), np.array(targets, dtype=int)
+        relation_ids = np.array(relation_ids, dtype=np.int8)
+        relation_ids = np.where(
+            sources > targets, INVERTED_RELATION_IDS[relation_ids], relation_ids
+        )
+        cells = cell_index[np.minimum(sources, targets), np.maximum(sources, targets)]
+        # Relations between the endpoints of the same entity are not on the board
+        on_board = cells >= 0
+        labels[record_idx, cells[on_board]] = relation_ids[on_board]
+
+    # The relations of all the records as stacked matrices of endpoints
+    is_before = labels == RELATIONS2ID["<"]
+    is_after = labels == RELATIONS2ID[">"]
+    is_equal = labels == RELATIONS2ID["="]
+    before = np.zeros((len(records), n_endpoints, n_endpoints), dtype=np.float32)
+    equal = np.zeros_like(before)
+    # The start of an interval is before its end
+    before[:, intervals[0], intervals[1]] = 1
+    before[:, rows, cols] = is_before
+    before[:, cols, rows] = is_after
+    equal[:, rows, cols] = equal[:, cols, rows] = is_equal
+    implied_before, implied_equal = implied_relations(before, equal)
+    required = labels == RELATIONS2ID["-"]
+    required |= is_before & ~implied_before[:, rows, cols]
+    required |= is_after & ~implied_before[:, cols, rows]
+    required |= is_equal & ~implied_equal[:, rows, cols]
+    return labels, required
+
+
+def one_hot(labels: np.ndarray) -> np.ndarray:
+    """Labels as one-hot float32 vectors, all zeros where the cell is undecided."""
+    return (labels[..., None] == np.arange(N_RELATIONS)).astype(np.float32)
+
+
+def cell_agreement(labels: np.ndarray) -> np.ndarray:
+    """Fraction of the pairs of sessions that agree on each cell, among the pairs that
+    both decided it, NaN for the cells decided by fewer than two sessions."""
+    counts = one_hot(labels).sum(axis=0)
+    n_decided = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts * (counts - 1)).sum(axis=1) / (n_decided * (n_decided - 1))
+
+
+def fleiss_kappa(labels: np.ndarray) -> float:
+    """Fleiss' kappa over the cells decided by at least two sessions, which allows a
+    different number of raters for each cell."""
+    counts = one_hot(labels).sum(axis=0)
+    n_decided = counts.sum(axis=1)
+    rated = n_decided >= 2
+    if not rated.any():
+        return float("nan")
+    counts, n_decided = counts[rated], n_decided[rated]
+    agreeing_pairs = (counts * (counts - 1)).sum(axis=1)
+    observed = (agreeing_pairs / (n_decided * (n_decided - 1))).mean()
+    proportions = counts.sum(axis=0) / n_decided.sum()
+    expected = (proportions**2).sum()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return float((observed - expected) / (1 - expected))
+
+
+def cohen_kappa(labels: np.ndarray) -> np.ndarray:
+    """Cohen's kappa of every pair of sessions over the cells both decided."""
+    hot = one_hot(labels)
+    decided = hot.sum(axis=2)
+    flat = hot.reshape(len(labels), -1)
+    n_common = decided @ decided.T
+    # Label counts of each session on the cells decided by the other
+    marginals = hot.transpose(2, 0, 1) @ decided.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = (flat @ flat.T) / n_common
+        expected = (marginals * marginals.transpose(0, 2, 1)).sum(axis=0) / n_common**2
+        return (observed - expected) / (1 - expected)
+
+
+def temporal_awareness(labels: np.ndarray, required: np.ndarray) -> np.ndarray:
+    """Temporal awareness F1 of every pair of sessions.
+
+    The precision of a session against another is the fraction of the relations it had
+    to annotate that are in the closure of the other, and its recall the precision of
+    the other against it.
+    """
+    hot = one_hot(labels)
+    flat = hot.reshape(len(labels), -1)
+    required_flat = (hot * required[..., None]).reshape(len(labels), -1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = (required_flat @ flat.T) / required.sum(axis=1)[:, None]
+        recall = precision.T
+        return 2 * precision * recall / (precision + recall)
+
+
+def nan_mean(values: np.ndarray) -> float | None:
+    """Mean of the values that are not NaN, `None` if there are none."""
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else None
+
+
+def document_agreement(records: list[dict], cells: bool = False) -> dict:
+    """Agreement between the records of the same document.
+
+    Args:
+        records: The records of the sessions of the document.
+        cells: Also return the agreement on each cell, as a board with `None` on the
+            cells that are masked or decided by fewer than two sessions.
+    """
+    labels, required = stack_boards(records)
+    agreement = cell_agreement(labels)
+    pairs = ~np.eye(len(records), dtype=bool)
+    kappa = fleiss_kappa(labels)
+    result = {
+        "sessions": [session_label(record["doc"]) for record in records],
+        "n_cells": labels.shape[1],
+        "coverage": nan_mean((labels != UNCLASSIFIED_POSITION).ravel().astype(float)),
+        "observed_agreement": nan_mean(agreement),
+        "fleiss_kappa": None if np.isnan(kappa) else kappa,
+        "cohen_kappa": nan_mean(cohen_kappa(labels)[pairs]),
+        "temporal_awareness": nan_mean(temporal_awareness(labels, required)[pairs]),
+    }
+    if cells:
+        endpoints, (rows, cols), _ = board_endpoints(records[0])
+        board = np.full((len(endpoints), len(endpoints)), None)
+        board[rows, cols] = np.where(np.isnan(agreement), None, agreement)
+        result["cells"] = board.tolist()
+    return result
+
+
+def agreement(records: Iterable[dict], cells: bool = False) -> list[dict]:
+    """Agreement between the sessions of each document of the records."""
+    return [
+        document_agreement(group, cells) for group in group_records(records).values()
+    ]
@@ -40,6 +40,8 @@ NEW_TOKENS = [
 
 
 class Endpoint:
+    __slots__ = ("id", "text", "type", "offsets")
+
     def __init__(
         self,
         id: str,
@@ -61,6 +63,8 @@ class Endpoint:
 
 
 class EntityPair:
+    __slots__ = ("source", "target")
+
     def __init__(self, source: str, target: str):
         self.source = source
         self.target = target
@@ -195,6 +199,11 @@ class Timeline:
         self._relations.add(relation)
         self._closure = self._compute_closure(self._relations)
 
+    def update(self, relations: List[PointRelation]):
+        """Add several relations, computing the closure only once."""
+        self._relations.update(relations)
+        self._closure = self._compute_closure(self._relations)
+
     @staticmethod
     def _compute_closure(relations: Set[PointRelation]) -> Set[PointRelation]:
         """Compute the closure of the relations."""
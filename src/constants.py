@@ -15,3 +15,63 @@ IMGS_DIR = ROOT_DIR / "imgs"
 IMGS_GAME_DIR = IMGS_DIR / "game"
 MODELS_DIR = ROOT_DIR / "models"
 HF_DIR = ROOT_DIR / "data" / "hf"
+DIFFICULTY_DIR = ROOT_DIR / "data" / "difficulty"
+
+# Fraction of the requests and game stages whose latency is recorded (0 disables it)
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+
+# Sessions kept in memory before the least recently used is evicted (0 keeps all)
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000")) or None
+
+# ASGI server (python -m asgi)
+HOST = os.getenv("HOST", "127.0.0.1")
+PORT = int(os.getenv("PORT", "5000"))
+# Threads running the game and annotation handlers
+REQUEST_WORKERS = int(os.getenv("REQUEST_WORKERS", "32"))
+# Threads running the event tagger and the requests to the timex tagger service
+EVENT_TAGGER_WORKERS = int(os.getenv("EVENT_TAGGER_WORKERS", "2"))
+TIMEX_TAGGER_WORKERS = int(os.getenv("TIMEX_TAGGER_WORKERS", "8"))
+# Tagging requests admitted at once, the others are rejected with a 503
+MAX_PENDING_TAGGING = int(os.getenv("MAX_PENDING_TAGGING", "64"))
+# Texts longer than EVENT_TAGGER_CHUNK_CHARS are tagged by chunks of whole sentences,
+# spread over EVENT_TAGGER_PROCESSES worker processes (1 tags them in the server
+# process). Each worker holds its own copy of the model in memory.
+EVENT_TAGGER_CHUNK_CHARS = int(os.getenv("EVENT_TAGGER_CHUNK_CHARS", "10000"))
+EVENT_TAGGER_PROCESSES = int(os.getenv("EVENT_TAGGER_PROCESSES", "2"))
+TIMEX_TAGGER_URL = os.getenv("TIMEX_TAGGER_URL", "http://localhost:8000/annotate")
+TIMEX_TAGGER_TIMEOUT = float(os.getenv("TIMEX_TAGGER_TIMEOUT", "30"))
+# Threads running the relation classifier
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "1"))
+# Relation classifier, a Hugging Face model id or a local path, optionally with its
+# linear layers quantized to int8 and a bound on the threads of torch (0 keeps torch's)
+RELATION_MODEL = os.getenv("RELATION_MODEL", "hugosousa/smol-135-ac-a4eaad65")
+RELATION_MODEL_QUANTIZE = os.getenv("RELATION_MODEL_QUANTIZE", "0") == "1"
+RELATION_MODEL_THREADS = int(os.getenv("RELATION_MODEL_THREADS", "0")) or None
+# Label distributions of the entity pairs kept in memory by the relation classifier
+# (0 disables the cache), and the SQLite file that also keeps them across restarts
+RELATION_CACHE_SIZE = int(os.getenv("RELATION_CACHE_SIZE", "50000"))
+RELATION_CACHE_PATH = os.getenv("RELATION_CACHE_PATH") or None
+# Relation suggestions are scored for the entities at most this many entities apart
+SUGGESTION_WINDOW = int(os.getenv("SUGGESTION_WINDOW", "5"))
+SUGGESTION_BATCH_SIZE = int(os.getenv("SUGGESTION_BATCH_SIZE", "32"))
+
+# Trace of the game and annotation requests, for `scripts.replay` (unset disables it)
+TRACE_FILE = os.getenv("TRACE_FILE") or None
+
+# Logging, the file holds JSON records and is rotated once it reaches LOG_MAX_BYTES
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "temporal_game.log") or None
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+
+# Games kept ready per level for /api/new_game (0 disables the pool), and the maximum
+# pickled size of all the pooled games
+GAME_POOL_SIZE = int(os.getenv("GAME_POOL_SIZE", "8"))
+GAME_POOL_MAX_BYTES = int(os.getenv("GAME_POOL_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Annotation sessions with at least this many entities keep a sparse board (0 only
+# does it when requested), served by windows of BOARD_WINDOW_SENTENCES sentences
+# related to the next BOARD_WINDOW_DISTANCE sentences
+SPARSE_BOARD_MIN_ENTITIES = int(os.getenv("SPARSE_BOARD_MIN_ENTITIES", "0")) or None
+BOARD_WINDOW_SENTENCES = int(os.getenv("BOARD_WINDOW_SENTENCES", "5"))
+BOARD_WINDOW_DISTANCE = int(os.getenv("BOARD_WINDOW_DISTANCE", "2"))
@@ -0,0 +1,249 @@
+"""Difficulty index of the game datasets and a curriculum sampler on top of it.
+
+The index holds, for every document of a dataset, its number of endpoints and
+relations, the count of each relation type, the number of relations that have to be
+annotated because no other relations imply them, and the closure expansion ratio, the
+relations of the document over the ones that have to be annotated. The difficulty of a
+document is the number of board cells a player has to annotate, the required relations
+and the cells without a relation, which tracks the steps the oracle solver takes.
+
+The index is built once per dataset and cached in `DIFFICULTY_DIR` under a hash of the
+paths, sizes and modification times of the files of the dataset, so it is rebuilt when
+the dataset changes. The datasets held in memory have no files and are not cached.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from typing import Iterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.constants import DIFFICULTY_DIR
+
+logger = logging.getLogger(__name__)
+
+RELATION_COLUMNS = {">": "n_after", "<": "n_before", "=": "n_equal", "-": "n_none"}
+
+
+def implied_relations(
+    before: np.ndarray, equal: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Cells whose before and equal relations are implied by two relations through a
+    third endpoint.
+
+    Args:
+        before: Float matrix of the pairs of endpoints where the row is before the
+            column, or a stack of them.
+        equal: Symmetric float matrix of the pairs of equal endpoints, or a stack of
+            them. The diagonals of both are empty, so the paths never go through the
+            endpoints of the cell.
+    """
+    not_after = np.maximum(before, equal)
+    return (before @ not_after + not_after @ before) > 0, (equal @ equal) > 0
+
+
+def required_relations(entities: list[dict], relations: list[dict]) -> np.ndarray:
+    """Mask of the relations of a document that are not implied by two relations
+    through a third endpoint.
+
+    The documents of the closure datasets hold every relation their closure infers, so
+    these are the relations a player has to annotate for the game to infer the others.
+    The `-` relations are left out, since they imply nothing.
+    """
+    endpoints, starts = {}, []
+    for entity in entities:
+        if entity.get("type", "interval") == "instant":
+            endpoints[f"instant {entity['id']}"] = len(endpoints)
+        else:
+            starts.append(len(endpoints))
+            endpoints[f"start {entity['id']}"] = len(endpoints)
+            endpoints[f"end {entity['id']}"] = len(endpoints)
+
+    if not relations:
+        return np.zeros(0, dtype=bool)
+    sources = np.array([endpoints[relation["source"]] for relation in relations])
+    targets = np.array([endpoints[relation["target"]] for relation in relations])
+    types = np.array([relation["relation"] for relation in relations])
+    # Every relation as `lower <= upper`
+    is_after = types == ">"
+    lower = np.where(is_after, targets, sources)
+    upper = np.where(is_after, sources, targets)
+    is_equal = types == "="
+    is_before = ~is_equal & (types != "-")
+
+    n_endpoints = len(endpoints)
+    before = np.zeros((n_endpoints, n_endpoints), dtype=np.float32)
+    equal = np.zeros((n_endpoints, n_endpoints), dtype=np.float32)
+    # The start of an interval is before its end
+    before[starts, np.add(starts, 1)] = 1
+    before[lower[is_before], upper[is_before]] = 1
+    equal[lower[is_equal], upper[is_equal]] = 1
+    equal[upper[is_equal], lower[is_equal]] = 1
+
+    implied_before, implied_equal = implied_relations(before, equal)
+    implied = np.where(
+        is_equal, implied_equal[lower, upper], implied_before[lower, upper]
+    )
+    return (is_before | is_equal) & ~implied
+
+
+def n_required_relations(entities: list[dict], relations: list[dict]) -> int:
+    """Number of relations of a document that have to be annotated."""
+    return int(required_relations(entities, relations).sum())
+
+
+def batch_index(batch: pa.Table) -> dict[str, np.ndarray]:
+    """Index of a batch of documents."""
+    n_entities = pc.list_value_length(batch["entities"]).to_numpy()
+    entities = pc.list_flatten(batch["entities"])
+    if "type" in entities.type.names:
+        is_instant = pc.equal(pc.struct_field(entities, "type"), "instant")
+        is_instant = pc.fill_null(is_instant, False).to_numpy(zero_copy_only=False)
+        parents = pc.list_parent_indices(batch["entities"]).to_numpy()
+        n_instants = np.bincount(parents, weights=is_instant, minlength=len(batch))
+    else:
+        n_instants = np.zeros(len(batch))
+
+    n_relations = pc.list_value_length(batch["relations"]).to_numpy()
+    relation_types = pc.struct_field(pc.list_flatten(batch["relations"]), "relation")
+    relation_parents = pc.list_parent_indices(batch["relations"]).to_numpy()
+    n_endpoints = 2 * n_entities - n_instants
+    # Lower triangle of the board without the pairs of endpoints of the same entity
+    n_board_cells = n_endpoints * (n_endpoints - 1) // 2 - (n_entities - n_instants)
+    index = {
+        "n_endpoints": n_endpoints.astype(np.int32),
+        "n_board_cells": n_board_cells.astype(np.int32),
+        "n_relations": n_relations.astype(np.int32),
+    }
+    for relation, column in RELATION_COLUMNS.items():
+        is_type = pc.equal(relation_types, relation).to_numpy(zero_copy_only=False)
+        index[column] = np.bincount(
+            relation_parents, weights=is_type, minlength=len(batch)
+        ).astype(np.int32)
+
+    index["n_required"] = np.array(
+        [
+            n_required_relations(entities, relations)
+            for entities, relations in zip(
+                batch["entities"].to_pylist(), batch["relations"].to_pylist()
+            )
+        ],
+        dtype=np.int32,
+    )
+    index["closure_expansion"] = index["n_relations"] / np.maximum(
+        index["n_required"], 1
+    )
+    n_related_cells = index["n_relations"] - index["n_none"]
+    index["difficulty"] = index["n_board_cells"] - n_related_cells + index["n_required"]
+    return index
+
+
+def build_index(dataset, batch_size: int = 1_000) -> dict[str, np.ndarray]:
+    """Difficulty index of a `datasets.Dataset` of games, with a row per document."""
+    batches = [
+        batch_index(batch)
+        for batch in dataset.with_format("arrow").iter(batch_size=batch_size)
+    ]
+    if not batches:
+        return {}
+    return {
+        column: np.concatenate([batch[column] for batch in batches])
+        for column in batches[0]
+    }
+
+
+def index_key(dataset) -> str | None:
+    """Key of the cached index of the dataset, `None` if it is not backed by files."""
+    if not dataset.cache_files:
+        return None
+    files = []
+    for cache_file in dataset.cache_files:
+        stat = os.stat(cache_file["filename"])
+        files.append([cache_file["filename"], stat.st_size, stat.st_mtime_ns])
+    key = json.dumps([files, len(dataset), dataset.features.to_dict()], sort_keys=True)
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def load_index(dataset) -> dict[str, np.ndarray]:
+    """Difficulty index of the dataset, read from the cache or built and cached."""
+    key = index_key(dataset)
+    path = DIFFICULTY_DIR / f"{key}.npz" if key is not None else None
+    if path is not None and path.exists():
+        with np.load(path) as cached:
+            return dict(cached)
+
+    start = time.perf_counter()
+    index = build_index(dataset)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, **index)
+    logger.info(
+        "Built the difficulty index of %s documents",
+        len(dataset),
+        extra={"duration_ms": round(1000 * (time.perf_counter() - start), 3)},
+    )
+    return index
+
+
+class DifficultySampler:
+    """Draw documents of a dataset by difficulty.
+
+    The documents are sorted once by difficulty, ties broken by their number of
+    endpoints, so a difficulty band given as quantiles is a slice of the order and a
+    draw is a single random index into it.
+
+    Args:
+        index: The difficulty index of the dataset.
+        seed: Seed of the random draws.
+    """
+
+    def __init__(self, index: dict[str, np.ndarray], seed: int | None = None):
+        self.order = np.lexsort((index["n_endpoints"], index["difficulty"]))
+        self.rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def bounds(self, low: float, high: float) -> tuple[int, int]:
+        """Slice of the order with the documents between the `low` and `high`
+        quantiles of difficulty, never empty."""
+        n_docs = len(self.order)
+        if n_docs == 0:
+            raise IndexError("Cannot sample from an empty dataset")
+        start = min(max(int(low * n_docs), 0), n_docs - 1)
+        stop = min(max(math.ceil(high * n_docs), start + 1), n_docs)
+        return start, stop
+
+    def band(self, low: float, high: float) -> np.ndarray:
+        """Indices of the documents between the `low` and `high` quantiles."""
+        return self.order[slice(*self.bounds(low, high))]
+
+    def sample(self, low: float = 0.0, high: float = 1.0) -> int:
+        """Index of a random document between the `low` and `high` quantiles."""
+        return int(self.order[self.rng.randrange(*self.bounds(low, high))])
+
+    def curriculum(self, progress: float, width: float = 0.2) -> int:
+        """Index of a random document for a curriculum at `progress`, from 0 to 1.
+
+        The band of the draws is `width` quantiles wide and slides from the easiest
+        documents at the start of the curriculum to the hardest at its end.
+        """
+        low = min(max(progress, 0.0), 1.0) * (1 - width)
+        return self.sample(low, low + width)
+
+
+def iter_curriculum(
+    docs, n_games: int, width: float = 0.2, seed: int | None = None
+) -> Iterator[dict]:
+    """Documents of `docs` for `n_games` training games, from the easiest to the
+    hardest."""
+    sampler = DifficultySampler(load_index(docs), seed)
+    for step in range(n_games):
+        yield docs[sampler.curriculum(step / max(n_games - 1, 1), width)]
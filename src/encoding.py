@@ -0,0 +1,46 @@
+"""Compact encoding of the boards sent to the clients.
+
+Only the cells above the diagonal of a board can hold a relation, so the encoding keeps
+those cells as int8 bytes in base64, column by column, which is the lower triangle of
+the transposed board read row by row. The rows and columns that have a cell that is
+not masked are sent along, so the clients do not scan the board for them.
+"""
+
+import base64
+import functools
+
+import numpy as np
+
+from src.env import MASKED_POSITION
+
+BOARD_ENCODING = "tril_int8"
+
+
+@functools.lru_cache(maxsize=64)
+def cell_indices(n_endpoints: int) -> tuple[np.ndarray, np.ndarray]:
+    """Indices of the encoded cells in the transposed board, shared by the boards of a
+    size."""
+    return np.tril_indices(n_endpoints, -1)
+
+
+def encode_board(board: np.ndarray) -> dict:
+    """Encode a dense board, as kept in the state of the game, without copying it to
+    Python lists."""
+    n_endpoints = len(board)
+    cells = board.T[cell_indices(n_endpoints)].astype(np.int8, copy=False)
+    visible = board != MASKED_POSITION
+    return {
+        "encoding": BOARD_ENCODING,
+        "size": n_endpoints,
+        "cells": base64.b64encode(cells.tobytes()).decode(),
+        "visible_rows": np.flatnonzero(visible.any(axis=1)).tolist(),
+        "visible_cols": np.flatnonzero(visible.any(axis=0)).tolist(),
+    }
+
+
+def decode_board(encoded: dict) -> np.ndarray:
+    n_endpoints = encoded["size"]
+    cells = np.frombuffer(base64.b64decode(encoded["cells"]), dtype=np.int8)
+    board = np.full((n_endpoints, n_endpoints), MASKED_POSITION, dtype=int)
+    board.T[cell_indices(n_endpoints)] = cells
+    return board
@@ -1,12 +1,13 @@
-import copy
+import functools
+import math
 from dataclasses import dataclass
 from typing import Literal
 
-import datasets
 import numpy as np
 
 from src.base import (
     ENDPOINTS,
+    N_RELATIONS,
     RELATIONS2ID,
     Endpoint,
     EntityPair,
@@ -14,7 +15,8 @@ from src.base import (
     Timeline,
 )
 from src.constants import HF_DIR
-from src.utils import add_tags
+from src.metrics import metrics
+from src.utils import add_tags, sentence_starts
 
 UNCLASSIFIED_POSITION = -1
 MASKED_POSITION = -2
@@ -35,12 +37,26 @@ REWARD_INVALID = -1.0
 REWARD_VALID = 0.0
 
 
+def transitive_closure(adjacency: np.ndarray) -> np.ndarray:
+    """Transitive closure of a reflexive boolean adjacency matrix."""
+    reach = adjacency
+    while True:
+        paths = reach.astype(np.float32)
+        closed = reach | (paths @ paths > 0)
+        if (closed == reach).all():
+            return reach
+        reach = closed
+
+
 def load_documents(
     level: int,
     closure: bool = True,
     mode: Literal["train", "valid", "test"] = "test",
     level_lower_or_equal: bool = False,
 ):
+    # Importing datasets takes about a second, so it is only done to load the games
+    import datasets
+
     data_split = "default" if not closure else "closure"
 
     if level_lower_or_equal:
@@ -63,29 +79,136 @@ class GameTracker:
     n_inferred: int = 0
     n_annotated: int = 0
     n_annotated_correct: int = 0
+    is_valid: bool = True
     new_relations: set = None
     timeline_history: list = None
     board_history: list = None
+    validity_history: list = None
 
     def __post_init__(self):
         if self.timeline_history is None:
             self.timeline_history = []
         if self.board_history is None:
             self.board_history = []
+        if self.validity_history is None:
+            self.validity_history = []
+
+
+class EndpointPairs:
+    """The cells of the board, which relate the endpoints of two different entities.
+
+    The cells are the pairs of endpoints `(i, j)` with `i < j` that belong to different
+    entities. Only the entity of each endpoint and the position of each endpoint string
+    are stored, so the pairs and their endpoint strings are computed when needed.
+    """
+
+    def __init__(self, endpoints: list[Endpoint]):
+        self.endpoints = endpoints
+        self.n_endpoints = len(endpoints)
+        entity_idxs = {}
+        self.entity_idx = np.array(
+            [entity_idxs.setdefault(edp.id, len(entity_idxs)) for edp in endpoints],
+            dtype=np.int32,
+        )
+        self.endpoint_idx = {str(edp): idx for idx, edp in enumerate(endpoints)}
+
+        entity_sizes = np.bincount(self.entity_idx)
+        self._len = int(
+            self.n_endpoints * (self.n_endpoints - 1) // 2
+            - (entity_sizes * (entity_sizes - 1) // 2).sum()
+        )
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        src_idx, tgt_idx = cell
+        return (
+            0 <= src_idx < tgt_idx < self.n_endpoints
+            and self.entity_idx[src_idx] != self.entity_idx[tgt_idx]
+        )
+
+    @staticmethod
+    def linear_index(src_idx, tgt_idx):
+        """Number of the pair `(src_idx, tgt_idx)`, with `src_idx < tgt_idx`, when the
+        pairs are numbered column by column, of ints or of arrays of them."""
+        return tgt_idx * (tgt_idx - 1) // 2 + src_idx
+
+    @staticmethod
+    def cell(linear_idx):
+        """The cell at `linear_idx`, the inverse of `linear_index`."""
+        if isinstance(linear_idx, np.ndarray):
+            tgt_idx = (1 + np.sqrt(1 + 8 * linear_idx.astype(np.float64))) // 2
+            tgt_idx = tgt_idx.astype(np.intp)
+        else:
+            tgt_idx = (1 + math.isqrt(1 + 8 * linear_idx)) // 2
+        return linear_idx - tgt_idx * (tgt_idx - 1) // 2, tgt_idx
+
+    @functools.cached_property
+    def _mask(self) -> np.ndarray:
+        different = self.entity_idx[:, None] != self.entity_idx[None, :]
+        mask = np.triu(different, k=1)
+        mask.setflags(write=False)
+        return mask
+
+    def mask(self) -> np.ndarray:
+        """Read-only boolean matrix of the cells of the board, built on the first call
+        so the sparse boards never hold it."""
+        return self._mask
+
+    def window_mask(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Boolean matrix of the cells of the board in the given rows and columns."""
+        rows, cols = np.asarray(rows), np.asarray(cols)
+        different = self.entity_idx[rows][:, None] != self.entity_idx[cols][None, :]
+        return different & (rows[:, None] < cols[None, :])
+
+    def endpoints_of(self, src_idx: int, tgt_idx: int) -> tuple[str, str]:
+        if (src_idx, tgt_idx) not in self:
+            raise KeyError((src_idx, tgt_idx))
+        return str(self.endpoints[src_idx]), str(self.endpoints[tgt_idx])
+
+    def positions(self, relations: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        """The rows and columns of the cells of the relations, found without building a
+        tuple per relation."""
+        src_idxs, tgt_idxs = (
+            np.fromiter(
+                (self.endpoint_idx[rel[key]] for rel in relations),
+                dtype=np.intp,
+                count=len(relations),
+            )
+            for key in ("source", "target")
+        )
+        is_cell = (src_idxs < tgt_idxs) & (
+            self.entity_idx[src_idxs] != self.entity_idx[tgt_idxs]
+        )
+        if not is_cell.all():
+            rel = relations[int(np.argmin(is_cell))]
+            raise KeyError((rel["source"], rel["target"]))
+        return src_idxs, tgt_idxs
+
+    def position(self, source: str, target: str) -> tuple[int, int]:
+        """The cell of the relation between the `source` and `target` endpoints."""
+        cell = self.endpoint_idx[source], self.endpoint_idx[target]
+        if cell not in self:
+            raise KeyError((source, target))
+        return cell
 
 
 class TemporalGame:
     def __init__(
         self,
         doc: dict,
+        sparse: bool = False,
     ):
         """
         Initialize the game.
 
         Args:
             doc (dict): The document annotated with temporal relations.
-            dim (int): The dimension of the game, i.e., the number of positions in the board to be filled.
+            sparse (bool): Keep the board as a dict of the decided cells, for documents
+                too long for a dense board. The board is then served by windows.
         """
+        self.sparse = sparse
         self.reward_map = {
             "<": REWARD_ANNOTATED_CORRECT,
             "=": REWARD_ANNOTATED_CORRECT,
@@ -93,27 +216,23 @@ class TemporalGame:
             "-": REWARD_ANNOTATED_CORRECT,
         }
 
-        entity_map = {}
+        self.entity_map = {}
         for eid, entity in enumerate(doc["entities"]):
             new_id = f"e{eid}"
-            entity_map[entity["id"]] = new_id
+            self.entity_map[entity["id"]] = new_id
             entity["id"] = new_id
 
         for rel in doc["relations"]:
-            old_src_id = rel["source"].split(" ")[1]
-            new_src_id = entity_map[old_src_id]
-            rel["source"] = rel["source"].replace(old_src_id, new_src_id)
-
-            old_tgt_id = rel["target"].split(" ")[1]
-            new_tgt_id = entity_map[old_tgt_id]
-            rel["target"] = rel["target"].replace(old_tgt_id, new_tgt_id)
-            
+            rel["source"] = self.map_endpoint(rel["source"])
+            rel["target"] = self.map_endpoint(rel["target"])
+
         # sort entities by offsets
-        doc["entities"].sort(key=lambda x: x["offsets"][0])
+        doc["entities"] = tuple(sorted(doc["entities"], key=lambda x: x["offsets"][0]))
 
+        # The predicted document shares the text and the entities of the true one, which
+        # are not modified after this point, and only holds its own relations
         self.true_doc = doc
-        self.pred_doc = copy.deepcopy(self.true_doc)
-        self.pred_doc["relations"] = []
+        self.pred_doc = {**doc, "relations": []}
 
         # Initialize endpoints and contexts
         internal_endpoints = [
@@ -133,55 +252,147 @@ class TemporalGame:
         
         self.n_endpoints = len(self.endpoints)
 
-        self.idx2edp_pair = {}
-        for tgt_idx, tgt_ept in enumerate(self.endpoints):  # TODO: Check if it is ok
-            for src_idx, src_ept in enumerate(self.endpoints):
-                if src_idx < tgt_idx and src_ept.id != tgt_ept.id:
-                    self.idx2edp_pair[(src_idx, tgt_idx)] = (str(src_ept), str(tgt_ept))
-
-        self.edp_pair2idx = {
-            (src, tgt): (src_idx, tgt_idx)
-            for (src_idx, tgt_idx), (src, tgt) in self.idx2edp_pair.items()
-        }
-        self.true_timeline = Timeline(
-            [PointRelation(**rel) for rel in self.true_doc["relations"]]
-        )
+        self.pairs = EndpointPairs(self.endpoints)
+        with metrics.stage("init_true_timeline"):
+            self.true_timeline = Timeline(
+                [PointRelation(**rel) for rel in self.true_doc["relations"]]
+            )
         self.entity_pairs = set(
             EntityPair(rel["source"], rel["target"])
             for rel in self.true_doc["relations"]
         )
         self.pred_timeline = Timeline()
-        self.state = self.init_state()
+        with metrics.stage("init_state"):
+            self.state = self.init_state()
 
         self.tracker = GameTracker()
 
     def reset(self):
         return self.state, self.get_info(terminated=False, is_success=False)
 
+    def map_endpoint(self, endpoint: str) -> str:
+        """Map an endpoint of the original document, e.g. `start ei1`, to game ids."""
+        endpoint_type, _, entity_id = endpoint.partition(" ")
+        return f"{endpoint_type} {self.entity_map[entity_id]}"
+
+    def load_relations(self, relations: list[dict]) -> dict:
+        """Load existing annotations into the predicted timeline.
+
+        Each relation is either an action-like `{"position": [i, j], "relation": r}` or
+        a `{"source", "target", "relation"}` dict with the endpoints in the ids of the
+        original document. All the relations are added with a single closure and board
+        computation and are not recorded in the undo history.
+
+        Raises:
+            ValueError: If a relation names an unknown entity or endpoint, or is not a
+                point relation. The message names the first such relation.
+        """
+        point_relations = []
+        for idx, rel in enumerate(relations):
+            try:
+                point_relations.append(self.imported_relation(rel))
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"Invalid relation {idx} {rel}: {e}") from e
+
+        self.state["board"] = self.add_relations(point_relations, check_validity=True)
+        return self.state
+
+    def imported_relation(self, rel: dict) -> PointRelation:
+        """The point relation of a relation given to `load_relations`."""
+        if "position" in rel:
+            return self.action_to_relation((rel["position"], rel["relation"]))
+        relation = PointRelation(
+            source=self.map_endpoint(rel["source"]),
+            target=self.map_endpoint(rel["target"]),
+            relation=rel["relation"],
+        )
+        for endpoint in (relation.source, relation.target):
+            if endpoint not in self.pairs.endpoint_idx:
+                raise KeyError(endpoint)
+        return relation
+
     def step(
         self, action: tuple[tuple[int, int], str]
     ) -> tuple[dict, float, bool, bool, dict]:
         """Take a step in the game."""
         # Save current state before making changes
-        self.save_state_for_undo()
+        with metrics.stage("undo_snapshot"):
+            self.save_state_for_undo()
 
         self.tracker.step_id += 1
 
         self.state["board"] = self.update_board(action)
-        terminated, is_success = self.terminated
-        reward = self.compute_step_reward(terminated, is_success)
+        with metrics.stage("validity"):
+            terminated, is_success = self.terminated
+        with metrics.stage("reward"):
+            reward = self.compute_step_reward(terminated, is_success)
+        info = self.get_info(terminated=terminated, is_success=is_success)
+        return self.state, reward, terminated, info
+
+    def step_many(
+        self, actions: list[tuple[tuple[int, int], str]]
+    ) -> tuple[dict, float, bool, dict]:
+        """Take several actions as a single step.
+
+        The relations of all the actions are added at once, so the closure, the board
+        and the validity are computed only once, and the whole batch is undone by a
+        single undo. Besides the usual info, it reports the reward of the relation
+        annotated by each action (`action_rewards`) and the index of the first action
+        that makes the timeline contradictory (`first_invalid_action`), if any.
+        """
+        relations = [self.action_to_relation(action) for action in actions]
+
+        with metrics.stage("undo_snapshot"):
+            self.save_state_for_undo()
+
+        self.tracker.step_id += 1
+
+        self.state["board"] = self.add_relations(relations, check_validity=True)
+        with metrics.stage("validity"):
+            terminated, is_success = self.terminated
+        if not self.tracker.is_valid:
+            terminated, is_success = True, False
+        with metrics.stage("reward"):
+            reward = self.compute_step_reward(terminated, is_success)
+            action_rewards = [self.relation_reward(rel) for rel in relations]
+
         info = self.get_info(terminated=terminated, is_success=is_success)
+        info["action_rewards"] = action_rewards
+        info["first_invalid_action"] = None
+        if not self.tracker.is_valid:
+            info["first_invalid_action"] = self.first_invalid_relation(relations)
         return self.state, reward, terminated, info
 
+    def relation_reward(self, relation: PointRelation) -> float:
+        """Reward of annotating a single relation."""
+        if relation in self.true_timeline.relations:
+            return self.reward_map[relation.type]
+        if EntityPair(relation.source, relation.target) in self.entity_pairs:
+            return -self.reward_map[relation.type]
+        return 0.0
+
+    def first_invalid_relation(self, relations: list[PointRelation]) -> int:
+        """Index of the first of the relations added in the last step that makes the
+        timeline contradictory, found with O(log n) closure computations."""
+        previous = list(self.tracker.timeline_history[-1].relations)
+        lo, hi = 0, len(relations) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if Timeline(previous + relations[: mid + 1]).is_valid:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
     def save_state_for_undo(self):
         """Save current timeline and board state for undo functionality."""
         # Deep copy the current timeline to preserve state
         current_timeline_copy = Timeline(list(self.pred_timeline.relations))
         self.tracker.timeline_history.append(current_timeline_copy)
 
-        # Save current board state
-        current_board = self.make_board(self.pred_doc["relations"])
-        self.tracker.board_history.append(current_board)
+        # The boards are replaced by each step and never modified, so they are shared
+        self.tracker.board_history.append(self.state["board"])
+        self.tracker.validity_history.append(self.tracker.is_valid)
 
     def undo_last_action(self) -> bool:
         """Undo the last action and restore previous state.
@@ -208,66 +419,260 @@ class TemporalGame:
         # Decrement step counter
         if self.tracker.step_id > 0:
             self.tracker.step_id -= 1
+        if self.tracker.validity_history:
+            self.tracker.is_valid = self.tracker.validity_history.pop()
 
         return True
 
     def init_state(self):
-        context = add_tags(self.true_doc["text"], self.true_doc["entities"])
+        context, entity_spans = add_tags(
+            self.true_doc["text"], self.true_doc["entities"], return_spans=True
+        )
         board = self.make_board()
         endpoints = [f"{edp.type} {edp.text}" for edp in self.endpoints]
         return {
             "context": context,
+            "entity_spans": entity_spans,
             "board": board,
             "endpoints": endpoints,
             "entities": [ent["text"] for ent in self.true_doc["entities"]],
         }
 
-    def update_board(self, action):
-        """Update the environment state based on the action."""
+    def action_to_relation(self, action) -> PointRelation:
+        """Convert an action into the relation it annotates."""
         [src_idx, tgt_idx], relation = action
-        src_endpoint, tgt_endpoint = self.idx2edp_pair[(src_idx, tgt_idx)]
-
-        # Add the new relation
-        relation = PointRelation(
+        src_endpoint, tgt_endpoint = self.pairs.endpoints_of(src_idx, tgt_idx)
+        return PointRelation(
             source=src_endpoint,
             target=tgt_endpoint,
             relation=relation,
         )
-        self.pred_timeline.add(relation)
 
-        # Update inferred relations count
-        inferred_relations = (
-            self.pred_timeline.closure.relations - self.pred_timeline.relations
-        )
-        self.tracker.n_inferred += len(inferred_relations)
+    def update_board(self, action):
+        """Update the environment state based on the action."""
+        relations = [self.action_to_relation(action)]
+        return self.add_relations(relations, check_validity=True)
 
-        # Keep the new annotated relations to compute the reward
-        self.tracker.new_relations = inferred_relations | {relation}
-        self.tracker.n_annotated += len(self.tracker.new_relations)
+    def add_relations(
+        self, relations: list[PointRelation], check_validity: bool = False
+    ):
+        """Add relations to the predicted timeline and return the new board.
 
-        # Update the timeline
-        ent_ids = [ent["id"] for ent in self.true_doc["entities"]]
-        self.pred_timeline = self.pred_timeline.closure.sort(ent_ids)
-        self.pred_doc["relations"] = self.pred_timeline.to_dict()
+        With `check_validity`, whether the annotated relations contradict each other is
+        stored in `tracker.is_valid` before the timeline is replaced by its closure.
+        """
+        with metrics.stage("timeline_update"):
+            self.pred_timeline.update(relations)
+        if check_validity:
+            with metrics.stage("validity"):
+                self.tracker.is_valid = self.pred_timeline.is_valid
+
+        with metrics.stage("closure"):
+            closure = self.pred_timeline.closure
+
+            # Update inferred relations count
+            inferred_relations = closure.relations - self.pred_timeline.relations
+            self.tracker.n_inferred += len(inferred_relations)
+
+            # Keep the new annotated relations to compute the reward
+            self.tracker.new_relations = inferred_relations | set(relations)
+            self.tracker.n_annotated += len(self.tracker.new_relations)
+
+            # Update the timeline
+            ent_ids = [ent["id"] for ent in self.true_doc["entities"]]
+            self.pred_timeline = closure.sort(ent_ids)
+            self.pred_doc["relations"] = self.pred_timeline.to_dict()
 
         # Update board state
-        board = self.make_board(self.pred_doc["relations"])
+        with metrics.stage("board"):
+            board = self.make_board(self.pred_doc["relations"])
         return board
 
     def make_board(self, relations=None):
-        """Make the state of the environment."""
-        board = np.full(
-            shape=(self.n_endpoints, self.n_endpoints),
-            fill_value=MASKED_POSITION,
-            dtype=int,
+        """Make the state of the environment.
+
+        The board is an int8 array of the ids of the relations, which is encoded or
+        converted to lists only when it is sent to a client. In sparse mode the board is
+        a dict from the `linear_index` of the decided and inferred cells to the ids of
+        their relations, and the other cells are left out.
+        """
+        if self.sparse:
+            if not relations:
+                return {}
+            linear_idxs = self.pairs.linear_index(*self.pairs.positions(relations))
+            return dict(
+                zip(
+                    linear_idxs.tolist(),
+                    (RELATIONS2ID[rel["relation"]] for rel in relations),
+                )
+            )
+
+        board = np.where(self.pairs.mask(), UNCLASSIFIED_POSITION, MASKED_POSITION)
+        board = board.astype(np.int8)
+        if relations:
+            src_idxs, tgt_idxs = self.pairs.positions(relations)
+            board[src_idxs, tgt_idxs] = np.fromiter(
+                (RELATIONS2ID[rel["relation"]] for rel in relations),
+                dtype=np.int8,
+                count=len(relations),
+            )
+        return board
+
+    def board_array(self, board=None) -> np.ndarray:
+        """The board, by default the current one, as a dense array."""
+        if board is None:
+            board = self.state["board"]
+        if not self.sparse:
+            return board
+
+        dense = np.where(self.pairs.mask(), UNCLASSIFIED_POSITION, MASKED_POSITION)
+        dense = dense.astype(np.int8)
+        if board:
+            linear_idxs = np.fromiter(board, dtype=np.intp, count=len(board))
+            dense[self.pairs.cell(linear_idxs)] = np.fromiter(
+                board.values(), dtype=np.int8, count=len(board)
+            )
+        return dense
+
+    def window_index(
+        self, rows: list[int], cols: list[int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """The rows and columns of a window of the board, as arrays.
+
+        Raises:
+            IndexError: If the window is out of the board.
+        """
+        rows = np.asarray(rows, dtype=int)
+        cols = np.asarray(cols, dtype=int)
+        if ((rows < 0) | (rows >= self.n_endpoints)).any() or (
+            (cols < 0) | (cols >= self.n_endpoints)
+        ).any():
+            raise IndexError("The window is out of the board")
+        return rows, cols
+
+    def board_window(self, rows: list[int], cols: list[int]) -> list[list[int]]:
+        """The cells of the board in the given rows and columns."""
+        rows, cols = self.window_index(rows, cols)
+        if not self.sparse:
+            return self.state["board"][np.ix_(rows, cols)].tolist()
+
+        is_cell = self.pairs.window_mask(rows, cols)
+        window = np.where(is_cell, UNCLASSIFIED_POSITION, MASKED_POSITION)
+        board = self.state["board"]
+        window_rows, window_cols = is_cell.nonzero()
+        linear_idxs = self.pairs.linear_index(rows[window_rows], cols[window_cols])
+        window[window_rows, window_cols] = [
+            board.get(linear_idx, UNCLASSIFIED_POSITION)
+            for linear_idx in linear_idxs.tolist()
+        ]
+        return window.tolist()
+
+    def sentence_window(
+        self, first_sentence: int, n_sentences: int, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Rows and columns of the board window that relates the endpoints of
+        `n_sentences` sentences from `first_sentence` to those up to `k` sentences
+        after them.
+
+        Paging through the sentences covers every cell whose endpoints are at most `k`
+        sentences apart, since the endpoints are sorted by their offsets.
+        """
+        sentences = self.endpoint_sentences
+        last_sentence = first_sentence + n_sentences
+        rows = (sentences >= first_sentence) & (sentences < last_sentence)
+        cols = (sentences >= first_sentence) & (sentences < last_sentence + k)
+        return rows.nonzero()[0], cols.nonzero()[0]
+
+    @functools.cached_property
+    def sentence_offsets(self) -> list[int]:
+        """Offsets where the sentences of the text start."""
+        return sentence_starts(self.true_doc["text"])
+
+    @functools.cached_property
+    def endpoint_sentences(self) -> np.ndarray:
+        """Index of the sentence of each endpoint."""
+        offsets = [edp.offsets[0] for edp in self.endpoints]
+        return np.searchsorted(self.sentence_offsets, offsets, side="right") - 1
+
+    def reachability(self, board: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Order of the endpoints known from the board.
+
+        Returns:
+            tuple: The boolean matrices of the direct `i < j` relations, with the start of
+                each interval before its end, and of the `i <= j` relations closed under
+                transitivity.
+        """
+        before = (board == RELATIONS2ID["<"]) | (board == RELATIONS2ID[">"]).T
+        starts = {
+            edp.id: idx for idx, edp in enumerate(self.endpoints) if edp.type == "start"
+        }
+        for idx, edp in enumerate(self.endpoints):
+            if edp.type == "end":
+                before[starts[edp.id], idx] = True
+        equal = board == RELATIONS2ID["="]
+        eye = np.eye(self.n_endpoints, dtype=bool)
+        not_after = transitive_closure(before | equal | equal.T | eye)
+        return before, not_after
+
+    def legal_actions(
+        self,
+        undecided_only: bool = True,
+        rows: list[int] | None = None,
+        cols: list[int] | None = None,
+    ) -> np.ndarray:
+        """Mask of the actions that keep the predicted timeline consistent.
+
+        `mask[i, j, r]` is True when annotating the relation with id `r` in the cell
+        `(i, j)` does not contradict the timeline. It is computed in a single pass from
+        the reachability of the endpoints on the board, where the start of each
+        interval comes before its end. With `undecided_only` only the cells that are
+        not classified yet have legal actions; otherwise a classified cell only allows
+        its current relation. With `rows` and `cols`, only the mask of that window of
+        the board is returned, while the reachability is still that of the whole board.
+
+        Returns:
+            np.ndarray: Boolean mask of shape (n_rows, n_cols, N_RELATIONS).
+        """
+        board = self.board_array()
+        before, not_after = self.reachability(board)
+        not_after_f = not_after.astype(np.float32)
+        # A path with at least one strict edge
+        strictly_before = not_after_f @ before.astype(np.float32) @ not_after_f > 0
+
+        # Annotating i < j orders every a <= i before every b >= j, which contradicts
+        # the pairs (a, b) annotated as unknown
+        unknown = board == RELATIONS2ID["-"]
+        unknown_f = (unknown | unknown.T).astype(np.float32)
+        orders_unknown = not_after_f.T @ unknown_f @ not_after_f.T > 0
+
+        if rows is not None or cols is not None:
+            window = np.ix_(*self.window_index(rows, cols))
+            board, unknown = board[window], unknown[window]
+            not_before = not_after.T[window]
+            not_after = not_after[window]
+            strictly_after = strictly_before.T[window]
+            strictly_before = strictly_before[window]
+            orders_unknown_t = orders_unknown.T[window]
+            orders_unknown = orders_unknown[window]
+        else:
+            not_before = not_after.T
+            strictly_after = strictly_before.T
+            orders_unknown_t = orders_unknown.T
+
+        mask = np.empty((*board.shape, N_RELATIONS), dtype=bool)
+        mask[..., RELATIONS2ID["<"]] = ~(not_before | orders_unknown)
+        mask[..., RELATIONS2ID[">"]] = ~(not_after | orders_unknown_t)
+        mask[..., RELATIONS2ID["="]] = ~(
+            strictly_before | strictly_after | orders_unknown | orders_unknown_t
         )
-        for idx in self.idx2edp_pair.keys():
-            board[idx] = UNCLASSIFIED_POSITION
-        if relations is not None:
-            for rel in relations:
-                src_idx, tgt_idx = self.edp_pair2idx[(rel["source"], rel["target"])]
-                board[src_idx, tgt_idx] = RELATIONS2ID[rel["relation"]]
-        return board.tolist()
+        mask[..., RELATIONS2ID["-"]] = ~(not_after | not_before)
+        # An unknown relation is only consistent with itself
+        mask[unknown] = np.arange(N_RELATIONS) == RELATIONS2ID["-"]
+
+        cells = board == UNCLASSIFIED_POSITION
+        if not undecided_only:
+            cells |= board != MASKED_POSITION
+        return mask & cells[..., None]
 
     @property
     def terminated(self):
@@ -275,7 +680,7 @@ class TemporalGame:
         is_success = False
         terminated = False
 
-        if not self.pred_timeline.is_valid:
+        if not self.tracker.is_valid:
             terminated = True
         elif self.all_classified:
             terminated = True
@@ -316,10 +721,10 @@ class TemporalGame:
     @property
     def all_classified(self):
         """True if all the positions are classified. Otherwise False."""
-        for [src_idx, tgt_idx] in self.idx2edp_pair.keys():
-            if self.state["board"][src_idx][tgt_idx] == UNCLASSIFIED_POSITION:
-                return False
-        return True
+        if self.sparse:
+            return len(self.state["board"]) >= len(self.pairs)
+        board = self.state["board"]
+        return not (board[self.pairs.mask()] == UNCLASSIFIED_POSITION).any()
 
     def get_info(self, terminated, is_success):
         """Prepare the info dictionary for the step."""
@@ -340,7 +745,8 @@ class TemporalGame:
         Returns:
             tuple: (observation dict, info dict, success bool)
         """
-        success = self.undo_last_action()
+        with metrics.stage("undo"):
+            success = self.undo_last_action()
         if success:
             obs = self.state
             terminated, is_success = self.terminated
@@ -356,5 +762,5 @@ class TemporalGame:
     @property
     def n_relations(self):
         """Number of relations in the true timeline."""
-        return len(self.edp_pair2idx)
+        return len(self.pairs)
     
\ No newline at end of file
@@ -1,20 +1,127 @@
-from tieval.base import Document
-from tieval.models.identification.event import EventIdentificationBaseline
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from src.constants import EVENT_TAGGER_CHUNK_CHARS, EVENT_TAGGER_PROCESSES
+from src.utils import chunk_text
+
+# Model of a worker process of the tagger
+_worker_model = None
+
+
+def load_model():
+    # tieval's models pull in the ML stack, so they are imported with the tagger
+    from tieval.models.identification.event import EventIdentificationBaseline
+
+    return EventIdentificationBaseline()
+
+
+def predict(model, chunks: list[tuple[int, str]]) -> list[dict]:
+    """Events of the `(offset, chunk)` pairs, with their offsets in the whole text."""
+    from tieval.base import Document
+
+    docs = [
+        Document(name=str(idx), text=chunk, dct=None, entities=[], tlinks=[])
+        for idx, (_, chunk) in enumerate(chunks)
+    ]
+    predictions = model.predict(docs)
+    return [
+        {
+            "text": event.text,
+            "offsets": [offset + event.offsets[0], offset + event.offsets[1]],
+            "type": "interval",
+        }
+        for idx, (offset, _) in enumerate(chunks)
+        for event in predictions[str(idx)]
+    ]
+
+
+def init_worker():
+    global _worker_model
+    _worker_model = load_model()
+
+
+def predict_in_worker(chunk: tuple[int, str]) -> list[dict]:
+    return predict(_worker_model, [chunk])
+
+
+class TaggingCancelled(Exception):
+    """The tagging of a text was stopped by its `cancelled` event."""
+
+
+def merge_events(events: list[dict]) -> list[dict]:
+    """Events sorted by offsets, each span kept once."""
+    merged = {}
+    for event in events:
+        merged.setdefault(tuple(event["offsets"]), event)
+    return [merged[offsets] for offsets in sorted(merged)]
 
 
 class EventTagger:
-    def __init__(self):
-        self.model = EventIdentificationBaseline()
-
-    def __call__(self, text: str) -> list[dict]:
-        doc = Document(name="doc", text=text, dct=None, entities=[], tlinks=[])
-        events = self.model.predict([doc])["doc"]
-        result = [
-            {
-                "text": event.text,
-                "offsets": list(event.offsets),
-                "type": "interval",
-            } 
-            for event in events
-        ]
-        return result
+    """Event identification with the tieval baseline.
+
+    Texts longer than `chunk_chars` are split into chunks of whole sentences that are
+    tagged one at a time, which bounds the memory of the model, and in parallel by
+    `n_processes` worker processes. Each worker loads its own copy of the model, so every
+    process adds the memory of a model to the server's. The workers are only started by
+    the first long text.
+
+    Args:
+        chunk_chars: Maximum length of the text tagged at once.
+        n_processes: Worker processes of the long texts, 1 tags them in this process.
+    """
+
+    def __init__(
+        self,
+        chunk_chars: int = EVENT_TAGGER_CHUNK_CHARS,
+        n_processes: int = EVENT_TAGGER_PROCESSES,
+    ):
+        self.model = load_model()
+        self.chunk_chars = chunk_chars
+        self.n_processes = n_processes
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def __call__(
+        self, text: str, cancelled: threading.Event | None = None
+    ) -> list[dict]:
+        """Events of the text.
+
+        Args:
+            text: The text to tag.
+            cancelled: Event that stops the tagging between two chunks, which raises
+                `TaggingCancelled`.
+        """
+        chunks = chunk_text(text, self.chunk_chars)
+        if len(chunks) <= 1 or self.n_processes <= 1:
+            results = (predict(self.model, [chunk]) for chunk in chunks)
+        else:
+            chunksize = max(len(chunks) // (4 * self.n_processes), 1)
+            results = self.executor.map(predict_in_worker, chunks, chunksize=chunksize)
+
+        events = []
+        for chunk_events in results:
+            if cancelled is not None and cancelled.is_set():
+                # Closing the results drops the chunks the workers did not start
+                results.close()
+                raise TaggingCancelled()
+            events += chunk_events
+        return merge_events(events)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # The server runs threads, which must not be forked
+                self._executor = ProcessPoolExecutor(
+                    self.n_processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                )
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
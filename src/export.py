@@ -0,0 +1,271 @@
+"""Export annotation sessions as documents of the `data/hf` datasets.
+
+A record holds the text, the entities and the endpoint relations of a session, with
+the entities under the ids the client gave them. The relations are the closure that the
+game keeps after every step, so exporting never recomputes it. Records can be written
+to gzipped JSON lines or to Arrow files, both loadable with `load_records`, and turned
+into tieval documents or TimeML.
+"""
+
+import gzip
+import itertools
+import json
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape, quoteattr
+
+from src.base import ENDPOINTS, INVERT_POINT_RELATION
+from src.sessions import SessionStore
+
+
+def session_to_record(session_id: str, session_data: dict) -> dict:
+    """The document of an annotation session in the `data/hf` format.
+
+    The game names the entities `e<i>` after their position in the session, so the
+    endpoints of its relations are mapped back to the ids of the client.
+    """
+    game = session_data["game"]
+    entity_ids = [
+        str(entity.get("id", f"e{idx}"))
+        for idx, entity in enumerate(session_data["entities"])
+    ]
+
+    def client_endpoint(endpoint: str) -> str:
+        endpoint_type, entity_id = endpoint.split(" ", 1)
+        return f"{endpoint_type} {entity_ids[int(entity_id[1:])]}"
+
+    text = session_data["text"]
+    dct = session_data["dct"]
+    return {
+        "doc": session_id,
+        "text": text,
+        "dct": None if dct is None else str(dct),
+        "entities": [
+            {
+                "id": entity_id,
+                "offsets": [entity["start"], entity["end"]],
+                # The clients may leave out the text, as when the session was created
+                "text": entity.get("text", text[entity["start"] : entity["end"]]),
+                "type": entity.get("type", "interval"),
+            }
+            for entity_id, entity in zip(entity_ids, session_data["entities"])
+        ],
+        "relations": [
+            {
+                "relation": relation["relation"],
+                "source": client_endpoint(relation["source"]),
+                "target": client_endpoint(relation["target"]),
+            }
+            for relation in game.pred_doc["relations"]
+        ],
+    }
+
+
+def iter_records(
+    store: SessionStore, session_ids: Iterable[str] | None = None
+) -> Iterator[dict]:
+    """Records of the sessions of `store`, or of `session_ids`, one at a time.
+
+    Each session is only locked while its record is built, and the sessions evicted
+    in the meantime are skipped.
+    """
+    if session_ids is None:
+        session_ids = store.ids()
+    for session_id in session_ids:
+        with store.lock(session_id):
+            session_data = store.get(session_id)
+            if session_data is None:
+                continue
+            record = session_to_record(session_id, session_data)
+        yield record
+
+
+def gzip_lines(records: Iterable[dict]) -> Iterator[bytes]:
+    """Gzipped JSON lines of the records, compressed as they are produced."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for record in records:
+        chunk = compressor.compress((json.dumps(record) + "\n").encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def write_records(records: Iterable[dict], path: str | Path) -> int:
+    """Write the records to `path`, as Arrow if it ends with `.arrow` and as JSON lines
+    otherwise, gzipped if it ends with `.gz`.
+
+    Returns:
+        The number of records written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n_records = 0
+    if path.suffix == ".arrow":
+        # Importing datasets takes about a second, so it is only done to write Arrow
+        from datasets.arrow_writer import ArrowWriter
+
+        with ArrowWriter(features=record_features(), path=str(path)) as writer:
+            for record in records:
+                writer.write(record)
+                n_records += 1
+            writer.finalize()
+        return n_records
+
+    open_fn = gzip.open if path.suffix == ".gz" else open
+    with open_fn(path, "wt") as fout:
+        for record in records:
+            fout.write(json.dumps(record) + "\n")
+            n_records += 1
+    return n_records
+
+
+def load_records(path: str | Path):
+    """Load the records written by `write_records` as a `datasets.Dataset`, which can
+    be saved in `data/hf` with `save_to_disk`."""
+    import datasets
+
+    path = Path(path)
+    if path.suffix == ".arrow":
+        return datasets.Dataset.from_file(str(path))
+    return datasets.Dataset.from_json(str(path), features=record_features())
+
+
+def record_features():
+    import datasets
+
+    string = datasets.Value("string")
+    return datasets.Features(
+        {
+            "doc": string,
+            "text": string,
+            "dct": string,
+            "entities": [
+                {
+                    "id": string,
+                    "offsets": datasets.Sequence(datasets.Value("int64")),
+                    "text": string,
+                    "type": string,
+                }
+            ],
+            "relations": [{"relation": string, "source": string, "target": string}],
+        }
+    )
+
+
+def record_to_tlinks(record: dict) -> list[dict]:
+    """Interval links between the entities of the record.
+
+    The endpoints of an instant are both its start and its end. Only the entity pairs
+    whose four endpoint relations are known get a link, since an interval relation can
+    not be read from fewer.
+    """
+    point_relations = {}
+    for relation in record["relations"]:
+        if relation["relation"] == "-":
+            continue
+        src_types, src_id = endpoint_types(relation["source"])
+        tgt_types, tgt_id = endpoint_types(relation["target"])
+        if src_id == tgt_id:
+            continue
+        point_relation = relation["relation"]
+        if src_id > tgt_id:
+            src_types, src_id, tgt_types, tgt_id = tgt_types, tgt_id, src_types, src_id
+            point_relation = INVERT_POINT_RELATION[point_relation]
+        pair = point_relations.setdefault((src_id, tgt_id), {})
+        for endpoint_pair in itertools.product(src_types, tgt_types):
+            pair[endpoint_pair] = point_relation
+
+    tlinks = []
+    for (src_id, tgt_id), pair in point_relations.items():
+        relations = [pair.get(key) for key in itertools.product(ENDPOINTS, ENDPOINTS)]
+        if None not in relations:
+            tlinks.append({"source": src_id, "target": tgt_id, "relation": relations})
+    return tlinks
+
+
+def endpoint_types(endpoint: str) -> tuple[list[str], str]:
+    endpoint_type, entity_id = endpoint.split(" ", 1)
+    if endpoint_type == "instant":
+        return ENDPOINTS, entity_id
+    return [endpoint_type], entity_id
+
+
+def is_timex(entity_id: str) -> bool:
+    """Timexs are the entities whose ids follow the TimeML `t<n>` convention."""
+    return entity_id.startswith("t") and entity_id[1:].isdigit()
+
+
+def record_to_document(record: dict):
+    """The record as a tieval `Document`."""
+    from tieval.base import Document
+    from tieval.entities import Event, Timex
+    from tieval.links import TLink
+
+    entities = {}
+    for entity in record["entities"]:
+        entity_cls = Timex if is_timex(entity["id"]) else Event
+        entities[entity["id"]] = entity_cls(
+            id=entity["id"], text=entity["text"], offsets=tuple(entity["offsets"])
+        )
+    tlinks = {
+        TLink(
+            entities[tlink["source"]],
+            entities[tlink["target"]],
+            tlink["relation"],
+            id=f"l{idx}",
+        )
+        for idx, tlink in enumerate(record_to_tlinks(record))
+    }
+    return Document(
+        name=record["doc"],
+        text=record["text"],
+        dct=Timex(id="t0", value=record["dct"], function_in_document="CREATION_TIME"),
+        entities=set(entities.values()),
+        tlinks=tlinks,
+    )
+
+
+def record_to_timeml(record: dict) -> str:
+    """The record as a TimeML document, with the entities tagged in the text.
+
+    The `relType` of the links is the name of their interval relation in tieval.
+    """
+    from tieval.links import TLink
+
+    text = record["text"]
+    parts, offset = [], 0
+    entities = sorted(record["entities"], key=lambda entity: entity["offsets"][0])
+    for entity in entities:
+        start, end = entity["offsets"]
+        if start < offset:
+            # TimeML tags can not overlap
+            continue
+        if is_timex(entity["id"]):
+            tag, attribute = "TIMEX3", f"tid={quoteattr(entity['id'])}"
+        else:
+            tag, attribute = "EVENT", f"eid={quoteattr(entity['id'])}"
+        parts += [escape(text[offset:start]), f"<{tag} {attribute}>"]
+        parts += [escape(text[start:end]), f"</{tag}>"]
+        offset = end
+    parts.append(escape(text[offset:]))
+
+    lines = ['<?xml version="1.0" ?>', "<TimeML>"]
+    lines.append(f"<DOCID>{escape(record['doc'])}</DOCID>")
+    if record["dct"] is not None:
+        lines.append(
+            f'<DCT><TIMEX3 tid="t0" type="DATE" functionInDocument="CREATION_TIME" '
+            f"value={quoteattr(record['dct'])}/></DCT>"
+        )
+    lines.append(f"<TEXT>{''.join(parts)}</TEXT>")
+    for idx, tlink in enumerate(record_to_tlinks(record)):
+        relation = TLink(tlink["source"], tlink["target"], tlink["relation"])
+        source = "timeID" if is_timex(tlink["source"]) else "eventID"
+        target = "relatedToTime" if is_timex(tlink["target"]) else "relatedToEvent"
+        lines.append(
+            f'<TLINK lid="l{idx}" relType={quoteattr(relation.relation.interval)} '
+            f"{source}={quoteattr(tlink['source'])} "
+            f"{target}={quoteattr(tlink['target'])}/>"
+        )
+    lines.append("</TimeML>")
+    return "\n".join(lines)
@@ -0,0 +1,128 @@
+import logging
+import pickle
+import random
+import threading
+from collections import deque
+
+from src.constants import GAME_POOL_MAX_BYTES, GAME_POOL_SIZE
+from src.difficulty import DifficultySampler, load_index
+from src.env import TemporalGame, load_documents
+
+logger = logging.getLogger(__name__)
+
+LEVELS = [2, 3, 4, 5]
+# Seconds to wait before retrying when a game could not be made
+RETRY_INTERVAL = 30.0
+
+
+class GamePool:
+    """Pool of ready-to-play games for each level, refilled by a background thread.
+
+    Handing out a game is a `deque.popleft`, while loading the document and building
+    the game, including the closure of its true timeline, happen off the request path.
+    The pool holds up to `size` games per level, as long as their pickled size stays
+    under `max_bytes`, and a `size` of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        levels: list[int] = LEVELS,
+        size: int = GAME_POOL_SIZE,
+        max_bytes: int = GAME_POOL_MAX_BYTES,
+    ):
+        self.levels = levels
+        self.size = size
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._games = {level: deque() for level in levels}
+        self._docs = {}
+        # Held while a level is loaded, so the fill thread and the requests that
+        # build their own games load each level once
+        self._docs_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def make_game(
+        self, level: int, difficulty: tuple[float, float] | None = None
+    ) -> TemporalGame:
+        """Build a game on a random document of the level.
+
+        Args:
+            level: The level of the game.
+            difficulty: The `low` and `high` quantiles of difficulty of the documents
+                to draw from, by default any document of the level.
+        """
+        with self._docs_lock:
+            if level not in self._docs:
+                docs = load_documents(level)
+                self._docs[level] = docs, DifficultySampler(load_index(docs))
+            docs, sampler = self._docs[level]
+        if difficulty is None:
+            doc_idx = random.randint(0, len(docs) - 1)
+        else:
+            doc_idx = sampler.sample(*difficulty)
+        # Every row read from the dataset is a new dict, so it is not copied
+        return TemporalGame(docs[doc_idx])
+
+    def get(self, level: int) -> TemporalGame | None:
+        """A game of the level from the pool, or `None` if there is none ready."""
+        with self._condition:
+            self._condition.notify()
+            games = self._games.get(level)
+            if not games:
+                return None
+            game, nbytes = games.popleft()
+            self.nbytes -= nbytes
+        return game
+
+    def start(self):
+        if self.size <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._fill, name="game_pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "games": {level: len(games) for level, games in self._games.items()},
+                "nbytes": self.nbytes,
+            }
+
+    def _next_level(self) -> int | None:
+        """The level with the fewest games, if the pool has room for another one."""
+        if self.nbytes >= self.max_bytes:
+            return None
+        level = min(self.levels, key=lambda level: len(self._games[level]))
+        return level if len(self._games[level]) < self.size else None
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (level := self._next_level()) is None:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+
+            try:
+                game = self.make_game(level)
+                nbytes = len(pickle.dumps(game))
+            except Exception as e:
+                logger.error("Could not make a level %s game: %s", level, e)
+                with self._condition:
+                    self._condition.wait(RETRY_INTERVAL)
+                continue
+
+            with self._condition:
+                self._games[level].append((game, nbytes))
+                self.nbytes += nbytes
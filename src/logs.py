@@ -0,0 +1,90 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+from src.constants import LOG_BACKUP_COUNT, LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES
+
+# Attributes passed with `extra` that are written to the JSON records
+CONTEXT_FIELDS = [
+    "game_id",
+    "session_id",
+    "step_id",
+    "game_level",
+    "n_actions",
+    "reward",
+    "duration_ms",
+]
+
+
+class JSONFormatter(logging.Formatter):
+    """Format the records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves the formatting of the message to the listener.
+
+    The arguments of the records are only merged into the message in the listener
+    thread, so they should not be mutated after being logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            # Tracebacks hold references to the frames, so they are rendered eagerly
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    log_file: str | None = LOG_FILE,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
+) -> logging.handlers.QueueListener:
+    """Send the records of the root logger through a queue to a background thread.
+
+    The listener writes them to the console and, as JSON, to `log_file`, which is
+    rotated once it reaches `max_bytes`.
+    """
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    handlers = [console_handler]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, delay=True
+        )
+        file_handler.setFormatter(JSONFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, LazyQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,124 @@
+import bisect
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from src.constants import METRICS_SAMPLE_RATE
+
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, in seconds."""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        total = 0
+        cumulative = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Metrics:
+    """In-memory registry of latency histograms.
+
+    Only a `sample_rate` fraction of the spans is recorded, which bounds the overhead
+    of the instrumentation. A sample rate of 0 disables it.
+    """
+
+    def __init__(self, sample_rate: float = METRICS_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self._histograms = {}
+        self._descriptions = {}
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def describe(self, name: str, description: str):
+        self._descriptions[name] = description
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Time the enclosed block and record it in the `name` histogram."""
+        if not self.sampled():
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage: str):
+        """Time a stage of the game."""
+        return self.span("temporal_game_stage_seconds", stage=stage)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def to_prometheus(self) -> str:
+        """Render the histograms in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+
+        lines = []
+        described = set()
+        for (name, labels), histogram in histograms:
+            if name not in described:
+                described.add(name)
+                if name in self._descriptions:
+                    lines.append(f"# HELP {name} {self._descriptions[name]}")
+                lines.append(f"# TYPE {name} histogram")
+
+            label_str = "".join(f'{key}="{value}",' for key, value in labels)
+            for bound, count in histogram.cumulative_counts():
+                lines.append(f'{name}_bucket{{{label_str}le="{bound}"}} {count}')
+            label_str = "{" + label_str.rstrip(",") + "}" if labels else ""
+            lines.append(f"{name}_sum{label_str} {histogram.sum}")
+            lines.append(f"{name}_count{label_str} {histogram.count}")
+        return "".join(f"{line}\n" for line in lines)
+
+
+metrics = Metrics()
+metrics.describe(
+    "temporal_game_stage_seconds", "Time spent in each stage of the TemporalGame."
+)
+metrics.describe("temporal_game_request_seconds", "Time spent handling API requests.")
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from src.constants import RELATION_CACHE_PATH, RELATION_CACHE_SIZE
+
+
+class ScoreCache:
+    """Thread-safe LRU cache of the label distributions of entity pairs.
+
+    A pair is keyed by a hash of the text and the spans of its source and target, under
+    a `namespace` that tells the models apart. The `max_size` most recently used
+    distributions are kept in memory. With a `path`, every distribution is also written
+    to a SQLite file, which is read on the misses of the memory and outlives the
+    process.
+    """
+
+    def __init__(
+        self,
+        namespace: str = "",
+        max_size: int = RELATION_CACHE_SIZE,
+        path: str | Path | None = RELATION_CACHE_PATH,
+    ):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def keys(self, text: str, pairs) -> list[str]:
+        """Keys of the `(source, target)` pairs of entities of the text."""
+        text_hash = hashlib.blake2b(
+            f"{self.namespace}\0{text}".encode(), digest_size=16
+        ).hexdigest()
+        return [
+            f"{text_hash}:{source['start']}-{source['end']}:"
+            f"{target['start']}-{target['end']}"
+            for source, target in pairs
+        ]
+
+    def get_many(self, keys: list[str]) -> list[dict | None]:
+        """The distributions of the keys, `None` for the ones that are not cached."""
+        with self._lock:
+            values = [self._entries.get(key) for key in keys]
+            for key, value in zip(keys, values):
+                if value is not None:
+                    self._entries.move_to_end(key)
+            self.hits += sum(value is not None for value in values)
+
+            missing = [key for key, value in zip(keys, values) if value is None]
+            stored = self._read(missing)
+            for idx, key in enumerate(keys):
+                if values[idx] is None and key in stored:
+                    values[idx] = stored[key]
+                    self._insert(key, stored[key])
+            self.disk_hits += len(stored)
+            self.misses += len(missing) - len(stored)
+        return values
+
+    def put_many(self, keys: list[str], values: list[dict]):
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._insert(key, value)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO scores VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in zip(keys, values)],
+                )
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def to_prometheus(self, name: str = "relation_score_cache") -> str:
+        """Render the lookup counters in the Prometheus text exposition format."""
+        stats = self.stats()
+        lines = []
+        for counter in ("hits", "disk_hits", "misses"):
+            lines.append(f"# TYPE {name}_{counter}_total counter")
+            lines.append(f"{name}_{counter}_total {stats[counter]}")
+        return "".join(f"{line}\n" for line in lines)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _insert(self, key: str, value: dict):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _read(self, keys: list[str]) -> dict[str, dict]:
+        if self._db is None or not keys:
+            return {}
+        stored = {}
+        # SQLite bounds the number of parameters of a query
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(
+                f"SELECT key, value FROM scores WHERE key IN ({placeholders})", batch
+            )
+            stored.update((key, json.loads(value)) for key, value in rows)
+        return stored
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src.constants import MAX_SESSIONS
+
+
+class SessionStore:
+    """Thread-safe store of game and annotation sessions.
+
+    Lookups and insertions only hold a store-wide lock for a dictionary operation, so
+    they never block the event loop for long. The work on a session is serialized with
+    `lock`, which is meant to be held in the worker threads that run the handlers.
+    When more than `max_sessions` sessions are stored the least recently used is
+    evicted; `None` keeps every session.
+    """
+
+    def __init__(self, max_sessions: int | None = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> dict:
+        with self._lock:
+            self._sessions.move_to_end(session_id)
+            return self._sessions[session_id]
+
+    def __setitem__(self, session_id: str, session_data: dict):
+        with self._lock:
+            self._sessions[session_id] = session_data
+            self._sessions.move_to_end(session_id)
+            self._locks.setdefault(session_id, threading.Lock())
+            while self.max_sessions is not None and len(self) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._locks.pop(evicted_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def ids(self) -> list[str]:
+        """The ids of the stored sessions, from the least to the most recently used."""
+        with self._lock:
+            return list(self._sessions)
+
+    def get(self, session_id: str, default=None):
+        with self._lock:
+            return self._sessions.get(session_id, default)
+
+    @contextmanager
+    def lock(self, session_id: str):
+        """Hold the session while it is updated, so concurrent requests do not race.
+
+        Only the stored sessions keep a lock, so the ids of unknown sessions get a lock
+        of their own and do not grow the store.
+        """
+        with self._lock:
+            session_lock = self._locks.get(session_id) or threading.Lock()
+        with session_lock:
+            yield
@@ -0,0 +1,150 @@
+"""Oracle agent that plays the TemporalGame with a pluggable cell-ordering policy.
+
+The agent always annotates the true relation of the cell it picks, or `-` when the
+true timeline has none, so every game ends in success and the number of steps measures
+the annotation effort that the ordering policy needs. Policies only look at the game,
+except for `oracle_inference`, which also knows the true relations and shows the effort
+a greedy policy could get down to.
+"""
+
+import random
+import time
+
+import numpy as np
+
+from src.base import ID2RELATIONS, N_RELATIONS, RELATIONS2ID
+from src.env import UNCLASSIFIED_POSITION, TemporalGame
+
+POLICIES = {}
+
+
+def policy(name: str):
+    """Register a policy, a function that picks the next cell of a game.
+
+    The policy is called with the game, its true board and a random generator.
+    """
+
+    def decorator(fn):
+        POLICIES[name] = fn
+        return fn
+
+    return decorator
+
+
+def undecided_cells(board: np.ndarray) -> np.ndarray:
+    return np.argwhere(board == UNCLASSIFIED_POSITION)
+
+
+def decided_by_before(game: TemporalGame, board: np.ndarray) -> np.ndarray:
+    """Number of undecided cells that annotating `i < j` decides, for every `(i, j)`.
+
+    Annotating `i < j` orders every endpoint before or equal to `i` before every
+    endpoint after or equal to `j`, so the cells it decides are counted from the
+    reachability of the endpoints.
+    """
+    _, not_after = game.reachability(board)
+    not_after = not_after.astype(np.float32)
+    undecided = board == UNCLASSIFIED_POSITION
+    undecided_f = (undecided | undecided.T).astype(np.float32)
+    return not_after.T @ undecided_f @ not_after.T
+
+
+def relation_distribution(game: TemporalGame, board: np.ndarray) -> np.ndarray:
+    """Expected distribution of the `<`, `>`, `=` and `-` relations of every cell.
+
+    It is the frequency of each relation among the cells annotated so far, smoothed by
+    one, restricted in every cell to the relations that are legal there.
+
+    Returns:
+        np.ndarray: Probabilities of shape (n_endpoints, n_endpoints, 4).
+    """
+    relation_ids = [RELATIONS2ID[relation] for relation in ("<", ">", "=", "-")]
+    counts = np.bincount(board[board >= 0], minlength=N_RELATIONS)[relation_ids] + 1
+    probs = game.legal_actions()[..., relation_ids] * counts
+    return probs / np.maximum(probs.sum(axis=-1, keepdims=True), 1)
+
+
+def best_cell(board: np.ndarray, scores: np.ndarray) -> tuple[int, int]:
+    scores = np.where(board == UNCLASSIFIED_POSITION, scores, -np.inf)
+    return tuple(np.unravel_index(np.argmax(scores), scores.shape))
+
+
+@policy("sequential")
+def sequential_policy(game: TemporalGame, true_board, rng) -> tuple[int, int]:
+    """The first undecided cell, row by row."""
+    return tuple(undecided_cells(game.board_array())[0])
+
+
+@policy("random")
+def random_policy(game: TemporalGame, true_board, rng) -> tuple[int, int]:
+    cells = undecided_cells(game.board_array())
+    return tuple(cells[rng.randrange(len(cells))])
+
+
+@policy("max_inference")
+def max_inference_policy(game: TemporalGame, true_board, rng) -> tuple[int, int]:
+    """The undecided cell that decides the most cells whichever order it holds.
+
+    A cell is scored by the fewest cells it decides over its legal `<`, `>` and `=`
+    relations, so a cell that decides many cells for a single order does not win over
+    one that decides a few for every order. Ties go to the cell that decides the most
+    cells on average over the expected relation distribution, where `-` infers nothing
+    and decides only the cell itself.
+    """
+    board = game.board_array()
+    decided = decided_by_before(game, board)
+    # The cells decided by `<`, `>`, `=` and `-`
+    outcomes = np.stack(
+        [decided, decided.T, decided + decided.T, np.ones_like(decided)], axis=-1
+    )
+    probs = relation_distribution(game, board)
+    expected = (probs * outcomes).sum(axis=-1)
+    ordered = np.where(probs[..., :3] > 0, outcomes[..., :3], np.inf).min(axis=-1)
+    ordered[np.isinf(ordered)] = 1
+    # The expected number is below one once scaled, so it only breaks the ties
+    return best_cell(board, ordered + expected / (expected.max() + 1))
+
+
+@policy("oracle_inference")
+def oracle_inference_policy(game: TemporalGame, true_board, rng) -> tuple[int, int]:
+    """The undecided cell whose true relation decides the most other cells."""
+    board = game.board_array()
+    decided = decided_by_before(game, board)
+    scores = np.zeros_like(decided)
+    is_before = true_board == RELATIONS2ID["<"]
+    is_after = true_board == RELATIONS2ID[">"]
+    is_equal = true_board == RELATIONS2ID["="]
+    scores[is_before | is_equal] += decided[is_before | is_equal]
+    scores[is_after | is_equal] += decided.T[is_after | is_equal]
+    return best_cell(board, scores)
+
+
+def play_game(doc: dict, policy_name: str, seed: int = 0) -> dict:
+    """Play a game to the end and report its reward, steps and wall time."""
+    choose_cell = POLICIES[policy_name]
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    game = TemporalGame(doc)
+    game.reset()
+    true_board = game.make_board(game.true_doc["relations"])
+    n_cells = len(game.pairs)
+
+    total_reward, steps = 0.0, 0
+    terminated, info = False, {"is_success": False}
+    while not terminated:
+        src_idx, tgt_idx = choose_cell(game, true_board, rng)
+        relation = ID2RELATIONS.get(true_board[src_idx][tgt_idx], "-")
+        _, reward, terminated, info = game.step(
+            ((int(src_idx), int(tgt_idx)), relation)
+        )
+        total_reward += reward
+        steps += 1
+
+    return {
+        "reward": total_reward,
+        "steps": steps,
+        "n_cells": n_cells,
+        "is_success": info["is_success"],
+        "seconds": time.perf_counter() - start,
+    }
@@ -1,12 +1,17 @@
 import requests
 
+from src.constants import TIMEX_TAGGER_TIMEOUT, TIMEX_TAGGER_URL
+
 
 class TimexTagger:
-    def __init__(self, url: str = "http://localhost:8000/annotate"):
+    def __init__(
+        self, url: str = TIMEX_TAGGER_URL, timeout: float = TIMEX_TAGGER_TIMEOUT
+    ):
         self.url = url
+        self.timeout = timeout
 
     def __call__(self, text: str) -> list[dict]:
-        response = requests.post(self.url, json={"text": text})
+        response = requests.post(self.url, json={"text": text}, timeout=self.timeout)
         content = response.json()
         result = [
             {
@@ -0,0 +1,142 @@
+import atexit
+import gzip
+import json
+import threading
+import time
+from pathlib import Path
+
+from src.sessions import SessionStore
+
+# Functions that keep the fields of the request of each traced endpoint worth replaying
+SANITIZERS = {}
+# Endpoints that start a new stream of requests, with the field of their response that
+# holds the id of the game or annotation session
+NEW_STREAM_ENDPOINTS = {
+    "new_game": "game_id",
+    "new_annotation_session": "session_id",
+}
+
+
+def sanitizer(*endpoints: str):
+    """Register the function that strips the requests of `endpoints` for the trace."""
+
+    def decorator(fn):
+        for endpoint in endpoints:
+            SANITIZERS[endpoint] = fn
+        return fn
+
+    return decorator
+
+
+def pick(data: dict, *keys: str) -> dict:
+    return {key: data[key] for key in keys if data.get(key) is not None}
+
+
+@sanitizer("new_game")
+def sanitize_new_game(data: dict) -> dict:
+    return pick(data, "level", "difficulty", "board_encoding")
+
+
+@sanitizer("step", "annotation_step")
+def sanitize_step(data: dict) -> dict:
+    return pick(data, "action", "board_encoding")
+
+
+@sanitizer("step_many", "annotation_step_many")
+def sanitize_step_many(data: dict) -> dict:
+    return pick(data, "actions", "board_encoding")
+
+
+@sanitizer("undo", "annotation_undo")
+def sanitize_undo(data: dict) -> dict:
+    return pick(data, "board_encoding")
+
+
+@sanitizer("new_annotation_session")
+def sanitize_new_annotation_session(data: dict) -> dict:
+    """The size of the annotated document, which is all a replay needs of it."""
+    document = data.get("document") or data
+    relations = document.get("tlinks") or document.get("relations") or []
+    return {
+        "n_entities": len(document.get("entities") or []),
+        "n_chars": len(document.get("text") or ""),
+        "n_relations": len(relations),
+        **pick(data, "sparse", "board_encoding"),
+    }
+
+
+def open_trace(path: str | Path, mode: str):
+    """Open a trace file as text, gzipped if its name ends with `.gz`."""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_trace(path: str | Path) -> list[dict]:
+    with open_trace(path, "rt") as lines:
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+class TraceRecorder:
+    """Record the game and annotation requests to a file of JSON lines.
+
+    Each line holds the start time of a request in seconds since the recorder was
+    created, the endpoint, the status, the time the server took, and the fields of the
+    request that drive the game. The texts and entities of the annotated documents are
+    replaced by their sizes, and the ids of the games and sessions by `stream` numbers
+    that group the requests of each of them.
+    """
+
+    def __init__(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._file = open_trace(path, "at")
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._streams = SessionStore()
+        self._n_streams = 0
+        atexit.register(self.close)
+
+    def record(
+        self,
+        endpoint: str,
+        key: str | None,
+        data: dict,
+        status: int,
+        start: float,
+        seconds: float,
+    ):
+        """Write a request to the trace.
+
+        Args:
+            endpoint: The name of the endpoint, as in `SANITIZERS`.
+            key: The id of the game or annotation session of the request.
+            data: The JSON body of the request.
+            status: The status code of the response.
+            start: The `time.perf_counter` at which the request started.
+            seconds: The time the server took to respond.
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            stream = self._streams.get(key) if key is not None else None
+            if endpoint in NEW_STREAM_ENDPOINTS and key is not None:
+                stream = self._n_streams
+                self._n_streams += 1
+                self._streams[key] = stream
+
+            line = {
+                "time": round(start - self._start, 4),
+                "stream": stream,
+                "endpoint": endpoint,
+                "status": status,
+                "ms": round(1000 * seconds, 3),
+                "data": SANITIZERS[endpoint](data),
+            }
+            self._file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
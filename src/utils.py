@@ -1,7 +1,14 @@
+import bisect
+import itertools
+import re
+from collections import defaultdict
+from typing import Callable, List, Set
+
 import numpy as np
-from typing import List
+from tieval.links import TLink
 
 from src.base import (
+    ENDPOINTS,
     INVERT_POINT_RELATION,
     RELATIONS2ID,
     Endpoint,
@@ -32,18 +39,143 @@ def make_board(document: dict) -> np.ndarray:
     return board
 
 
-def add_tags(text: str, entities: List[Endpoint]) -> str:
-    """Add tags to the text."""
+def add_tags(
+    text: str, entities: List[dict], return_spans: bool = False
+) -> str | tuple[str, List[tuple[int, int]]]:
+    """Add tags to the text.
+
+    Each entity is wrapped as `<eN>...</eN>`, where N is its position in `entities`. The
+    entities do not need to be sorted and the tagged text is built in a single pass.
+    Overlapping entities never produce overlapping tags: an entity that lies inside an
+    already tagged span is not tagged again, and an entity that crosses the end of a
+    tagged span only has its remaining part tagged.
+
+    Args:
+        text: The raw text.
+        entities: The entities, each with the `offsets` of its span in `text`.
+        return_spans: Also return the (start, end) char range of each entity in the
+            tagged text, in the same order as `entities`.
+    """
+    order = sorted(
+        range(len(entities)),
+        key=lambda eid: (entities[eid]["offsets"][0], -entities[eid]["offsets"][1]),
+    )
+
+    parts = []
+    spans = [None] * len(entities)
+    # Tagged regions as (text start, text end, tagged content start, closing tag size)
+    regions = []
+    region_starts = []
     offset = 0
-    tagged_text = ""
-    for eid, entity in enumerate(entities):
-        tagged_text += text[offset : entity["offsets"][0]]
-        tagged_text += f"<e{eid}>{entity['text']}</e{eid}>"
-        offset = entity["offsets"][1]
-    tagged_text += text[offset:]
+    length = 0
+
+    def to_tagged(position: int, is_end: bool) -> int:
+        ridx = bisect.bisect_right(region_starts, position) - 1
+        if ridx < 0:
+            return position
+        start, end, tagged_start, closing_size = regions[ridx]
+        if position < end or (is_end and position == end):
+            return tagged_start + position - start
+        return tagged_start + end - start + closing_size + position - end
+
+    for eid in order:
+        start, end = entities[eid]["offsets"]
+        if end <= offset:
+            spans[eid] = (to_tagged(start, False), to_tagged(end, True))
+            continue
+        start = max(start, offset)
+
+        opening, closing = f"<e{eid}>", f"</e{eid}>"
+        parts.extend((text[offset:start], opening, text[start:end], closing))
+        length += start - offset + len(opening)
+
+        regions.append((start, end, length, len(closing)))
+        region_starts.append(start)
+        spans[eid] = (length, length + end - start)
+
+        length += end - start + len(closing)
+        offset = end
+    parts.append(text[offset:])
+
+    tagged_text = "".join(parts)
+    if return_spans:
+        return tagged_text, spans
     return tagged_text
 
 
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*")
+
+
+def sentence_starts(text: str) -> list[int]:
+    """Offsets where the sentences of the text start.
+
+    Sentences end at a newline or at a `.`, `!` or `?` followed by whitespace, which is
+    enough to page through a document without a tokenizer.
+    """
+    return [0] + [match.end() for match in SENTENCE_END.finditer(text.rstrip())]
+
+
+def chunk_text(text: str, max_chars: int) -> list[tuple[int, str]]:
+    """Split the text into chunks of whole sentences of at most `max_chars` characters.
+
+    A sentence longer than `max_chars` is split at its last whitespace that fits, or
+    at `max_chars` if there is none. The chunks are consecutive slices of the text, so
+    they join back into it and the offset of a chunk maps its spans to the text.
+
+    Returns:
+        The chunks as `(offset, chunk)` pairs.
+    """
+    bounds = []
+    start = previous = 0
+    for end in sentence_starts(text)[1:] + [len(text)]:
+        if end - start > max_chars and previous > start:
+            bounds.append((start, previous))
+            start = previous
+        while end - start > max_chars:
+            cut = max(text.rfind(" ", start, start + max_chars) + 1, start)
+            cut = cut if cut > start else start + max_chars
+            bounds.append((start, cut))
+            start = cut
+        previous = end
+    if start < len(text):
+        bounds.append((start, len(text)))
+    return [(start, text[start:end]) for start, end in bounds]
+
+
+def tlinks_to_relations(tlinks: List[dict], instants: Set[str] = ()) -> List[dict]:
+    """Convert tieval-style interval links into endpoint relations.
+
+    Each link is a dict with `source` and `target` entity ids and an interval
+    `relation` such as `BEFORE`. The endpoints of the entities in `instants` are
+    written as `instant <id>`. Endpoint relations that the interval relation leaves
+    undefined are dropped.
+    """
+
+    def endpoint(endpoint_type: str, entity_id: str) -> str:
+        if entity_id in instants:
+            return f"instant {entity_id}"
+        return f"{endpoint_type} {entity_id}"
+
+    relations = {}
+    for tlink in tlinks:
+        point_relations = TLink(
+            tlink["source"], tlink["target"], tlink["relation"]
+        ).relation.point.relation
+        for (src_type, tgt_type), relation in zip(
+            itertools.product(ENDPOINTS, ENDPOINTS), point_relations
+        ):
+            if relation is None:
+                continue
+            source = endpoint(src_type, tlink["source"])
+            target = endpoint(tgt_type, tlink["target"])
+            relations[source, target] = {
+                "source": source,
+                "target": target,
+                "relation": relation,
+            }
+    return list(relations.values())
+
+
 def sort_entities(example: dict) -> dict:
     entities = example["entities"]
     entities = sorted(entities, key=lambda x: x["offsets"][0])
@@ -52,14 +184,12 @@ def sort_entities(example: dict) -> dict:
 
 
 def order_relations(example: dict) -> dict:
-    sorted_eids = [ent["id"] for ent in example["entities"]]
+    eid2idx = {ent["id"]: idx for idx, ent in enumerate(example["entities"])}
     sorted_relations = []
     for relation in example["relations"]:
         src = relation["source"].split(" ")[-1]
         tgt = relation["target"].split(" ")[-1]
-        src_idx = sorted_eids.index(src)
-        tgt_idx = sorted_eids.index(tgt)
-        if src_idx < tgt_idx:
+        if eid2idx[src] < eid2idx[tgt]:
             sorted_relations.append(relation)
         else:
             sorted_relations.append(
@@ -74,8 +204,59 @@ def order_relations(example: dict) -> dict:
 
 
 def compute_closure(example: dict) -> dict:
-    relations = example["relations"]
-    timeline = Timeline([PointRelation(**rel) for rel in relations])
-    closure = timeline.closure
-    example["relations"] = [rel.to_dict() for rel in closure.relations]
+    relations = set(PointRelation(**rel) for rel in example["relations"])
+    closure = Timeline._compute_closure(relations)
+    example["relations"] = [rel.to_dict() for rel in closure]
     return example
+
+
+def batched(fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+    """Turn a per-example `datasets.map` function into a batched one."""
+
+    def batched_fn(batch: dict) -> dict:
+        examples = [dict(zip(batch, values)) for values in zip(*batch.values())]
+        examples = [fn(example) for example in examples]
+        return {key: [example[key] for example in examples] for key in batch}
+
+    return batched_fn
+
+
+def make_closure_example(example: dict) -> dict:
+    """Sort the entities, compute the closure and order the relations of an example."""
+    return order_relations(compute_closure(sort_entities(example)))
+
+
+def make_level_games(batch: dict, level: int) -> dict:
+    """Expand a batch of documents into games with `level` entities.
+
+    A game is made for every combination of `level` entities of a document that has at
+    least one relation between them. The entities of each game are sorted by offsets and
+    its relations keep the order they have in the document.
+    """
+    games = {key: [] for key in batch}
+    for idx, (entities, relations) in enumerate(
+        zip(batch["entities"], batch["relations"])
+    ):
+        eid2idx = {ent["id"]: eidx for eidx, ent in enumerate(entities)}
+        pair2ridxs = defaultdict(list)
+        for ridx, relation in enumerate(relations):
+            src_idx = eid2idx[relation["source"].split(" ")[-1]]
+            tgt_idx = eid2idx[relation["target"].split(" ")[-1]]
+            pair2ridxs[min(src_idx, tgt_idx), max(src_idx, tgt_idx)].append(ridx)
+
+        for combination in itertools.combinations(range(len(entities)), level):
+            ridxs = sorted(
+                ridx
+                for pair in itertools.combinations_with_replacement(combination, 2)
+                for ridx in pair2ridxs.get(pair, [])
+            )
+            if not ridxs:
+                continue
+
+            for key in batch:
+                games[key].append(batch[key][idx])
+            games["entities"][-1] = sorted(
+                [entities[eidx] for eidx in combination], key=lambda x: x["offsets"][0]
+            )
+            games["relations"][-1] = [relations[ridx] for ridx in ridxs]
+    return games
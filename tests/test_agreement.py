@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from src.agreement import (
+    agreement,
+    cell_agreement,
+    cohen_kappa,
+    document_key,
+    fleiss_kappa,
+    session_label,
+    stack_boards,
+    temporal_awareness,
+)
+from src.env import UNCLASSIFIED_POSITION
+
+TEXT = "a b c"
+OFFSETS = [[0, 1], [2, 3], [4, 5]]
+
+# Three intervals one after the other, with the closure of their relations
+CHAIN = [
+    ("end 0", "<", "start 1"),
+    ("start 0", "<", "start 1"),
+    ("start 0", "<", "end 1"),
+    ("end 0", "<", "end 1"),
+    ("end 1", "<", "start 2"),
+    ("start 1", "<", "start 2"),
+    ("start 1", "<", "end 2"),
+    ("end 1", "<", "end 2"),
+    ("end 0", "<", "start 2"),
+    ("start 0", "<", "start 2"),
+    ("start 0", "<", "end 2"),
+    ("end 0", "<", "end 2"),
+]
+
+
+def make_record(
+    doc: str, relations: list[tuple[str, str, str]], prefix: str = "e"
+) -> dict:
+    """Record of a session on `TEXT` whose entity ids start with `prefix`."""
+
+    def endpoint(name: str) -> str:
+        endpoint_type, entity_idx = name.split(" ")
+        return f"{endpoint_type} {prefix}{entity_idx}"
+
+    return {
+        "doc": doc,
+        "text": TEXT,
+        "entities": [
+            {"id": f"{prefix}{idx}", "offsets": offsets, "text": TEXT[offsets[0]]}
+            for idx, offsets in enumerate(OFFSETS)
+        ],
+        "relations": [
+            {
+                "relation": relation,
+                "source": endpoint(source),
+                "target": endpoint(target),
+            }
+            for source, relation, target in relations
+        ],
+    }
+
+
+class TestStackBoards:
+    def test_entity_ids(self):
+        # The same timeline, with other entity ids and the relations inverted
+        inverted = [(target, ">", source) for source, _, target in CHAIN]
+        records = [make_record("a", CHAIN), make_record("b", inverted, prefix="x")]
+        assert document_key(records[0]) == document_key(records[1])
+
+        labels, required = stack_boards(records)
+        assert labels.shape == (2, 12)
+        assert (labels[0] == labels[1]).all()
+        assert (labels != UNCLASSIFIED_POSITION).all()
+        # Only the end of an interval before the start of the next one is required
+        assert required.sum(axis=1).tolist() == [2, 2]
+
+    def test_partial(self):
+        labels, required = stack_boards([make_record("a", CHAIN[:2])])
+        assert (labels != UNCLASSIFIED_POSITION).sum() == 2
+        assert required.sum() == 1
+
+
+class TestMeasures:
+    @pytest.fixture
+    def labels(self):
+        return np.array(
+            [
+                [0, 1, 2, 1, UNCLASSIFIED_POSITION],
+                [0, 1, 2, 0, UNCLASSIFIED_POSITION],
+                [0, 1, 1, 0, 3],
+            ],
+            dtype=np.int8,
+        )
+
+    def test_cell_agreement(self, labels):
+        agreement = cell_agreement(labels)
+        assert agreement[:4] == pytest.approx([1.0, 1.0, 1 / 3, 1 / 3])
+        assert np.isnan(agreement[4])
+
+    def test_fleiss_kappa(self, labels):
+        # Observed agreement 2/3, proportions of the labels 5/12, 5/12 and 2/12
+        expected = (5 / 12) ** 2 * 2 + (2 / 12) ** 2
+        kappa = (2 / 3 - expected) / (1 - expected)
+        assert fleiss_kappa(labels) == pytest.approx(kappa)
+
+    def test_cohen_kappa(self, labels):
+        kappa = cohen_kappa(labels)
+        assert kappa.shape == (3, 3)
+        assert np.allclose(kappa, kappa.T, equal_nan=True)
+        # Sessions 0 and 1 agree on 3 of 4 cells, with labels 0 1 2 1 and 0 1 2 0
+        expected = (1 * 2 + 2 * 1 + 1 * 1) / 16
+        assert kappa[0, 1] == pytest.approx((3 / 4 - expected) / (1 - expected))
+
+    def test_identical(self, labels):
+        labels = np.repeat(labels[:1], 4, axis=0)
+        assert fleiss_kappa(labels) == pytest.approx(1.0)
+        assert np.allclose(cohen_kappa(labels), 1.0)
+
+
+class TestAgreement:
+    def test_temporal_awareness(self):
+        # Both sessions hold the closure of their annotations, and the second did not
+        # relate the last interval
+        records = [make_record("a", CHAIN), make_record("b", CHAIN[:4])]
+        labels, required = stack_boards(records)
+        awareness = temporal_awareness(labels, required)
+        # The first session has 1 of its 2 required relations in the second, which has
+        # its only required relation in the first
+        assert awareness[0, 1] == awareness[1, 0] == pytest.approx(2 * 0.5 / 1.5)
+
+    def test_agreement(self):
+        records = [
+            make_record("a", CHAIN),
+            make_record("b", CHAIN, prefix="x"),
+            make_record("c", CHAIN[:4]),
+            {**make_record("d", CHAIN), "text": "other"},
+        ]
+        documents = agreement(records, cells=True)
+        assert [document["sessions"] for document in documents] == [
+            [session_label("a"), session_label("b"), session_label("c")],
+            [session_label("d")],
+        ]
+        document = documents[0]
+        assert document["n_cells"] == 12
+        assert document["coverage"] == pytest.approx((12 + 12 + 4) / 36)
+        assert document["observed_agreement"] == 1.0
+        # Every relation is a before, so agreeing is expected and the kappas undefined
+        assert document["fleiss_kappa"] is None
+        awareness = (1 + 2 / 3 + 2 / 3) / 3
+        assert document["temporal_awareness"] == pytest.approx(awareness)
+        assert document["cells"][0][1] is None
+        assert document["cells"][0][2] == 1.0
+        assert documents[1]["cohen_kappa"] is None
@@ -0,0 +1,125 @@
+import gzip
+import json
+
+import pytest
+
+from app import app
+from src.agreement import session_label
+
+
+def remote_client():
+    client = app.test_client()
+    client.environ_base["REMOTE_ADDR"] = "10.0.0.1"
+    return client
+
+
+def new_session(client, text: str) -> str:
+    entities = [
+        {"start": 0, "end": 6, "text": text[:6]},
+        {"start": 7, "end": 14, "text": text[7:14]},
+    ]
+    response = client.post(
+        "/api/new_annotation_session", json={"text": text, "entities": entities}
+    )
+    return response.get_json()["session_id"]
+
+
+def exported_texts(response) -> list[str]:
+    lines = gzip.decompress(response.data).decode().splitlines()
+    return [json.loads(line)["text"] for line in lines]
+
+
+@pytest.fixture
+def clients():
+    return remote_client(), remote_client()
+
+
+class TestNewAnnotationSession:
+    def test_invalid_relations(self):
+        text = "Secret meeting on Monday."
+        entities = [
+            {"id": "a", "start": 0, "end": 6},
+            {"id": "b", "start": 7, "end": 14},
+        ]
+        relations = [{"source": "start a", "target": "end c", "relation": "<"}]
+        response = app.test_client().post(
+            "/api/new_annotation_session",
+            json={"text": text, "entities": entities, "relations": relations},
+        )
+        assert response.status_code == 400
+        assert "Invalid relation 0" in response.get_json()["error"]
+
+
+class TestLegalActions:
+    def test_window(self):
+        client = app.test_client()
+        session_id = new_session(client, "Secret meeting on Monday.")
+        response = client.post("/api/legal_actions", json={"session_id": session_id})
+        full = response.get_json()["legal_actions"]
+
+        response = client.post(
+            "/api/legal_actions",
+            json={"session_id": session_id, "rows": [0, 1], "cols": [2, 3]},
+        )
+        window = response.get_json()["legal_actions"]
+        assert window == [row[2:4] for row in full[:2]]
+
+        response = client.post(
+            "/api/legal_actions", json={"session_id": session_id, "rows": [9]}
+        )
+        assert response.status_code == 400
+
+    def test_sparse(self):
+        client = app.test_client()
+        entities = [
+            {"start": 0, "end": 6, "text": "Secret"},
+            {"start": 7, "end": 14, "text": "meeting"},
+        ]
+        response = client.post(
+            "/api/new_annotation_session",
+            json={"text": "Secret meeting", "entities": entities, "sparse": True},
+        )
+        session_id = response.get_json()["session_id"]
+        response = client.post("/api/legal_actions", json={"session_id": session_id})
+        assert response.status_code == 400
+
+
+class TestExport:
+    def test_own_sessions(self, clients):
+        alice, bob = clients
+        alice_id = new_session(alice, "Secret meeting on Monday.")
+        new_session(bob, "Public meeting on Friday.")
+
+        response = bob.post("/api/export_annotation_sessions", json={})
+        assert exported_texts(response) == ["Public meeting on Friday."]
+
+        response = bob.post(
+            "/api/export_annotation_sessions", json={"session_ids": [alice_id]}
+        )
+        assert response.status_code == 403
+
+    def test_local(self, clients):
+        alice_id = new_session(clients[0], "Secret meeting on Monday.")
+        response = app.test_client().post(
+            "/api/export_annotation_sessions", json={"session_ids": [alice_id]}
+        )
+        assert exported_texts(response) == ["Secret meeting on Monday."]
+
+
+class TestAgreement:
+    def test_own_sessions(self, clients):
+        alice, bob = clients
+        alice_id = new_session(alice, "Secret meeting on Monday.")
+        bob_id = new_session(bob, "Public meeting on Friday.")
+
+        response = bob.post("/api/annotation_agreement", json={})
+        documents = response.get_json()["documents"]
+        assert [document["sessions"] for document in documents] == [
+            [session_label(bob_id)]
+        ]
+        assert alice_id not in response.get_data(as_text=True)
+
+        response = bob.post(
+            "/api/annotation_agreement", json={"session_ids": [alice_id]}
+        )
+        assert response.status_code == 403
@@ -0,0 +1,45 @@
+import asyncio
+import json
+import threading
+
+import asgi
+
+
+def stream_request(text: str, disconnect_when: threading.Event) -> tuple:
+    """Post a text to the entity annotation stream, disconnecting on the event."""
+    body = json.dumps({"text": text}).encode()
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.to_thread(disconnect_when.wait, 5)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    status = asyncio.run(asgi.stream_annotate_entities(receive, send))
+    return status, sent
+
+
+class TestStreamAnnotateEntities:
+    def test_disconnect_stops_tagging(self, monkeypatch):
+        started = threading.Event()
+        stopped = threading.Event()
+
+        def tag_events(text, cancelled):
+            started.set()
+            if cancelled.wait(5):
+                stopped.set()
+            return []
+
+        monkeypatch.setattr(asgi, "tag_events", tag_events)
+        monkeypatch.setattr(asgi, "tag_timexs", lambda text: [])
+        monkeypatch.setattr(asgi, "tagging_slots", asyncio.Semaphore(1))
+
+        status, _ = stream_request("The meeting started.", started)
+        assert status == 499
+        assert stopped.wait(5)
+        assert not asgi.tagging_slots.locked()
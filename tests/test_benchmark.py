@@ -0,0 +1,32 @@
+import copy
+
+import pytest
+
+from scripts.benchmark import BENCHMARKS, first_action, make_synthetic_doc, measure
+from src.base import PointRelation, Timeline
+from src.env import TemporalGame
+
+
+@pytest.fixture
+def doc():
+    return make_synthetic_doc(10, density=0.5)
+
+
+class TestSyntheticDoc:
+    def test_timeline_is_valid(self, doc):
+        timeline = Timeline([PointRelation(**rel) for rel in doc["relations"]])
+        assert timeline.is_valid
+
+    def test_game_step(self, doc):
+        game = TemporalGame(copy.deepcopy(doc))
+        _, reward, terminated, _ = game.step(first_action(game))
+        assert reward > 0
+        assert not terminated
+
+
+class TestMeasure:
+    def test_measure(self, doc):
+        bench, _ = BENCHMARKS["game_step"]
+        result = measure(*bench(doc), min_rounds=2, min_time=0, max_rounds=5)
+        assert result["rounds"] == 2
+        assert 0 < result["min_ms"] <= result["median_ms"] <= result["p95_ms"]
@@ -0,0 +1,125 @@
+import datasets
+import numpy as np
+import pytest
+
+from src import difficulty
+from src.difficulty import (
+    DifficultySampler,
+    build_index,
+    iter_curriculum,
+    load_index,
+    n_required_relations,
+)
+
+
+def make_doc(n_entities: int, relations: list[tuple[str, str, str]]) -> dict:
+    return {
+        "doc": f"doc{n_entities}",
+        "text": "w " * n_entities,
+        "entities": [
+            {"id": f"e{idx}", "offsets": [2 * idx, 2 * idx + 1], "text": "w"}
+            for idx in range(n_entities)
+        ],
+        "relations": [
+            {"relation": relation, "source": source, "target": target}
+            for source, relation, target in relations
+        ],
+    }
+
+
+# Three intervals one after the other, with the closure of their relations
+CHAIN = [
+    ("end e0", "<", "start e1"),
+    ("start e0", "<", "start e1"),
+    ("start e0", "<", "end e1"),
+    ("end e0", "<", "end e1"),
+    ("end e1", "<", "start e2"),
+    ("start e1", "<", "start e2"),
+    ("start e1", "<", "end e2"),
+    ("end e1", "<", "end e2"),
+    ("end e0", "<", "start e2"),
+    ("start e0", "<", "start e2"),
+    ("start e0", "<", "end e2"),
+    ("end e0", "<", "end e2"),
+]
+
+
+@pytest.fixture
+def dataset():
+    return datasets.Dataset.from_list(
+        [
+            make_doc(3, CHAIN),
+            make_doc(2, [("end e0", ">", "start e1")]),
+            make_doc(2, [("start e0", "=", "start e1"), ("end e0", "<", "end e1")]),
+        ]
+    )
+
+
+@pytest.fixture(autouse=True)
+def difficulty_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(difficulty, "DIFFICULTY_DIR", tmp_path)
+    return tmp_path
+
+
+class TestDifficulty:
+    def test_n_required_relations(self):
+        doc = make_doc(3, CHAIN)
+        # Only the end of an interval before the start of the next one is required
+        assert n_required_relations(doc["entities"], doc["relations"]) == 2
+        doc = make_doc(2, [("start e0", "=", "start e1"), ("end e0", "=", "end e1")])
+        assert n_required_relations(doc["entities"], doc["relations"]) == 2
+
+    def test_build_index(self, dataset):
+        index = build_index(dataset, batch_size=2)
+        assert index["n_endpoints"].tolist() == [6, 4, 4]
+        assert index["n_board_cells"].tolist() == [12, 4, 4]
+        assert index["n_relations"].tolist() == [12, 1, 2]
+        assert index["n_before"].tolist() == [12, 0, 1]
+        assert index["n_after"].tolist() == [0, 1, 0]
+        assert index["n_equal"].tolist() == [0, 0, 1]
+        assert index["n_required"].tolist() == [2, 1, 2]
+        assert index["closure_expansion"].tolist() == [6.0, 1.0, 1.0]
+        assert index["difficulty"].tolist() == [2, 4, 4]
+
+    def test_load_index(self, dataset, difficulty_dir, tmp_path):
+        dataset.save_to_disk(str(tmp_path / "dataset"))
+        dataset = datasets.load_from_disk(str(tmp_path / "dataset"))
+        index = load_index(dataset)
+        assert len(list(difficulty_dir.glob("*.npz"))) == 1
+        cached = load_index(dataset)
+        assert cached.keys() == index.keys()
+        assert all(np.array_equal(cached[key], index[key]) for key in index)
+
+    def test_load_index_in_memory(self, dataset, difficulty_dir):
+        index = load_index(dataset)
+        assert index["difficulty"].tolist() == [2, 4, 4]
+        assert list(difficulty_dir.glob("*.npz")) == []
+
+
+class TestDifficultySampler:
+    @pytest.fixture
+    def sampler(self):
+        index = {
+            "difficulty": np.array([5, 1, 3, 1, 9, 7, 2, 8, 4, 6]),
+            "n_endpoints": np.array([4, 6, 4, 4, 4, 4, 4, 4, 4, 4]),
+        }
+        return DifficultySampler(index, seed=0)
+
+    def test_band(self, sampler):
+        assert sampler.band(0.0, 0.2).tolist() == [3, 1]
+        assert sampler.band(0.9, 1.0).tolist() == [4]
+        # A band narrower than a document still holds one
+        assert sampler.band(1.0, 1.0).tolist() == [4]
+        assert sorted(sampler.band(0.0, 1.0)) == list(range(10))
+
+    def test_sample(self, sampler):
+        assert {sampler.sample(0.0, 0.2) for _ in range(50)} == {1, 3}
+        assert {sampler.sample() for _ in range(500)} == set(range(10))
+
+    def test_curriculum(self, sampler):
+        assert {sampler.curriculum(0.0, width=0.2) for _ in range(50)} == {1, 3}
+        assert {sampler.curriculum(1.0, width=0.2) for _ in range(50)} == {4, 7}
+
+    def test_iter_curriculum(self, dataset):
+        docs = list(iter_curriculum(dataset, n_games=2, width=0.3, seed=0))
+        assert [doc["doc"] for doc in docs] == ["doc3", "doc2"]
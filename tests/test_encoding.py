@@ -0,0 +1,41 @@
+import copy
+
+import numpy as np
+
+from scripts.benchmark import make_synthetic_doc
+from src.encoding import decode_board, encode_board
+from src.env import MASKED_POSITION, TemporalGame
+
+
+class TestEncodeBoard:
+    def test_round_trip(self):
+        doc = make_synthetic_doc(5, density=0.5)
+        game = TemporalGame(copy.deepcopy(doc))
+        game.step(((0, 2), "<"))
+        board = game.board_array()
+        encoded = encode_board(board)
+        assert encoded["size"] == len(board)
+        assert (decode_board(encoded) == board).all()
+
+    def test_state_board(self):
+        game = TemporalGame(make_synthetic_doc(5, density=0.5))
+        board = game.state["board"]
+        assert isinstance(board, np.ndarray) and board.dtype == np.int8
+        assert (decode_board(encode_board(board)) == np.array(board.tolist())).all()
+
+    def test_visible(self):
+        doc = {
+            "text": "The quick brown fox jumps.",
+            "entities": [
+                {"id": "e0", "text": "The", "offsets": [0, 3]},
+                {"id": "e1", "text": "jumps", "type": "instant", "offsets": [20, 25]},
+            ],
+            "relations": [],
+        }
+        board = TemporalGame(doc).board_array()
+        encoded = encode_board(board)
+        # The last endpoint has no cells in its row and the first none in its column
+        assert encoded["visible_rows"] == [0, 1]
+        assert encoded["visible_cols"] == [2]
+        assert (board[:, :2] == MASKED_POSITION).all()
+        assert np.array_equal(decode_board(encoded), board)
@@ -1,6 +1,14 @@
+import copy
+
+import numpy as np
 import pytest
 
-from src.env import TemporalGame
+from scripts.benchmark import make_synthetic_doc
+
+from src import env as env_module
+from src.base import Endpoint
+from src.env import EndpointPairs, TemporalGame
+from src.metrics import Metrics
 
 
 @pytest.fixture
@@ -20,8 +28,220 @@ class TestTemporalGame:
         env = TemporalGame(doc)
         assert env is not None
 
+    def test_shares_document(self, doc):
+        env = TemporalGame(doc)
+        assert env.pred_doc["text"] is env.true_doc["text"]
+        assert env.pred_doc["entities"] is env.true_doc["entities"]
+        assert env.pred_doc["relations"] == []
+        assert not hasattr(env.endpoints[0], "__dict__")
+
     def test_reset(self, doc):
         env = TemporalGame(doc)
         env.reset()
         env.step(((0, 2), "-"))
         assert env is not None
+
+    def test_step_many(self, doc):
+        env = TemporalGame(doc)
+        env.reset()
+        _, _, terminated, info = env.step_many([((0, 2), "<"), ((1, 2), "<")])
+        assert terminated and info["is_success"]
+        assert info["action_rewards"] == [0.0, 0.0]
+        assert info["first_invalid_action"] is None
+        assert env.tracker.step_id == 1
+
+        _, _, success = env.undo()
+        assert success
+        assert len(env.pred_timeline) == 0
+
+    def test_stages_recorded_once(self, doc, monkeypatch):
+        metrics = Metrics(sample_rate=1.0)
+        monkeypatch.setattr(env_module, "metrics", metrics)
+        env = TemporalGame(doc)
+        env.reset()
+        metrics.reset()
+        env.step(((0, 2), "<"))
+        text = metrics.to_prometheus()
+        for stage in ["timeline_update", "closure", "board"]:
+            assert f'temporal_game_stage_seconds_count{{stage="{stage}"}} 1' in text
+
+    def test_step_many_invalid(self, doc):
+        env = TemporalGame(doc)
+        env.reset()
+        _, reward, terminated, info = env.step_many(
+            [((0, 2), "<"), ((1, 2), ">"), ((0, 2), ">")]
+        )
+        assert terminated
+        assert reward == -1.0
+        assert info["first_invalid_action"] == 2
+
+    def test_load_relations(self, doc):
+        env = TemporalGame(doc)
+        env.reset()
+        state = env.load_relations(
+            [
+                {"source": "start e0", "target": "instant e2", "relation": "<"},
+                {"position": [1, 2], "relation": "<"},
+            ]
+        )
+        assert state["board"][0][2] == 1
+        assert state["board"][1][2] == 1
+        assert env.tracker.step_id == 0
+        assert not env.tracker.timeline_history
+
+    @pytest.mark.parametrize(
+        "relation",
+        [
+            {"source": "start e0", "target": "instant e9", "relation": "<"},
+            {"source": "start e0", "target": "end e2", "relation": "<"},
+            {"source": "start e0", "target": "instant e2", "relation": "?"},
+            {"position": [0, 1], "relation": "<"},
+        ],
+    )
+    def test_load_relations_invalid(self, doc, relation):
+        env = TemporalGame(doc)
+        env.reset()
+        valid = {"source": "start e0", "target": "instant e2", "relation": "<"}
+        with pytest.raises(ValueError, match="Invalid relation 1"):
+            env.load_relations([valid, relation])
+
+    def test_legal_actions(self, doc):
+        env = TemporalGame(doc)
+        env.reset()
+        mask = env.legal_actions()
+        assert mask.shape == (3, 3, 4)
+        assert mask[0, 2].all() and mask[1, 2].all()
+        assert mask.sum() == 8
+
+        env.step(((0, 2), "<"))
+        mask = env.legal_actions(undecided_only=False)
+        assert mask[0, 2].tolist() == [False, True, False, False]
+        assert not env.legal_actions()[0, 2].any()
+
+    def test_legal_actions_unknown(self):
+        entities = [
+            {"id": f"t{pos}", "text": text, "type": "instant", "offsets": [pos, pos + 1]}
+            for pos, text in [(0, "a"), (2, "b"), (4, "c")]
+        ]
+        doc = {"text": "a b c", "entities": entities, "relations": []}
+        env = TemporalGame(doc)
+        env.reset()
+        env.step_many([((0, 1), "-"), ((1, 2), "<")])
+        # c < a or c = a would order a and b, annotated as unknown
+        assert env.legal_actions()[0, 2].tolist() == [False, True, False, True]
+
+    def test_step_validity(self):
+        entities = [
+            {"id": f"t{pos}", "text": text, "type": "instant", "offsets": [pos, pos + 1]}
+            for pos, text in [(0, "a"), (2, "b"), (4, "c")]
+        ]
+        doc = {"text": "a b c", "entities": entities, "relations": []}
+        env = TemporalGame(doc)
+        env.reset()
+        env.step(((0, 1), "<"))
+        env.step(((1, 2), "<"))
+        assert env.tracker.is_valid
+        _, _, terminated, info = env.step(((0, 2), ">"))
+        assert not env.tracker.is_valid
+        assert terminated and not info["is_success"]
+
+        env.undo()
+        assert env.tracker.is_valid
+        env.step_many([((0, 2), ">")])
+        env.step(((0, 2), "-"))
+        assert not env.tracker.is_valid
+        env.undo()
+        assert not env.tracker.is_valid
+        env.undo()
+        assert env.tracker.is_valid
+
+    def test_sparse(self):
+        doc = make_synthetic_doc(6, density=0.5)
+        dense = TemporalGame(copy.deepcopy(doc))
+        sparse = TemporalGame(copy.deepcopy(doc), sparse=True)
+        for action in [((0, 2), "<"), ((5, 8), ">"), ((1, 10), "=")]:
+            dense.step(action)
+            sparse.step(action)
+        dense.undo()
+        sparse.undo()
+        assert isinstance(sparse.state["board"], dict)
+        assert "_mask" not in vars(sparse.pairs)
+        assert (sparse.board_array() == np.array(dense.state["board"])).all()
+        assert (sparse.legal_actions() == dense.legal_actions()).all()
+        assert sparse.board_window([0, 1, 5], [2, 8]) == dense.board_window(
+            [0, 1, 5], [2, 8]
+        )
+        with pytest.raises(IndexError):
+            sparse.board_window([0], [12])
+
+    def test_sentence_window(self):
+        doc = {
+            "text": "One fell. Two rose. Three sang.",
+            "entities": [
+                {"id": "e0", "text": "fell", "offsets": [4, 8]},
+                {"id": "e1", "text": "rose", "offsets": [14, 18]},
+                {"id": "e2", "text": "sang", "offsets": [26, 30]},
+            ],
+            "relations": [],
+        }
+        env = TemporalGame(doc, sparse=True)
+        assert env.endpoint_sentences.tolist() == [0, 0, 1, 1, 2, 2]
+        rows, cols = env.sentence_window(1, 1, 1)
+        assert rows.tolist() == [2, 3]
+        assert cols.tolist() == [2, 3, 4, 5]
+        assert env.board_window(rows, cols) == [[-2, -2, -1, -1], [-2, -2, -1, -1]]
+
+
+class TestEndpointPairs:
+    @pytest.fixture
+    def pairs(self):
+        endpoints = [
+            Endpoint("e0", "The", "start", [0, 3]),
+            Endpoint("e0", "The", "end", [0, 3]),
+            Endpoint("e1", "fox", "instant", [16, 19]),
+            Endpoint("e2", "jumps", "start", [20, 25]),
+            Endpoint("e2", "jumps", "end", [20, 25]),
+        ]
+        return EndpointPairs(endpoints)
+
+    def test_cells(self, pairs):
+        cells = {
+            (src_idx, tgt_idx)
+            for src_idx in range(5)
+            for tgt_idx in range(src_idx + 1, 5)
+            if pairs.entity_idx[src_idx] != pairs.entity_idx[tgt_idx]
+        }
+        assert len(pairs) == len(cells) == 8
+        assert set(zip(*pairs.mask().nonzero())) == cells
+        assert (0, 1) not in pairs and (1, 0) not in pairs and (0, 2) in pairs
+
+    def test_linear_index(self, pairs):
+        linear_idxs = [
+            pairs.linear_index(src_idx, tgt_idx)
+            for tgt_idx in range(5)
+            for src_idx in range(tgt_idx)
+        ]
+        assert linear_idxs == list(range(10))
+        assert [pairs.cell(idx) for idx in linear_idxs] == [
+            (src_idx, tgt_idx) for tgt_idx in range(5) for src_idx in range(tgt_idx)
+        ]
+        src_idxs, tgt_idxs = pairs.cell(np.arange(10))
+        assert pairs.linear_index(src_idxs, tgt_idxs).tolist() == list(range(10))
+
+    def test_endpoints(self, pairs):
+        assert pairs.endpoints_of(1, 2) == ("end e0", "instant e1")
+        assert pairs.position("end e0", "instant e1") == (1, 2)
+        with pytest.raises(KeyError):
+            pairs.endpoints_of(3, 4)
+        with pytest.raises(KeyError):
+            pairs.position("instant e1", "end e0")
+
+    def test_positions(self, pairs):
+        relations = [
+            {"source": "end e0", "target": "instant e1"},
+            {"source": "start e0", "target": "end e2"},
+        ]
+        src_idxs, tgt_idxs = pairs.positions(relations)
+        assert list(zip(src_idxs, tgt_idxs)) == [(1, 2), (0, 4)]
+        with pytest.raises(KeyError):
+            pairs.positions(relations + [{"source": "end e2", "target": "start e2"}])
@@ -1,8 +1,68 @@
-from src.event_tagger import EventTagger
+import threading
+
+import pytest
+
+from src import event_tagger
+from src.event_tagger import EventTagger, TaggingCancelled, merge_events
+
+
+class CountingModel:
+    """Model that tags no events and records the documents of each call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, docs):
+        self.calls.append(len(docs))
+        return {doc.name: [] for doc in docs}
 
 
 class TestEventTagger:
+    @pytest.mark.network
     def test_call(self):
         text = "The meeting started at 9:00 AM and ended at 10:00 AM."
         events = EventTagger()(text)
         assert len(events) == 2
+
+    @pytest.mark.network
+    def test_chunks(self):
+        text = " ".join(
+            f"The meeting {idx} started at 9:00 AM and ended at 10:00 AM."
+            for idx in range(50)
+        )
+        events = EventTagger(chunk_chars=10**6)(text)
+        tagger = EventTagger(chunk_chars=200, n_processes=2)
+        assert tagger(text) == events
+        tagger.close()
+        assert EventTagger(chunk_chars=200, n_processes=1)(text) == events
+
+    def test_chunks_tagged_one_at_a_time(self, monkeypatch):
+        model = CountingModel()
+        monkeypatch.setattr(event_tagger, "load_model", lambda: model)
+        text = " ".join(f"The meeting {idx} started." for idx in range(50))
+        EventTagger(chunk_chars=200, n_processes=1)(text)
+        assert len(model.calls) > 1
+        assert set(model.calls) == {1}
+
+    def test_cancelled(self, monkeypatch):
+        model = CountingModel()
+        monkeypatch.setattr(event_tagger, "load_model", lambda: model)
+        text = " ".join(f"The meeting {idx} started." for idx in range(50))
+        cancelled = threading.Event()
+        cancelled.set()
+        with pytest.raises(TaggingCancelled):
+            EventTagger(chunk_chars=200, n_processes=1)(text, cancelled)
+        assert model.calls == [1]
+
+
+class TestMergeEvents:
+    def test_merge_events(self):
+        events = [
+            {"text": "ended", "offsets": [30, 35], "type": "interval"},
+            {"text": "started", "offsets": [12, 19], "type": "interval"},
+            {"text": "ended", "offsets": [30, 35], "type": "interval"},
+        ]
+        assert [event["offsets"] for event in merge_events(events)] == [
+            [12, 19],
+            [30, 35],
+        ]
@@ -0,0 +1,97 @@
+import gzip
+import json
+
+import pytest
+
+from scripts.benchmark import make_synthetic_doc
+from src.env import TemporalGame
+from src.export import (
+    gzip_lines,
+    iter_records,
+    load_records,
+    record_to_document,
+    record_to_timeml,
+    record_to_tlinks,
+    write_records,
+)
+from src.sessions import SessionStore
+
+
+def make_session(n_entities: int) -> dict:
+    doc = make_synthetic_doc(n_entities, density=1.0)
+    entities = [
+        {
+            "id": entity["id"],
+            "start": entity["offsets"][0],
+            "end": entity["offsets"][1],
+            "text": entity["text"],
+        }
+        for entity in doc["entities"]
+    ]
+    relations = doc.pop("relations")
+    game = TemporalGame({**doc, "relations": []})
+    game.reset()
+    game.load_relations(relations)
+    return {"game": game, "text": doc["text"], "entities": entities, "dct": None}
+
+
+@pytest.fixture
+def store():
+    store = SessionStore()
+    store["a"] = make_session(3)
+    store["b"] = make_session(4)
+    return store
+
+
+class TestExport:
+    def test_iter_records(self, store):
+        records = list(iter_records(store))
+        assert [record["doc"] for record in records] == ["a", "b"]
+        assert {entity["id"] for entity in records[0]["entities"]} == {
+            "ei0",
+            "ei1",
+            "ei2",
+        }
+        # Every pair of entities is related, so the closure holds all the relations
+        assert len(records[0]["relations"]) == 4 * 3
+        assert len(record_to_tlinks(records[0])) == 3
+
+    def test_iter_records_without_entity_text(self, store):
+        for entity in store["a"]["entities"]:
+            del entity["text"]
+        record = next(iter_records(store, ["a"]))
+        assert [entity["text"] for entity in record["entities"]] == [
+            "event0",
+            "event1",
+            "event2",
+        ]
+
+    def test_iter_records_session_ids(self, store):
+        records = list(iter_records(store, ["b", "missing"]))
+        assert [record["doc"] for record in records] == ["b"]
+
+    def test_gzip_lines(self, store):
+        records = list(iter_records(store))
+        lines = gzip.decompress(b"".join(gzip_lines(records))).decode().splitlines()
+        assert [json.loads(line) for line in lines] == records
+
+    @pytest.mark.parametrize("name", ["records.jsonl.gz", "records.arrow"])
+    def test_write_load_records(self, store, tmp_path, name):
+        records = list(iter_records(store))
+        assert write_records(records, tmp_path / name) == 2
+        dataset = load_records(tmp_path / name)
+        assert dataset["doc"] == ["a", "b"]
+        assert dataset[1]["relations"] == records[1]["relations"]
+        assert TemporalGame(dataset[1]).n_relations == len(records[1]["relations"])
+
+    def test_record_to_document(self, store):
+        record = next(iter_records(store))
+        document = record_to_document(record)
+        assert document.name == "a"
+        assert len(document.entities) == 3
+        assert len(document.tlinks) == 3
+
+    def test_record_to_timeml(self, store):
+        timeml = record_to_timeml(next(iter_records(store)))
+        assert timeml.count("<EVENT ") == 3
+        assert timeml.count("<TLINK ") == 3
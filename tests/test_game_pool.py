@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from src.env import TemporalGame
+from src.game_pool import GamePool
+
+
+class SyntheticGamePool(GamePool):
+    def make_game(
+        self, level: int, difficulty: tuple[float, float] | None = None
+    ) -> TemporalGame:
+        entities = [
+            {"id": f"e{idx}", "text": "w", "offsets": [2 * idx, 2 * idx + 1]}
+            for idx in range(level)
+        ]
+        doc = {"text": "w " * level, "entities": entities, "relations": []}
+        return TemporalGame(doc)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool():
+    pool = SyntheticGamePool(levels=[2, 3], size=2)
+    yield pool
+    pool.stop()
+
+
+class TestGamePool:
+    def test_fill(self, pool):
+        assert pool.get(2) is None
+        pool.start()
+        wait_for(lambda: pool.stats()["games"] == {2: 2, 3: 2})
+        assert pool.stats()["games"] == {2: 2, 3: 2}
+
+        game = pool.get(3)
+        assert len(game.true_doc["entities"]) == 3
+        wait_for(lambda: pool.stats()["games"][3] == 2)
+        assert pool.stats()["games"][3] == 2
+
+    def test_max_bytes(self):
+        pool = SyntheticGamePool(levels=[2, 3], size=2, max_bytes=1)
+        pool.start()
+        wait_for(lambda: pool.nbytes > 0)
+        pool.stop()
+        assert sum(pool.stats()["games"].values()) == 1
+
+    def test_disabled(self):
+        pool = SyntheticGamePool(levels=[2], size=0)
+        pool.start()
+        assert pool.get(2) is None
+        assert pool.stats()["games"] == {2: 0}
+
+    def test_not_started_on_import(self):
+        from app import game_pool
+
+        assert game_pool._thread is None
@@ -0,0 +1,9 @@
+import pytest
+
+from scripts.import_time import CORE_MODULES, heavy_imports, import_times
+
+
+class TestImports:
+    @pytest.mark.parametrize("module", CORE_MODULES)
+    def test_core_does_not_import_ml_stack(self, module):
+        assert heavy_imports(import_times(module)) == []
@@ -0,0 +1,48 @@
+import json
+import logging
+import queue
+import sys
+
+from src.logs import JSONFormatter, LazyQueueHandler
+
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class TestJSONFormatter:
+    def test_format(self):
+        record = make_record("Game %s: Step completed", "g0", game_id="g0", step_id=2)
+        data = json.loads(JSONFormatter().format(record))
+        assert data["message"] == "Game g0: Step completed"
+        assert data["level"] == "INFO"
+        assert data["game_id"] == "g0"
+        assert data["step_id"] == 2
+        assert "session_id" not in data
+
+
+class TestLazyQueueHandler:
+    def test_message_is_not_formatted(self):
+        log_queue = queue.SimpleQueue()
+        handler = LazyQueueHandler(log_queue)
+        handler.handle(make_record("reward=%s", 1.0))
+        record = log_queue.get_nowait()
+        assert record.msg == "reward=%s"
+        assert record.args == (1.0,)
+        assert record.getMessage() == "reward=1.0"
+
+    def test_exception_is_rendered(self):
+        log_queue = queue.SimpleQueue()
+        handler = LazyQueueHandler(log_queue)
+        try:
+            raise ValueError("invalid")
+        except ValueError:
+            record = logging.LogRecord(
+                "app", logging.ERROR, __file__, 1, "error", (), sys.exc_info()
+            )
+        handler.handle(record)
+        record = log_queue.get_nowait()
+        assert record.exc_info is None
+        assert "ValueError: invalid" in record.exc_text
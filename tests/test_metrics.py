@@ -0,0 +1,26 @@
+from src.metrics import Histogram, Metrics
+
+
+class TestHistogram:
+    def test_observe(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+        assert histogram.count == 4
+        assert histogram.cumulative_counts() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+
+
+class TestMetrics:
+    def test_span(self):
+        metrics = Metrics(sample_rate=1.0)
+        with metrics.stage("closure"):
+            pass
+        text = metrics.to_prometheus()
+        assert "# TYPE temporal_game_stage_seconds histogram" in text
+        assert 'temporal_game_stage_seconds_count{stage="closure"} 1' in text
+
+    def test_sampling_disabled(self):
+        metrics = Metrics(sample_rate=0.0)
+        with metrics.stage("closure"):
+            pass
+        assert metrics.to_prometheus() == ""
@@ -1,9 +1,52 @@
+import pytest
+
 from src.relation_classifier import RelationClassifier
 
 
 class TestRelationClassifier:
+    @pytest.mark.network
     def test_score(self):
         classifier = RelationClassifier()
         text = "The meeting started at 9:00 AM and ended at 10:00 AM."
         score = classifier.score(text)
-        assert score == 0
\ No newline at end of file
+        assert score == 0
+
+    @pytest.mark.network
+    def test_quantize(self):
+        text = "The meeting started at 9:00 AM and ended at 10:00 AM."
+        pairs = [
+            (
+                {"start": 12, "end": 19, "text": "started"},
+                {"start": 35, "end": 40, "text": "ended"},
+            )
+        ]
+        scores = RelationClassifier().score(text, pairs)
+        quantized = RelationClassifier(quantize=True, n_threads=1).score(text, pairs)
+        assert quantized == pytest.approx(scores, abs=0.1)
+
+    def test_add_tags(self):
+        text = "It rained and then it stopped."
+        pairs = [
+            (
+                {"start": 3, "end": 9, "text": "rained"},
+                {"start": 22, "end": 29, "text": "stopped"},
+            )
+        ]
+        assert RelationClassifier.add_tags(text, pairs) == [
+            "It <>rained] and then it <>stopped]."
+        ]
+
+    @pytest.mark.network
+    def test_score_cached(self):
+        text = "The meeting started at 9:00 AM and ended at 10:00 AM."
+        pairs = [
+            (
+                {"start": 12, "end": 19, "text": "started"},
+                {"start": 35, "end": 40, "text": "ended"},
+            )
+        ]
+        classifier = RelationClassifier()
+        scores = classifier.score(text, pairs)
+        assert classifier.score(text, pairs) == scores
+        assert classifier.cache.stats()["hits"] == 1
+        assert classifier.cache.stats()["misses"] == 1
@@ -0,0 +1,66 @@
+from scripts.replay import build_request, group_streams, summarize
+
+
+def make_record(stream, endpoint, data=None, time=0.0, status=200):
+    return {
+        "time": time,
+        "stream": stream,
+        "endpoint": endpoint,
+        "status": status,
+        "ms": 1.0,
+        "data": data or {},
+    }
+
+
+class TestReplay:
+    def test_group_streams(self):
+        records = [
+            make_record(1, "new_annotation_session", {"n_entities": 3}, time=0.2),
+            make_record(0, "new_game", {"level": 3}, time=0.1),
+            make_record(1, "annotation_undo", time=0.4),
+            make_record(0, "step", {"action": [[0, 2], "<"]}, time=0.3),
+            make_record(2, "step", time=0.5),
+            make_record(None, "undo", time=0.6),
+        ]
+        streams = group_streams(records)
+        assert [[record["endpoint"] for record in stream] for stream in streams] == [
+            ["new_game", "step"],
+            ["new_annotation_session", "annotation_undo"],
+        ]
+
+    def test_build_request(self):
+        path, payload = build_request(
+            make_record(0, "new_annotation_session", {"n_entities": 4, "sparse": True}),
+            None,
+        )
+        assert path == "/api/new_annotation_session"
+        assert len(payload["entities"]) == 4
+        assert payload["sparse"]
+
+        path, payload = build_request(
+            make_record(0, "step", {"action": [[0, 2], "<"]}), "g0"
+        )
+        assert path == "/api/step"
+        assert payload == {"action": [[0, 2], "<"], "game_id": "g0"}
+
+        _, payload = build_request(make_record(0, "annotation_undo"), "s0")
+        assert payload == {"session_id": "s0"}
+
+    def test_summarize(self):
+        results = [
+            {
+                "endpoint": "step",
+                "status": status,
+                "recorded_status": 200,
+                "ms": ms,
+                "recorded_ms": 1.0,
+            }
+            for status, ms in [(200, 1.0), (200, 3.0), (400, 2.0)]
+        ]
+        summary = summarize(results, 0.5)
+        assert summary["requests_per_second"] == 6.0
+        stats = summary["endpoints"]["step"]
+        assert stats["n_errors"] == 1
+        assert stats["n_status_changes"] == 1
+        assert stats["p50_ms"] == 2.0
+        assert stats["max_ms"] == 3.0
@@ -0,0 +1,61 @@
+import pytest
+
+from src.score_cache import ScoreCache
+
+TEXT = "It rained and then it stopped."
+PAIRS = [
+    (
+        {"start": 3, "end": 9, "text": "rained"},
+        {"start": 22, "end": 29, "text": "stopped"},
+    ),
+    (
+        {"start": 0, "end": 2, "text": "It"},
+        {"start": 3, "end": 9, "text": "rained"},
+    ),
+]
+DISTRIBUTIONS = [{"<": 0.9, ">": 0.1}, {"=": 0.6, "-": 0.4}]
+
+
+@pytest.fixture
+def cache():
+    return ScoreCache(max_size=2, path=None)
+
+
+class TestScoreCache:
+    def test_keys(self, cache):
+        keys = cache.keys(TEXT, PAIRS)
+        assert len(set(keys)) == 2
+        assert keys == cache.keys(TEXT, PAIRS)
+        assert keys[0] not in cache.keys(TEXT + " Again.", PAIRS)
+        assert keys[0] not in ScoreCache("other", path=None).keys(TEXT, PAIRS)
+
+    def test_hits_and_misses(self, cache):
+        keys = cache.keys(TEXT, PAIRS)
+        assert cache.get_many(keys) == [None, None]
+        cache.put_many(keys, DISTRIBUTIONS)
+        assert cache.get_many(keys) == DISTRIBUTIONS
+        assert cache.stats() == {"size": 2, "hits": 2, "disk_hits": 0, "misses": 2}
+
+    def test_evicts_least_recently_used(self, cache):
+        keys = cache.keys(TEXT, PAIRS)
+        cache.put_many(keys, DISTRIBUTIONS)
+        cache.get_many(keys[:1])
+        (other,) = cache.keys("Another text.", PAIRS[:1])
+        cache.put_many([other], DISTRIBUTIONS[:1])
+        assert cache.get_many(keys) == [DISTRIBUTIONS[0], None]
+
+    def test_disk(self, tmp_path):
+        path = tmp_path / "scores.sqlite"
+        cache = ScoreCache(max_size=1, path=path)
+        keys = cache.keys(TEXT, PAIRS)
+        cache.put_many(keys, DISTRIBUTIONS)
+        cache.close()
+
+        cache = ScoreCache(max_size=1, path=path)
+        assert cache.get_many(keys) == DISTRIBUTIONS
+        assert cache.stats()["disk_hits"] == 2
+        cache.close()
+
+    def test_to_prometheus(self, cache):
+        cache.get_many(cache.keys(TEXT, PAIRS))
+        assert "relation_score_cache_misses_total 2\n" in cache.to_prometheus()
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from src.sessions import SessionStore
+
+
+@pytest.fixture
+def store():
+    return SessionStore(max_sessions=2)
+
+
+class TestSessionStore:
+    def test_get_set(self, store):
+        store["a"] = {"reward": 0}
+        assert "a" in store
+        assert store["a"] == {"reward": 0}
+        assert store.get("b") is None
+
+    def test_evicts_least_recently_used(self, store):
+        store["a"] = {}
+        store["b"] = {}
+        store["a"]
+        store["c"] = {}
+        assert "a" in store
+        assert "b" not in store
+        assert len(store) == 2
+
+    def test_ids(self, store):
+        store["a"] = {}
+        store["b"] = {}
+        store["a"]
+        assert store.ids() == ["b", "a"]
+
+    def test_lock(self, store):
+        store["a"] = {"count": 0}
+
+        def increment():
+            for _ in range(1000):
+                with store.lock("a"):
+                    store["a"]["count"] += 1
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert store["a"]["count"] == 4000
+
+    def test_lock_unknown(self, store):
+        with store.lock("a"):
+            pass
+        assert store._locks == {}
@@ -0,0 +1,25 @@
+import pytest
+
+from scripts.benchmark import make_synthetic_doc
+from src.solver import POLICIES, play_game
+
+
+class TestPlayGame:
+    @pytest.mark.parametrize("policy_name", list(POLICIES))
+    def test_play_game(self, policy_name):
+        result = play_game(make_synthetic_doc(4, density=0.5), policy_name)
+        assert result["is_success"]
+        assert 0 < result["steps"] <= result["n_cells"]
+
+    def test_oracle_needs_fewer_steps(self):
+        # The games modify their document, so each one gets a new copy
+        oracle = play_game(make_synthetic_doc(6, density=1.0), "oracle_inference")
+        sequential = play_game(make_synthetic_doc(6, density=1.0), "sequential")
+        assert oracle["steps"] <= sequential["steps"]
+
+    def test_max_inference_beats_random(self):
+        docs = [make_synthetic_doc(6, density=1.0, seed=seed) for seed in range(10)]
+        random_steps = sum(play_game(doc, "random")["steps"] for doc in docs)
+        docs = [make_synthetic_doc(6, density=1.0, seed=seed) for seed in range(10)]
+        max_steps = sum(play_game(doc, "max_inference")["steps"] for doc in docs)
+        assert max_steps < random_steps
@@ -0,0 +1,43 @@
+import time
+
+from src.traces import TraceRecorder, load_trace
+
+
+class TestTraceRecorder:
+    def test_record(self, tmp_path):
+        path = tmp_path / "trace.jsonl.gz"
+        recorder = TraceRecorder(path)
+        start = time.perf_counter()
+        recorder.record("new_game", "g0", {"level": 3}, 200, start, 0.01)
+        recorder.record(
+            "new_annotation_session",
+            "s0",
+            {"text": "Alice met Bob.", "entities": [{}, {}], "sparse": True},
+            200,
+            start,
+            0.002,
+        )
+        recorder.record(
+            "step", "g0", {"game_id": "g0", "action": [[0, 2], "<"]}, 200, start, 0.001
+        )
+        recorder.record("undo", "unknown", {}, 400, start, 0.001)
+        recorder.close()
+
+        records = load_trace(path)
+        assert [record["stream"] for record in records] == [0, 1, 0, None]
+        assert records[0]["data"] == {"level": 3}
+        assert records[0]["ms"] == 10.0
+        assert records[1]["data"] == {
+            "n_entities": 2,
+            "n_chars": 14,
+            "n_relations": 0,
+            "sparse": True,
+        }
+        assert records[2]["data"] == {"action": [[0, 2], "<"]}
+        assert records[3]["status"] == 400
+
+    def test_closed(self, tmp_path):
+        recorder = TraceRecorder(tmp_path / "trace.jsonl")
+        recorder.close()
+        recorder.record("undo", "g0", {}, 200, time.perf_counter(), 0.001)
+        assert load_trace(tmp_path / "trace.jsonl") == []
@@ -0,0 +1,149 @@
+import pytest
+
+from src.utils import (
+    add_tags,
+    chunk_text,
+    make_level_games,
+    order_relations,
+    sentence_starts,
+    tlinks_to_relations,
+)
+
+
+@pytest.fixture
+def text():
+    return "The quick brown fox jumps over the lazy dog."
+
+
+class TestAddTags:
+    def test_add_tags(self, text):
+        entities = [
+            {"text": "The", "offsets": [0, 3]},
+            {"text": "jumps", "offsets": [20, 25]},
+        ]
+        tagged_text = add_tags(text, entities)
+        assert tagged_text == "<e0>The</e0> quick brown fox <e1>jumps</e1> over the lazy dog."
+
+    def test_unsorted_entities(self, text):
+        entities = [
+            {"text": "jumps", "offsets": [20, 25]},
+            {"text": "The", "offsets": [0, 3]},
+        ]
+        tagged_text = add_tags(text, entities)
+        assert tagged_text == "<e1>The</e1> quick brown fox <e0>jumps</e0> over the lazy dog."
+
+    def test_spans(self, text):
+        entities = [
+            {"text": "The", "offsets": [0, 3]},
+            {"text": "fox", "offsets": [16, 19]},
+            {"text": "dog", "offsets": [40, 43]},
+        ]
+        tagged_text, spans = add_tags(text, entities, return_spans=True)
+        assert [tagged_text[start:end] for start, end in spans] == ["The", "fox", "dog"]
+
+    def test_overlapping_entities(self, text):
+        entities = [
+            {"text": "quick brown", "offsets": [4, 15]},
+            {"text": "quick", "offsets": [4, 9]},
+            {"text": "quick", "offsets": [4, 9]},
+            {"text": "brown fox", "offsets": [10, 19]},
+        ]
+        tagged_text, spans = add_tags(text, entities, return_spans=True)
+        assert tagged_text == "The <e0>quick brown</e0><e3> fox</e3> jumps over the lazy dog."
+        assert [tagged_text[start:end] for start, end in spans] == [
+            "quick brown",
+            "quick",
+            "quick",
+            " fox",
+        ]
+
+
+class TestMakeLevelGames:
+    def test_make_level_games(self):
+        batch = {
+            "doc": ["d0"],
+            "entities": [
+                [
+                    {"id": "t0", "text": "today", "offsets": [20, 25]},
+                    {"id": "ei1", "text": "said", "offsets": [0, 4]},
+                    {"id": "ei2", "text": "went", "offsets": [10, 14]},
+                ]
+            ],
+            "relations": [
+                [
+                    {"source": "start ei1", "target": "start t0", "relation": ">"},
+                    {"source": "end ei1", "target": "end ei2", "relation": "<"},
+                ]
+            ],
+        }
+        games = make_level_games(batch, level=2)
+        assert games["doc"] == ["d0", "d0"]
+        assert [[ent["id"] for ent in ents] for ents in games["entities"]] == [
+            ["ei1", "t0"],
+            ["ei1", "ei2"],
+        ]
+        assert [len(relations) for relations in games["relations"]] == [1, 1]
+
+        games = make_level_games(batch, level=3)
+        assert len(games["doc"]) == 1
+        assert games["relations"][0] == batch["relations"][0]
+
+
+class TestOrderRelations:
+    def test_order_relations(self):
+        example = {
+            "entities": [{"id": "ei1"}, {"id": "ei2"}],
+            "relations": [
+                {"source": "start ei2", "target": "end ei1", "relation": "<"}
+            ],
+        }
+        example = order_relations(example)
+        assert example["relations"] == [
+            {"source": "end ei1", "target": "start ei2", "relation": ">"}
+        ]
+
+
+class TestTlinksToRelations:
+    def test_tlinks_to_relations(self):
+        tlinks = [{"source": "ei1", "target": "t1", "relation": "BEFORE"}]
+        relations = tlinks_to_relations(tlinks, instants={"t1"})
+        assert relations == [
+            {"source": "start ei1", "target": "instant t1", "relation": "<"},
+            {"source": "end ei1", "target": "instant t1", "relation": "<"},
+        ]
+
+
+class TestSentenceStarts:
+    def test_sentence_starts(self):
+        text = 'It rained. "Why?" Nobody knew!\nThe end'
+        starts = sentence_starts(text)
+        assert [text[start:].split()[0] for start in starts] == [
+            "It",
+            '"Why?"',
+            "Nobody",
+            "The",
+        ]
+
+
+class TestChunkText:
+    def test_chunk_text(self):
+        text = 'It rained. "Why?" Nobody knew!\nThe end'
+        chunks = chunk_text(text, 19)
+        assert [chunk for _, chunk in chunks] == [
+            'It rained. "Why?" ',
+            "Nobody knew!\n",
+            "The end",
+        ]
+        assert all(text[offset:].startswith(chunk) for offset, chunk in chunks)
+
+    def test_long_sentence(self):
+        text = "one two three four. five"
+        chunks = chunk_text(text, 8)
+        assert "".join(chunk for _, chunk in chunks) == text
+        assert [chunk for _, chunk in chunks] == [
+            "one two ",
+            "three ",
+            "four. ",
+            "five",
+        ]
+        assert chunk_text("abcdefgh", 3) == [(0, "abc"), (3, "def"), (6, "gh")]